@@ -8,14 +8,22 @@ Features:
 - Auto-installs required dependencies on first run
 - No console window (Windows .pyw)
 - Cross-platform support
+- Fast startup: dependencies are located without importing them, and the
+  window appears before the server code is loaded
 
 Author: Course Platform Team
 Version: 1.0
 """
 
+import time
+
+# Reference point for the startup timings logged by the desktop app
+LAUNCH_STARTED = time.perf_counter()
+
 import sys
 import os
 import subprocess
+import importlib.util
 
 # Ensure we're in the correct directory
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,11 +31,10 @@ os.chdir(APP_DIR)
 
 
 def check_dependency(module_name: str) -> bool:
-    """Check if a Python module is installed."""
+    """Check if a Python module is installed (without importing it)."""
     try:
-        __import__(module_name)
-        return True
-    except ImportError:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
         return False
 
 
@@ -154,7 +161,7 @@ def main():
     # Now import and run the desktop app
     try:
         from desktop_app import main as run_app
-        run_app()
+        run_app(LAUNCH_STARTED)
     except ImportError as e:
         # Show error if import fails
         try:
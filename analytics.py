@@ -0,0 +1,131 @@
+"""
+Learning Analytics Module
+
+Keeps per-chapter progress aggregates materialized in SQLite:
+- chapter_progress_stats holds watched/completed counts, summed watch
+  percentage and watch time per chapter
+- Triggers on video_progress apply every insert/update/delete as a delta,
+  so aggregates are maintained incrementally as progress is saved
+- Video counts per chapter come from the catalog's cached column
+- Course length and time remaining per chapter come from probed durations
+  (video_metadata), falling back to durations reported by the player; they
+  are kept in chapter_durations, where triggers on the catalog, metadata
+  and progress tables mark a chapter stale so only that chapter is summed
+  again on the next read
+
+Aggregates are read in O(chapters), plus O(videos) of the chapters that
+changed since the last read. No files are touched.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+from typing import Any, Dict
+
+import database
+
+
+def refresh_durations():
+    """
+    Recompute the duration totals of every stale chapter.
+
+    Runs in one write transaction, so a change committed meanwhile marks
+    its chapter stale again instead of being lost.
+    """
+    with database.transaction() as conn:
+        c = conn.cursor()
+        # Probed metadata only counts while it matches the file's current
+        # size and mtime. CROSS JOIN keeps the stale chapters as the outer
+        # loop, so only their files are read.
+        c.execute('''SELECT f.chapter,
+                            COUNT(COALESCE(m.duration, p.duration)),
+                            COALESCE(SUM(COALESCE(m.duration, p.duration)), 0),
+                            COALESCE(SUM(CASE WHEN p.completed = 1 THEN 0
+                                              ELSE COALESCE(m.duration, p.duration) *
+                                                   (1 - MIN(MAX(COALESCE(p.watch_percentage, 0), 0), 100) / 100.0)
+                                         END), 0)
+                     FROM chapter_durations d
+                     CROSS JOIN catalog_files f ON f.chapter = d.chapter
+                     LEFT JOIN video_metadata m ON m.chapter = f.chapter AND m.file_name = f.file_name
+                                               AND m.size = f.size AND m.mtime = f.mtime
+                     LEFT JOIN video_progress p ON p.chapter = f.chapter AND p.video_name = f.file_name
+                     WHERE d.stale = 1 AND f.kind = 'video'
+                     GROUP BY f.chapter''')
+        c.executemany('''UPDATE chapter_durations
+                         SET videos_with_duration = ?, total_duration = ?,
+                             remaining_duration = ?, stale = 0
+                         WHERE chapter = ?''',
+                      [(known, duration, left, chapter)
+                       for chapter, known, duration, left in c.fetchall()])
+
+        # Stale chapters without videos
+        c.execute('''UPDATE chapter_durations
+                     SET videos_with_duration = 0, total_duration = 0,
+                         remaining_duration = 0, stale = 0
+                     WHERE stale = 1''')
+
+
+def get_analytics() -> Dict[str, Any]:
+    """
+    Read the analytics snapshot from the materialized aggregates.
+
+    Unwatched videos count as 0% progress, using the catalog's cached
+    video count per chapter.
+
+    Returns:
+        Dict in the /api/analytics response format
+    """
+    c = database.get_connection().cursor()
+
+    # Overall totals across every chapter with progress
+    c.execute('''SELECT COALESCE(SUM(watched_count), 0),
+                        COALESCE(SUM(completed_count), 0),
+                        COALESCE(SUM(watch_time), 0)
+                 FROM chapter_progress_stats''')
+    total_videos_watched, completed_videos, total_watch_time = c.fetchone()
+
+    # Per-chapter breakdown for chapters present in the content folder
+    c.execute('''SELECT ch.chapter, ch.video_count,
+                        COALESCE(s.completed_count, 0),
+                        COALESCE(s.total_progress, 0),
+                        COALESCE(s.watch_time, 0)
+                 FROM catalog_chapters ch
+                 LEFT JOIN chapter_progress_stats s ON s.chapter = ch.chapter''')
+    chapter_stats = {}
+    for chapter, actual_total, completed, total_progress, watch_time in c.fetchall():
+        actual_total = actual_total or 0
+        chapter_stats[chapter] = {
+            'total_videos': actual_total,
+            'completed_videos': completed,
+            'avg_progress': total_progress / actual_total if actual_total > 0 else 0,
+            'watch_time': watch_time,
+            'total_duration': 0,
+            'remaining_duration': 0,
+            'videos_with_duration': 0
+        }
+
+    # Length and unwatched time per chapter
+    c.execute('SELECT 1 FROM chapter_durations WHERE stale = 1 LIMIT 1')
+    if c.fetchone():
+        refresh_durations()
+    c.execute('''SELECT chapter, videos_with_duration, total_duration, remaining_duration
+                 FROM chapter_durations''')
+    total_duration = remaining = 0.0
+    for chapter, known, duration, left in c.fetchall():
+        total_duration += duration
+        remaining += left
+        if chapter in chapter_stats:
+            chapter_stats[chapter].update({
+                'total_duration': duration,
+                'remaining_duration': left,
+                'videos_with_duration': known
+            })
+
+    return {
+        'total_videos_watched': total_videos_watched,
+        'completed_videos': completed_videos,
+        'total_watch_time_seconds': int(total_watch_time),
+        'total_duration_seconds': int(total_duration),
+        'remaining_seconds': int(remaining),
+        'chapter_stats': chapter_stats
+    }
@@ -14,38 +14,76 @@ Version: 2.0
 
 import os
 import sys
-import sqlite3
 import json
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory
-from datetime import datetime
+import hashlib
+import logging
+import time
+from flask import Flask, render_template, request, jsonify, redirect, url_for, abort, send_file, g
+from werkzeug.security import safe_join
+
+import analytics as analytics_store
+import cache
+import catalog
+import database
+import hls
+import media
+import metadata
+import metrics
+import migrations
+import profiler
+import progress
+import remux
+import settings_store
+import thumbnails
 
 # Import configuration module
 try:
-    from config import get_effective_static_folder, get_static_folder, set_static_folder, get_database_path
+    from config import get_effective_static_folder, get_static_folder, set_static_folder
+    from config import get_profiling_settings, set_profiling_settings
 except ImportError:
     # Fallback if config not available (standalone mode)
     def get_effective_static_folder():
-        return os.path.join(os.path.dirname(__file__), 'static')
+        folder = os.path.join(os.path.dirname(__file__), 'static')
+        return folder if os.path.isdir(folder) else ''
     def get_static_folder():
         return None
     def set_static_folder(path):
         return False
-    def get_database_path():
-        return 'course_progress.db'
+    def get_profiling_settings():
+        return {'enabled': False, 'sample_rate': 0.0, 'mode': 'cprofile'}
+    def set_profiling_settings(**settings):
+        return False
+
+
+# Request logs are DEBUG level; the server sets the level from its settings
+logger = logging.getLogger('app')
 
 
 def get_db_path():
     """Get the database path, using config if available."""
-    try:
-        return str(get_database_path())
-    except:
-        return 'course_progress.db'
+    return database.get_db_path()
+
+
+# Callbacks run after the content folder was changed through the API
+_content_folder_listeners = []
+
+
+def on_content_folder_change(callback):
+    """
+    Register a callback for content folder changes made through the API.
+    
+    Args:
+        callback: Called with the new folder path
+    """
+    if callback not in _content_folder_listeners:
+        _content_folder_listeners.append(callback)
 
 
 def get_content_folder():
     """Get the current content/static folder path."""
+    # Already validated (and cached) by the config module
     folder = get_effective_static_folder()
-    if folder and os.path.isdir(folder):
+    if folder:
         return folder
     # Fallback to local static folder
     local_static = os.path.join(os.path.dirname(__file__), 'static')
@@ -54,53 +92,172 @@ def get_content_folder():
     return None
 
 
-app = Flask(__name__)
+# Paths per IN (...) query; stays below SQLite's default limit of 999
+# bound parameters on older builds
+IN_QUERY_CHUNK = 500
+
+
+def query_progress(chapter=None, since=None, video_paths=None):
+    """
+    Read progress rows, overlaid with rows still in the write-behind buffer.
+    
+    Args:
+        chapter: Only return videos of this chapter
+        since: Only return rows with last_watched >= this timestamp
+        video_paths: Only return these videos (one IN query per
+                     IN_QUERY_CHUNK paths)
+        
+    Returns:
+        dict: Video path -> progress dict (the /api/get-all-progress format)
+    """
+    query = 'SELECT video_path, "current_time", playback_speed, watch_percentage, completed, last_watched, duration FROM video_progress'
+    conditions = []
+    params = []
+    if chapter is not None:
+        conditions.append('chapter = ?')
+        params.append(chapter)
+    if since:
+        conditions.append('last_watched >= ?')
+        params.append(since)
+    
+    c = database.get_connection().cursor()
+    if video_paths is None:
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        c.execute(query, params)
+        results = c.fetchall()
+    else:
+        video_paths = list(dict.fromkeys(video_paths))
+        results = []
+        for offset in range(0, len(video_paths), IN_QUERY_CHUNK):
+            chunk = video_paths[offset:offset + IN_QUERY_CHUNK]
+            in_clause = f"video_path IN ({', '.join('?' * len(chunk))})"
+            c.execute(query + ' WHERE ' + ' AND '.join(conditions + [in_clause]),
+                      params + chunk)
+            results.extend(c.fetchall())
+    
+    # Convert database results to dictionary format
+    progress_dict = {
+        row[0]: {
+            'current_time': row[1],
+            'playback_speed': row[2],
+            'watch_percentage': row[3], 
+            'completed': row[4],
+            'last_watched': row[5],
+            'duration': row[6]
+        } for row in results
+    }
+    
+    # Overlay matching rows still waiting in the write-behind buffer
+    wanted = set(video_paths) if video_paths is not None else None
+    for path, record in progress.get_buffer().snapshot().items():
+        if wanted is not None and path not in wanted:
+            continue
+        if chapter is not None and record['chapter'] != chapter:
+            continue
+        if since and record['last_watched'] < since:
+            continue
+        progress_dict[path] = {
+            'current_time': record['current_time'],
+            'playback_speed': record['playback_speed'],
+            'watch_percentage': record['watch_percentage'],
+            'completed': record['completed'],
+            'last_watched': record['last_watched'],
+            'duration': record['duration']
+        }
+    return progress_dict
+
+
+def analytics_snapshot(base_path):
+    """
+    Build the /api/analytics payload.
+    
+    Args:
+        base_path: Content folder (used to bring the catalog up to date)
+        
+    Returns:
+        dict: Analytics in the /api/analytics response format
+    """
+    # Buffered heartbeats reach the aggregate tables when they are written
+    progress.get_buffer().flush()
+    
+    # No-op while the watcher keeps the index current
+    changed = catalog.refresh_catalog(base_path)
+    
+    # Probe durations of new or changed videos in the background
+    metadata.get_prober().schedule(base_path, force=changed)
+    if changed:
+        remux.get_queue().request_prune()
+    
+    # O(chapters) read from the materialized per-chapter aggregates
+    return analytics_store.get_analytics()
+
+
+# Content is served by serve_static() from the configured folder, so Flask's
+# own /static route is disabled
+app = Flask(__name__, static_folder=None)
+
+# Opt-in request profiling; off until enabled in the settings
+app.wsgi_app = profiler.ProfilingMiddleware(app.wsgi_app)
+
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's database connection to the pool."""
+    database.release_connection()
+
+
+@app.before_request
+def start_request_timer():
+    """Note when the request started, for the latency metrics."""
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record the request's latency and, for media, the bytes sent."""
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, route,
+                                        request.method, str(response.status_code))
+    if (request.endpoint in ('serve_static', 'hls_init', 'hls_segment') and request.method == 'GET'
+            and response.status_code in (200, 206) and response.content_length):
+        if request.endpoint != 'serve_static':
+            kind = 'hls'
+        else:
+            kind = catalog.classify_file(request.path.lower()) or 'other'
+        metrics.MEDIA_BYTES.inc(response.content_length, kind)
+    return response
+
 
 def init_db():
     """
-    Initialize the SQLite database with required tables.
+    Initialize the SQLite database, applying pending schema migrations.
     
-    Creates two main tables:
+    Main tables:
     1. video_progress: Stores individual video watching progress
     2. user_settings: Stores user preferences and configuration
     
-    Also inserts default settings if they don't exist.
-    """
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-    
-    # Create video progress tracking table
-    c.execute('''CREATE TABLE IF NOT EXISTS video_progress
-                 (video_path TEXT PRIMARY KEY,
-                  chapter TEXT,
-                  video_name TEXT,
-                  current_time REAL,
-                  duration REAL,
-                  playback_speed REAL DEFAULT 1.0,
-                  watch_percentage REAL DEFAULT 0,
-                  last_watched TIMESTAMP,
-                  completed INTEGER DEFAULT 0)''')
-    
-    # Create user settings table
-    c.execute('''CREATE TABLE IF NOT EXISTS user_settings
-                 (setting_key TEXT PRIMARY KEY,
-                  setting_value TEXT)''')
-    
-    # Insert default settings if they don't already exist
-    default_settings = [
-        ('max_playback_speed', '2.0'),
-        ('auto_resume', 'true'),
-        ('save_last_chapter', 'true'),
-        ('last_chapter', ''),
-        ('theme', 'dark'),
-        ('current_playback_speed', '1')
-    ]
-    
-    for key, value in default_settings:
-        c.execute("INSERT OR IGNORE INTO user_settings (setting_key, setting_value) VALUES (?, ?)", (key, value))
-    
-    conn.commit()
-    conn.close()
+    See migrations.py for the full schema and its history. Databases already
+    at the latest version are left alone, so a normal start costs one
+    PRAGMA read.
+
+    Raises:
+        RuntimeError: If the SQLite library is too old for the schema
+    """
+    # Older libraries cannot even read a migrated schema, so check first
+    migrations.check_sqlite_version()
+    try:
+        if database.get_connection().execute('PRAGMA user_version').fetchone()[0] == migrations.LATEST_VERSION:
+            return
+        with database.transaction() as conn:
+            # Another process may have migrated while we waited for the lock
+            applied = migrations.migrate(conn)
+        if applied:
+            logger.info("[DB] Schema migrated to version %d", migrations.LATEST_VERSION)
+    finally:
+        database.release_connection()
 
 # Initialize database on application startup
 init_db()
@@ -110,37 +267,34 @@ def index():
     """
     Main route that serves the chapters dashboard.
     
-    Scans the static directory for course folders and organizes
-    videos and PDF documents by chapter.
+    Serves the course structure (videos and PDF documents by chapter)
+    from the content catalog, which only re-lists folders whose
+    mtime changed since the last scan. Settings and the analytics
+    snapshot are embedded in the page, so the dashboard renders
+    without further API calls.
     
     Returns:
         Rendered chapters.html template with course structure
     """
+    initial_state = {'settings': settings_store.get_store().get_all(), 'analytics': {}}
+    
     base_path = get_content_folder()
     if not base_path or not os.path.isdir(base_path):
         # No content folder configured
-        return render_template('chapters.html', days={})
-    days = {}
-
-    # Scan directory structure for course content
-    for day_folder in sorted(os.listdir(base_path)):
-        day_path = os.path.join(base_path, day_folder)
-        if os.path.isdir(day_path):
-            videos = []
-            pdfs = []
-            # Process each file in the chapter directory
-            for file_name in sorted(os.listdir(day_path)):
-                # Check for video files with supported formats
-                if file_name.endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm')):
-                    videos.append(file_name)
-                # Check for document files with supported formats
-                elif file_name.endswith(('.pdf', '.docx', '.doc', '.txt')):
-                    pdfs.append(file_name)
-            
-            # Store chapter data with videos and documents
-            days[day_folder] = {'videos': videos, 'pdfs': pdfs}
-
-    return render_template('chapters.html', days=days)
+        return render_template('chapters.html', days={}, initial_state=initial_state)
+
+    # Bring the index up to date and read the course structure from it
+    catalog.refresh_catalog(base_path)
+    days = catalog.get_chapters()
+    
+    try:
+        initial_state['analytics'] = analytics_snapshot(base_path)
+    except Exception as e:
+        # The page falls back to fetching /api/analytics
+        logger.error("[ANALYTICS] Error: %s", e)
+        initial_state['analytics'] = None
+
+    return render_template('chapters.html', days=days, initial_state=initial_state)
 
 @app.route('/player/<path:chapter>')
 def player(chapter):
@@ -150,6 +304,9 @@ def player(chapter):
     Args:
         chapter (str): The chapter/folder name to display
         
+    The user's settings and the chapter's progress are embedded in the
+    page, so playback can start without waiting for API calls.
+    
     Returns:
         Rendered player.html template with chapter content
         or redirect to index if chapter doesn't exist
@@ -158,43 +315,38 @@ def player(chapter):
     if not base_path:
         return redirect(url_for('index'))
     
-    # Validate that the requested chapter exists
-    chapter_path = os.path.join(base_path, chapter)
-    if not os.path.isdir(chapter_path):
+    # Validate that the requested chapter exists in the catalog
+    catalog.refresh_catalog(base_path)
+    chapter_data = catalog.get_chapters(chapter)
+    if chapter not in chapter_data:
         return redirect(url_for('index'))
     
-    videos = []
-    pdfs = []
-    
-    # Scan chapter directory for media and document files
-    for file_name in sorted(os.listdir(chapter_path)):
-        if file_name.endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm')):
-            videos.append(file_name)
-        elif file_name.endswith(('.pdf', '.docx', '.doc', '.txt')):
-            pdfs.append(file_name)
-    
-    # Prepare chapter data for template
-    chapter_data = {chapter: {'videos': videos, 'pdfs': pdfs}}
-    
-    # Save last accessed chapter if the feature is enabled
+    # Save last accessed chapter if the feature is enabled; the write
+    # happens in the background, off the request path
     try:
-        conn = sqlite3.connect(get_db_path())
-        c = conn.cursor()
-        c.execute("UPDATE user_settings SET setting_value = ? WHERE setting_key = 'last_chapter'", (chapter,))
-        conn.commit()
-        conn.close()
+        store = settings_store.get_store()
+        if store.get('save_last_chapter'):
+            store.set_deferred('last_chapter', chapter)
     except Exception as e:
-        print(f"[ERROR] Could not save last chapter: {e}")
+        logger.error("[ERROR] Could not save last chapter: %s", e)
     
-    return render_template('player.html', days=chapter_data, current_chapter=chapter)
+    initial_state = {
+        'settings': settings_store.get_store().get_all(),
+        'progress': query_progress(chapter),
+        'hls': {'available': hls.is_available(), 'extensions': list(hls.HLS_EXTENSIONS)},
+    }
+    return render_template('player.html', days=chapter_data, current_chapter=chapter,
+                           initial_state=initial_state)
 
 @app.route('/api/save-progress', methods=['POST'])
 def save_progress():
     """
     API endpoint to save video watching progress.
     
-    Accepts JSON data with video information and current progress,
-    then updates the database with the latest viewing state.
+    Accepts JSON data with video information and current progress and
+    queues it in the write-behind buffer. Heartbeats for the same video
+    are coalesced and written in batches; pause/ended/unload events are
+    written through immediately.
     
     Expected JSON fields:
         - video_path: Unique path to the video file
@@ -203,53 +355,102 @@ def save_progress():
         - current_time: Current playback position in seconds
         - duration: Total video duration in seconds
         - playback_speed: Current playback speed multiplier
+        - event: Optional player event ('pause', 'ended', 'unload', ...)
     
     Returns:
         JSON response with success status
     """
     data = request.json
-    print(f"[SAVE PROGRESS] Received data: {data}")
+    logger.debug("[SAVE PROGRESS] Received data: %s", data)
     
-    # Extract video progress data from request
-    video_path = data.get('video_path')
-    chapter = data.get('chapter')
-    video_name = data.get('video_name')
-    current_time = data.get('current_time', 0)
-    duration = data.get('duration', 0)
-    playback_speed = data.get('playback_speed', 1.0)
-    
-    # Calculate watch percentage and completion status
-    watch_percentage = (current_time / duration * 100) if duration > 0 else 0
-    completed = 1 if watch_percentage >= 90 else 0  # Mark as completed at 90% watched
-    
-    # Generate timestamp for the progress record
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    print(f"[SAVE PROGRESS] Saving - Path: {video_path}, Time: {current_time:.2f}s, Duration: {duration:.2f}s, Progress: {watch_percentage:.2f}%, Speed: {playback_speed}x, Timestamp: {timestamp}")
+    # Build the full progress row (percentage, completion, timestamp)
+    record = progress.build_record(data)
+    logger.debug("[SAVE PROGRESS] Saving - Path: %s, Time: %.2fs, Duration: %.2fs, Progress: %.2f%%, Speed: %sx, Timestamp: %s",
+                 record['video_path'], record['current_time'], record['duration'],
+                 record['watch_percentage'], record['playback_speed'], record['last_watched'])
     
     try:
-        # Connect to database and save progress
-        conn = sqlite3.connect(get_db_path())
-        c = conn.cursor()
-        c.execute('''INSERT OR REPLACE INTO video_progress 
-                     (video_path, chapter, video_name, current_time, duration, playback_speed, 
-                      watch_percentage, last_watched, completed)
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (video_path, chapter, video_name, current_time, duration, playback_speed,
-                   watch_percentage, timestamp, completed))
-        conn.commit()
-        conn.close()
-        print(f"[SAVE PROGRESS] Successfully saved to database")
+        buffer = progress.get_buffer()
+        buffer.put(record)
+        if data.get('event') in progress.FLUSH_EVENTS:
+            buffer.flush()
+            logger.debug("[SAVE PROGRESS] Successfully saved to database")
     except Exception as e:
-        print(f"[SAVE PROGRESS] Error: {str(e)}")
+        logger.error("[SAVE PROGRESS] Error: %s", e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
     
     return jsonify({
         'status': 'success', 
-        'watch_percentage': watch_percentage,
-        'timestamp': timestamp,
-        'completed': completed
+        'watch_percentage': record['watch_percentage'],
+        'timestamp': record['last_watched'],
+        'completed': record['completed']
     })
 
+@app.route('/api/progress/batch', methods=['POST'])
+def save_progress_batch():
+    """
+    API endpoint to save many progress updates in one round trip.
+    
+    Used by the player to flush updates queued while offline or in a
+    background tab, and by external sync tools. Valid records are
+    upserted with a single executemany in one transaction. Each record
+    may carry the time it was recorded, which becomes its last_watched;
+    a record older than the stored progress of its video is accepted
+    but does not overwrite it, so the most recent update wins.
+    
+    Expected JSON:
+        A list of save-progress payloads, or {'records': [...]}; each may
+        add 'recorded_at' (Unix time in seconds or ISO 8601, default now)
+    
+    Returns:
+        JSON response with one result per input record:
+        {
+            'status': 'success' | 'partial' | 'error',
+            'saved': int,
+            'results': [
+                {'index': int, 'video_path': str, 'status': 'success',
+                 'watch_percentage': float, 'completed': int, 'timestamp': str}
+                or {'index': int, 'status': 'error', 'message': str}
+            ]
+        }
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('records')
+    if not isinstance(data, list):
+        return jsonify({'status': 'error', 'message': 'Expected a list of progress records'}), 400
+    logger.debug("[SAVE PROGRESS BATCH] Received %d record(s)", len(data))
+    
+    # Validate every item and build rows for the valid ones
+    results = []
+    records = []
+    for index, item in enumerate(data):
+        error = progress.validate_payload(item)
+        if error:
+            results.append({'index': index, 'status': 'error', 'message': error})
+            continue
+        record = progress.build_record(item, progress.parse_timestamp(item.get('recorded_at')))
+        records.append(record)
+        results.append({
+            'index': index,
+            'video_path': record['video_path'],
+            'status': 'success',
+            'watch_percentage': record['watch_percentage'],
+            'completed': record['completed'],
+            'timestamp': record['last_watched']
+        })
+    
+    try:
+        if records:
+            progress.get_buffer().put_many(records)
+    except Exception as e:
+        logger.error("[SAVE PROGRESS BATCH] Error: %s", e)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    saved = len(records)
+    status = 'success' if saved == len(data) else ('partial' if saved else 'error')
+    return jsonify({'status': status, 'saved': saved, 'results': results})
+
 @app.route('/api/get-progress/<path:video_path>')
 def get_progress(video_path):
     """
@@ -270,18 +471,23 @@ def get_progress(video_path):
             'last_watched': str        # Timestamp of last view
         }
     """
-    print(f"[GET PROGRESS] Fetching progress for: {video_path}")
+    logger.debug("[GET PROGRESS] Fetching progress for: %s", video_path)
     
     try:
-        conn = sqlite3.connect(get_db_path())
-        c = conn.cursor()
-        c.execute('SELECT current_time, playback_speed, watch_percentage, completed, last_watched FROM video_progress WHERE video_path = ?',
-                  (video_path,))
-        result = c.fetchone()
-        conn.close()
+        # Values still waiting in the write-behind buffer are the latest
+        buffered = progress.get_buffer().get(video_path)
+        if buffered:
+            result = (buffered['current_time'], buffered['playback_speed'],
+                      buffered['watch_percentage'], buffered['completed'], buffered['last_watched'])
+        else:
+            c = database.get_connection().cursor()
+            c.execute('SELECT "current_time", playback_speed, watch_percentage, completed, last_watched FROM video_progress WHERE video_path = ?',
+                      (video_path,))
+            result = c.fetchone()
         
         if result:
-            print(f"[GET PROGRESS] Found - Time: {result[0]:.2f}s, Speed: {result[1]}x, Progress: {result[2]:.2f}%, Last Watched: {result[4]}")
+            logger.debug("[GET PROGRESS] Found - Time: %.2fs, Speed: %sx, Progress: %.2f%%, Last Watched: %s",
+                         result[0], result[1], result[2], result[4])
             return jsonify({
                 'current_time': result[0],
                 'playback_speed': result[1],
@@ -290,7 +496,7 @@ def get_progress(video_path):
                 'last_watched': result[4]
             })
         else:
-            print(f"[GET PROGRESS] No progress found for this video")
+            logger.debug("[GET PROGRESS] No progress found for this video")
             return jsonify({
                 'current_time': 0, 
                 'playback_speed': 1.0, 
@@ -299,17 +505,25 @@ def get_progress(video_path):
                 'last_watched': None
             })
     except Exception as e:
-        print(f"[GET PROGRESS] Error: {str(e)}")
+        logger.error("[GET PROGRESS] Error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/get-all-progress')
 def get_all_progress():
     """
-    API endpoint to retrieve all video progress data.
+    API endpoint to retrieve video progress data.
     
     Fetches progress information for all videos that have been watched,
     including current position, completion status, and metadata.
     
+    Query parameters (optional, both served from indexes):
+        - chapter: Only return videos of this chapter
+        - since: Only return rows with last_watched >= this timestamp
+                 ('YYYY-MM-DD HH:MM:SS'), for delta syncing
+    
+    The response carries an ETag derived from the progress revision;
+    a matching If-None-Match yields 304 without querying any rows.
+    
     Returns:
         JSON object where keys are video paths and values contain:
         {
@@ -321,39 +535,79 @@ def get_all_progress():
             'duration': float          # Total video duration in seconds
         }
     """
-    print(f"[GET ALL PROGRESS] Fetching all progress data...")
+    chapter = request.args.get('chapter')
+    since = request.args.get('since')
+    logger.debug("[GET ALL PROGRESS] Fetching progress data (chapter=%s, since=%s)...", chapter, since)
     
     try:
-        conn = sqlite3.connect(get_db_path())
-        c = conn.cursor()
-        c.execute('SELECT video_path, current_time, playback_speed, watch_percentage, completed, last_watched, duration FROM video_progress')
-        results = c.fetchall()
-        conn.close()
+        # Tag first: a write racing with the query then only causes a spare 200
+        etag = hashlib.sha1(f"{progress.get_revision_tag()}|{chapter}|{since}".encode()).hexdigest()[:20]
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
         
-        # Convert database results to dictionary format
-        progress_dict = {
-            row[0]: {
-                'current_time': row[1],
-                'playback_speed': row[2],
-                'watch_percentage': row[3], 
-                'completed': row[4],
-                'last_watched': row[5],
-                'duration': row[6]
-            } for row in results
+        progress_dict = query_progress(chapter, since)
+        logger.debug("[GET ALL PROGRESS] Retrieved %d video progress records", len(progress_dict))
+        response = jsonify(progress_dict)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        logger.error("[GET ALL PROGRESS] Error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/progress/query', methods=['POST'])
+def query_progress_api():
+    """
+    API endpoint to retrieve progress for a playlist in one request.
+    
+    The rows come from a single indexed query per chapter, or one
+    WHERE video_path IN (...) query per IN_QUERY_CHUNK paths.
+    
+    Expected JSON (either key, or both to intersect them):
+        {
+            'video_paths': [str, ...],  # Videos to look up
+            'chapter': str              # Every video of this chapter
         }
-        print(f"[GET ALL PROGRESS] Retrieved {len(progress_dict)} video progress records")
+    
+    Returns:
+        JSON object in the /api/get-all-progress format; videos without
+        progress are left out
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+    
+    chapter = data.get('chapter')
+    video_paths = data.get('video_paths')
+    if chapter is not None and not isinstance(chapter, str):
+        return jsonify({'status': 'error', 'message': 'chapter must be a string'}), 400
+    if video_paths is not None and (not isinstance(video_paths, list) or
+                                    not all(isinstance(path, str) for path in video_paths)):
+        return jsonify({'status': 'error', 'message': 'video_paths must be a list of strings'}), 400
+    if chapter is None and video_paths is None:
+        return jsonify({'status': 'error', 'message': 'Provide video_paths or chapter'}), 400
+    
+    count = len(video_paths) if video_paths is not None else 'all'
+    logger.debug("[QUERY PROGRESS] Fetching progress (chapter=%s, videos=%s)", chapter, count)
+    try:
+        progress_dict = query_progress(chapter, video_paths=video_paths)
+        logger.debug("[QUERY PROGRESS] Retrieved %d video progress records", len(progress_dict))
         return jsonify(progress_dict)
     except Exception as e:
-        print(f"[GET ALL PROGRESS] Error: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("[QUERY PROGRESS] Error: %s", e)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
 
 @app.route('/api/settings', methods=['GET', 'POST'])
 def settings():
     """
     API endpoint for managing user settings.
     
-    GET: Returns all current user settings as JSON
-    POST: Updates user settings with provided key-value pairs
+    GET: Returns all current user settings as JSON (served from memory,
+         with an ETag; 304 if the client's copy is current)
+    POST: Validates and updates user settings in one transaction
     
     Settings include:
         - theme: 'dark' or 'light'
@@ -366,27 +620,29 @@ def settings():
     Returns:
         JSON response with settings data or success status
     """
-    conn = sqlite3.connect(get_db_path())
-    c = conn.cursor()
-    
+    store = settings_store.get_store()
     if request.method == 'POST':
         # Update settings with provided data
-        data = request.json
-        print(f"[SETTINGS] Updating settings: {data}")
+        data = request.get_json(silent=True)
+        logger.debug("[SETTINGS] Updating settings: %s", data)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
         
-        # Insert or update each setting key-value pair
-        for key, value in data.items():
-            c.execute("INSERT OR REPLACE INTO user_settings (setting_key, setting_value) VALUES (?, ?)",
-                     (key, str(value)))
-        conn.commit()
-        conn.close()
+        # Validate every value, then write them all in one transaction
+        try:
+            store.update(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
         return jsonify({'status': 'success'})
     else:
-        # Retrieve all current settings
-        c.execute('SELECT setting_key, setting_value FROM user_settings')
-        settings_data = {row[0]: row[1] for row in c.fetchall()}
-        conn.close()
-        return jsonify(settings_data)
+        etag = store.etag()
+        if etag in request.if_none_match:
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(store.get_all())
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
 
 @app.route('/api/analytics')
 def analytics():
@@ -398,108 +654,115 @@ def analytics():
     - Total watch time in seconds
     - Per-chapter statistics with completion rates
     - Average progress percentages including unwatched videos
+    - Course length and time remaining from probed video durations
     
     The analytics account for the actual number of videos in each
     chapter folder, treating unwatched videos as 0% progress for
-    accurate average calculations.
+    accurate average calculations. Aggregates are maintained
+    incrementally as progress is saved, so this is a per-chapter
+    read with no filesystem access.
     
     Returns:
         JSON object containing:
         {
             'completed_videos': int,     # Total videos marked as completed
             'total_watch_time_seconds': float,  # Total seconds watched
+            'total_duration_seconds': int,  # Length of all known videos
+            'remaining_seconds': int,    # Unwatched time of those videos
             'chapter_stats': {           # Per-chapter breakdown
                 'chapter_name': {
                     'total_videos': int,     # Actual video count in folder
                     'completed_videos': int,  # Number completed in chapter
                     'avg_progress': float,    # Average % including unwatched
-                    'watch_time': float      # Chapter watch time in seconds
+                    'watch_time': float,     # Chapter watch time in seconds
+                    'total_duration': float,  # Chapter length in seconds
+                    'remaining_duration': float,  # Unwatched seconds
+                    'videos_with_duration': int  # Videos with a known length
                 }
             }
         }
     """
-    print(f"[ANALYTICS] Computing analytics...")
+    logger.debug("[ANALYTICS] Computing analytics...")
     
     try:
-        conn = sqlite3.connect(get_db_path())
-        c = conn.cursor()
-        
-        # Retrieve all video progress data from database
-        c.execute('SELECT chapter, watch_percentage, completed, duration FROM video_progress')
-        results = c.fetchall()
-        conn.close()
-        
-        # Calculate overall analytics
-        total_videos_watched = len(results)
-        completed_videos = sum(1 for r in results if r[2] == 1)  # Count completed videos
-        total_watch_time = sum(r[3] * (r[1] / 100) for r in results if r[3])  # Sum actual watch time
-        
-        # Get actual video counts from filesystem to handle unwatched videos
         base_path = get_content_folder()
         if not base_path:
             return jsonify({'error': 'No content folder configured'}), 400
-        actual_chapter_videos = {}
-        for chapter_folder in os.listdir(base_path):
-            chapter_path = os.path.join(base_path, chapter_folder)
-            if os.path.isdir(chapter_path):
-                # Count video files with supported extensions
-                video_count = len([f for f in os.listdir(chapter_path) 
-                                  if f.endswith(('.mp4', '.mov', '.avi', '.mkv', '.webm'))])
-                actual_chapter_videos[chapter_folder] = video_count
-        
-        # Aggregate progress data by chapter
-        chapter_progress = {}
-        for row in results:
-            chapter = row[0]
-            if chapter not in chapter_progress:
-                chapter_progress[chapter] = {
-                    'completed_videos': 0,
-                    'total_progress': 0,
-                    'watched_count': 0,
-                    'watch_time': 0
-                }
-            chapter_progress[chapter]['watched_count'] += 1
-            if row[2] == 1:  # If video is completed
-                chapter_progress[chapter]['completed_videos'] += 1
-            chapter_progress[chapter]['total_progress'] += row[1]  # Add watch percentage
-            if row[3]:  # If duration is available
-                chapter_progress[chapter]['watch_time'] += row[3] * (row[1] / 100)
-        
-        # Calculate final statistics including unwatched videos as 0% progress
-        chapter_stats = {}
-        for chapter, actual_total in actual_chapter_videos.items():
-            progress_data = chapter_progress.get(chapter, {
-                'completed_videos': 0,
-                'total_progress': 0,
-                'watched_count': 0,
-                'watch_time': 0
-            })
-            
-            # Average progress considers all videos in chapter (unwatched = 0%)
-            avg_progress = progress_data['total_progress'] / actual_total if actual_total > 0 else 0
-            
-            chapter_stats[chapter] = {
-                'total_videos': actual_total,
-                'completed_videos': progress_data['completed_videos'],
-                'avg_progress': avg_progress,
-                'watch_time': progress_data['watch_time']
-            }
-        
-        # Prepare final analytics response
-        analytics_data = {
-            'total_videos_watched': total_videos_watched,
-            'completed_videos': completed_videos,
-            'total_watch_time_seconds': int(total_watch_time),
-            'chapter_stats': chapter_stats
-        }
+        analytics_data = analytics_snapshot(base_path)
         
-        print(f"[ANALYTICS] Analytics computed: {total_videos_watched} videos, {completed_videos} completed")
+        logger.debug("[ANALYTICS] Analytics computed: %d videos, %d completed",
+                     analytics_data['total_videos_watched'], analytics_data['completed_videos'])
         return jsonify(analytics_data)
         
     except Exception as e:
-        print(f"[ANALYTICS] Error: {str(e)}")
+        logger.error("[ANALYTICS] Error: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/metrics')
+def metrics_api():
+    """
+    API endpoint exposing the server's instrumentation.
+    
+    Covers per-route latency, SQLite statement timings, media bytes sent,
+    catalog scan durations and progress flush sizes, summed over every
+    pre-fork worker (see metrics.share_to()).
+    
+    Query parameters:
+        format: 'json' for a summary with estimated percentiles (used by
+                the desktop app); Prometheus text format otherwise
+    
+    Returns:
+        Prometheus text exposition, or the JSON summary
+    """
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.get_summary())
+    return app.response_class(metrics.render_prometheus(),
+                              content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/profiling', methods=['GET', 'POST'])
+def profiling_api():
+    """
+    API endpoint to inspect and toggle request profiling.
+    
+    GET returns the settings, the saved profile files and the hot
+    functions. POST changes the settings; every worker process picks
+    them up within a second.
+    
+    Expected JSON (POST, all optional):
+        - enabled: true to start profiling sampled requests
+        - sample_rate: Fraction of requests to profile (0-1)
+        - mode: 'cprofile' or 'sampler'
+        - clear: true to delete the saved profile files
+        
+    Returns:
+        JSON with settings, directory, files, recent and hot
+    """
+    prof = profiler.get_profiler()
+    if request.method == 'POST':
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+        if data.pop('clear', False):
+            prof.prune(keep=0)
+        if data and not set_profiling_settings(**data):
+            return jsonify({'status': 'error', 'message': 'Invalid profiling settings'}), 400
+        logger.info("[PROFILE] Settings: %s", get_profiling_settings())
+    status = prof.status()
+    status['hot'] = prof.hot_functions()
+    return jsonify(status)
+
+@app.route('/diagnostics')
+def diagnostics():
+    """
+    Diagnostics page listing the hottest functions of recent profiles.
+    
+    Returns:
+        Rendered diagnostics.html template
+    """
+    prof = profiler.get_profiler()
+    return render_template('diagnostics.html', status=prof.status(),
+                           hot=prof.hot_functions(limit=50))
+
 # ============================================================================
 # Custom Static File Serving (for dynamic content folder)
 # ============================================================================
@@ -510,12 +773,312 @@ def serve_static(filename):
     Serve static files from the configured content folder.
     
     This allows serving content from a user-selected folder
-    rather than the default Flask static folder.
+    rather than the default Flask static folder. Supports byte ranges
+    and conditional requests (see media.py).
     """
     content_folder = get_content_folder()
-    if content_folder:
-        return send_from_directory(content_folder, filename)
-    return "Content folder not configured", 404
+    if not content_folder:
+        return "Content folder not configured", 404
+
+    file_path = safe_join(content_folder, filename)
+    if file_path is None:
+        abort(404)
+
+    # Catalog size/mtime lets conditional requests skip the filesystem
+    chapter, _, file_name = filename.partition('/')
+    entry = catalog.get_file(chapter, file_name) if file_name else None
+    if entry is None:
+        if not os.path.isfile(file_path):
+            abort(404)
+        return media.send_media(file_path)
+
+    def on_stat_change(size, mtime):
+        catalog.update_file_stat(chapter, file_name, size, mtime)
+
+    # A faststart copy of an MP4 with its index at the end is served instead.
+    # The copy is keyed by the catalog's size/mtime of the original, which
+    # the watcher keeps current, and the queue's index supplies the copy's
+    # own size/mtime, so neither file is stat'ed here. The copy keeps the
+    # original's container, hence its Content-Type.
+    if file_name.lower().endswith(remux.REMUX_EXTENSIONS):
+        remuxed = remux.get_queue().get_remuxed(chapter, file_name, entry[0], entry[1])
+        if remuxed:
+            copy_path, copy_size, copy_mtime = remuxed
+            try:
+                return media.send_media(copy_path, copy_size, copy_mtime,
+                                        content_type=media.get_content_type(file_path))
+            except FileNotFoundError:
+                remux.get_queue().discard(chapter, file_name, entry[0], entry[1])
+
+    try:
+        return media.send_media(file_path, entry[0], entry[1], on_stat_change)
+    except FileNotFoundError:
+        abort(404)
+
+
+@app.route('/api/faststart', methods=['GET'])
+def faststart_report():
+    """
+    API endpoint reporting MP4/MOV files that are not faststart.
+    
+    Such files keep their index (moov box) at the end, so the browser
+    has to read the end of the file before playback starts. Detection
+    happens while probing video metadata after catalog scans.
+    
+    Returns:
+        JSON response:
+        {
+            'ffmpeg': bool,      # ffmpeg available as remux fallback
+            'files': [{'chapter': str, 'file_name': str, 'size': int,
+                       'status': 'original' | 'queued' | 'remuxed' | 'failed'}]
+        }
+    """
+    return jsonify(remux.get_report())
+
+
+@app.route('/api/faststart/remux', methods=['POST'])
+def faststart_remux():
+    """
+    API endpoint queueing faststart copies of non-faststart videos.
+    
+    Copies are written in the background to the cache directory, one
+    file at a time, and served by serve_static() once ready.
+    
+    Expected JSON (optional):
+        {'chapter': str}   # Only remux videos of this chapter
+    
+    Returns:
+        JSON response with the number of videos queued
+    """
+    base_path = get_content_folder()
+    if not base_path:
+        return jsonify({'status': 'error', 'message': 'Content folder not configured'}), 400
+    data = request.get_json(silent=True) or {}
+    chapter = data.get('chapter') if isinstance(data, dict) else None
+    
+    files = [entry for entry in metadata.get_slow_start_files()
+             if chapter is None or entry[0] == chapter]
+    queued = remux.get_queue().enqueue(base_path, files)
+    logger.info("[REMUX] Queued %d video(s)", queued)
+    return jsonify({'status': 'success', 'queued': queued})
+
+@app.route('/api/next-video', methods=['POST'])
+def next_video():
+    """
+    API endpoint returning the video after the given one in its chapter.
+
+    The player calls this shortly before a video ends. The next video's
+    first bytes (and an MP4's trailing index) are pre-warmed in the OS
+    page cache, so autoplay starts without waiting for the disk.
+
+    Expected JSON:
+        {
+            'chapter': str,      # Chapter folder name
+            'video_name': str    # Video currently playing
+        }
+
+    Returns:
+        JSON response:
+        {
+            'next': {'video_name': str, 'video_path': str} or None,
+            'prewarmed': int     # Bytes requested from the OS
+        }
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('chapter'), str) \
+            or not isinstance(data.get('video_name'), str):
+        return jsonify({'status': 'error', 'message': 'chapter and video_name are required'}), 400
+
+    base_path = get_content_folder()
+    if not base_path:
+        return jsonify({'next': None, 'prewarmed': 0})
+
+    chapter = data['chapter']
+    catalog.refresh_catalog(base_path)
+    videos = catalog.get_chapters(chapter).get(chapter, {}).get('videos', [])
+    try:
+        index = videos.index(data['video_name'])
+    except ValueError:
+        return jsonify({'next': None, 'prewarmed': 0})
+    if index + 1 >= len(videos):
+        return jsonify({'next': None, 'prewarmed': 0})
+
+    next_name = videos[index + 1]
+    file_path = safe_join(base_path, chapter, next_name)
+    prewarmed = media.prewarm(file_path) if file_path else 0
+    return jsonify({
+        'next': {'video_name': next_name, 'video_path': f"/static/{chapter}/{next_name}"},
+        'prewarmed': prewarmed
+    })
+
+
+# Thumbnail ids change with the video, so images can be cached for a year
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+@app.route('/api/thumbnails/<path:chapter>')
+def chapter_thumbnails(chapter):
+    """
+    API endpoint listing the poster frames of a chapter's videos.
+    
+    Missing frames are queued for background generation (ffmpeg), and
+    generation for any previously opened chapter stops. The player polls
+    this endpoint while 'pending' is above 0.
+    
+    Returns:
+        JSON response:
+        {
+            'available': bool,   # False if ffmpeg is not installed
+            'pending': int,      # Frames still being generated
+            'thumbnails': {file_name: '/thumbs/<id>' or None}
+        }
+    """
+    base_path = get_content_folder()
+    if not base_path:
+        return jsonify({'available': False, 'pending': 0, 'thumbnails': {}})
+    
+    catalog.refresh_catalog(base_path)
+    videos = catalog.get_file_stats(chapter)
+    durations = {name: info['duration'] for name, info in metadata.get_metadata(chapter).items()}
+    thumbs, pending = thumbnails.get_generator().request_chapter(base_path, chapter, videos, durations)
+    return jsonify({
+        'available': thumbnails.find_ffmpeg() is not None,
+        'pending': pending,
+        'thumbnails': {
+            name: url_for('serve_thumbnail', thumb=thumb) if thumb else None
+            for name, thumb in thumbs.items()
+        }
+    })
+
+@app.route('/thumbs/<thumb>')
+def serve_thumbnail(thumb):
+    """Serve a cached poster frame with long-lived cache headers."""
+    path = thumbnails.get_thumb_path(thumb)
+    if path is None:
+        abort(404)
+    thumbnails.touch(path)
+    response = send_file(path, mimetype='image/jpeg', etag=thumb, max_age=THUMBNAIL_MAX_AGE,
+                         conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _hls_source(video):
+    """
+    Resolve an HLS request to the video it streams.
+    
+    Args:
+        video: '<chapter>/<file name>' below the content folder
+        
+    Returns:
+        (file path, stream id, duration in seconds); aborts with 404 for
+        unknown videos or videos whose duration cannot be read
+    """
+    base_path = get_content_folder()
+    file_path = safe_join(base_path, video) if base_path else None
+    chapter, _, file_name = video.partition('/')
+    entry = catalog.get_file(chapter, file_name) if file_path and file_name else None
+    if entry is None:
+        abort(404)
+    
+    duration = metadata.get_metadata(chapter).get(file_name, {}).get('duration')
+    if not duration:
+        # Not probed yet; reading the header takes milliseconds
+        try:
+            duration = metadata.probe_file(file_path)['duration']
+        except OSError:
+            abort(404)
+    if not duration:
+        abort(404)
+    return file_path, cache.cache_key(chapter, file_name, entry[0], entry[1]), duration
+
+
+def _immutable_media(path, mimetype, etag):
+    """Send a cached HLS file whose URL changes with the video."""
+    response = send_file(path, mimetype=mimetype, etag=etag,
+                         max_age=THUMBNAIL_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route('/hls/<path:video>/master.m3u8')
+def hls_master(video):
+    """
+    Serve the HLS master playlist of a video.
+    
+    Used by the player for .mkv/.avi files when ffmpeg is installed. It
+    names the stream's codecs, which Media Source Extensions need, so the
+    init segment (and with it segment 0) is generated here.
+    """
+    if not hls.is_available():
+        return jsonify({'status': 'error', 'message': 'ffmpeg is not installed'}), 503
+    file_path, stream, duration = _hls_source(video)
+    init_path = hls.get_segmenter().get_init(file_path, stream, duration)
+    if init_path is None:
+        abort(404)
+    try:
+        with open(init_path, 'rb') as f:
+            codecs = hls.codecs_of(f.read())
+    except (OSError, ValueError):
+        abort(404)
+    response = app.response_class(hls.build_master_playlist(stream, codecs),
+                                  mimetype='application/vnd.apple.mpegurl')
+    response.set_etag(stream)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/hls/<path:video>/index.m3u8')
+def hls_playlist(video):
+    """
+    Serve the HLS media playlist of a video.
+    
+    Listed by hls_master(); the segments it lists are generated on request
+    by hls_segment().
+    """
+    if not hls.is_available():
+        return jsonify({'status': 'error', 'message': 'ffmpeg is not installed'}), 503
+    _, stream, duration = _hls_source(video)
+    response = app.response_class(hls.build_playlist(duration, stream),
+                                  mimetype='application/vnd.apple.mpegurl')
+    response.set_etag(stream)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route('/hls/<path:video>/init.mp4')
+def hls_init(video):
+    """
+    Serve the fragmented MP4 init segment of a video (EXT-X-MAP).
+    
+    The playlist adds the stream id as ?v=, which changes with the video,
+    so it can be cached like thumbnails.
+    """
+    file_path, stream, duration = _hls_source(video)
+    if request.args.get('v', stream) != stream:
+        abort(404)
+    path = hls.get_segmenter().get_init(file_path, stream, duration)
+    if path is None:
+        abort(404)
+    return _immutable_media(path, 'video/mp4', f"{stream}-init")
+
+
+@app.route('/hls/<path:video>/<int:index>.m4s')
+def hls_segment(video, index):
+    """
+    Serve one fragmented MP4 segment, transcoding it first if it is not cached.
+    
+    A segment already being generated by a prefetch is waited for rather
+    than transcoded a second time.
+    """
+    file_path, stream, duration = _hls_source(video)
+    if request.args.get('v', stream) != stream:
+        abort(404)
+    path = hls.get_segmenter().get_segment(file_path, stream, index, duration)
+    if path is None:
+        abort(404)
+    return _immutable_media(path, 'video/mp4', f"{stream}-{index}")
 
 
 # ============================================================================
@@ -559,6 +1122,12 @@ def set_content_folder_api():
         return jsonify({'status': 'error', 'message': 'Folder does not exist'}), 400
     
     if set_static_folder(folder):
+        # Move the content watcher (see server.py) to the new folder
+        for callback in list(_content_folder_listeners):
+            try:
+                callback(get_content_folder())
+            except Exception as e:
+                logger.error("[CONTENT FOLDER] Change listener failed: %s", e)
         return jsonify({
             'status': 'success',
             'folder': folder
@@ -578,4 +1147,5 @@ if __name__ == '__main__':
     Starts the Flask development server with debug mode enabled
     for development purposes. In production, use a proper WSGI server.
     """
+    logging.basicConfig(level=logging.DEBUG, format='%(message)s')
     app.run(debug=True)
@@ -0,0 +1,169 @@
+"""
+Benchmark Fixtures
+
+Synthetic course data shared by the load test and the micro-benchmarks:
+- An isolated config directory, so benchmarks never touch the user's
+  settings, database or caches
+- A content tree of N chapters x M dummy videos (sparse files) and PDFs
+- A video_progress table pre-populated through the app's own schema and
+  UPSERT, so fixtures follow schema changes
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+# The repository root holds the application modules
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+# Default size of a dummy video; files are sparse, so this costs no disk
+VIDEO_BYTES = 64 * 1024 * 1024
+
+# Size of a dummy PDF
+PDF_BYTES = 16 * 1024
+
+
+def isolate(workdir: str) -> Path:
+    """
+    Point the app's config directory at a folder below workdir.
+
+    Must run before any application module is imported, since the config
+    and database paths are resolved once per process.
+
+    Args:
+        workdir: Scratch folder of the benchmark run
+
+    Returns:
+        Path: Folder used as the platform config base
+    """
+    base = Path(workdir).resolve() / 'config'
+    base.mkdir(parents=True, exist_ok=True)
+    os.environ['XDG_CONFIG_HOME'] = str(base)   # Linux
+    os.environ['APPDATA'] = str(base)           # Windows
+    if sys.platform == 'darwin':
+        os.environ['HOME'] = str(base)          # ~/Library/Application Support
+    return base
+
+
+def chapter_name(index: int) -> str:
+    """Name of the index-th synthetic chapter."""
+    return f"Chapter {index + 1:03d}"
+
+
+def video_name(index: int) -> str:
+    """Name of the index-th synthetic video of a chapter."""
+    return f"Lecture {index + 1:04d}.mp4"
+
+
+def make_content_tree(root: str, chapters: int, videos: int, pdfs: int = 1,
+                      video_bytes: int = VIDEO_BYTES) -> List[Tuple[str, str]]:
+    """
+    Create chapters x videos dummy files (skipping files that exist).
+
+    Args:
+        root: Content folder to fill
+        chapters: Number of chapter folders
+        videos: Videos per chapter
+        pdfs: PDFs per chapter
+        video_bytes: Apparent size of each video
+
+    Returns:
+        List of (chapter, video file name)
+    """
+    created = []
+    for c in range(chapters):
+        folder = Path(root) / chapter_name(c)
+        folder.mkdir(parents=True, exist_ok=True)
+        for v in range(videos):
+            path = folder / video_name(v)
+            if not path.exists():
+                with open(path, 'wb') as f:
+                    f.truncate(video_bytes)
+            created.append((chapter_name(c), video_name(v)))
+        for p in range(pdfs):
+            path = folder / f"Notes {p + 1:02d}.pdf"
+            if not path.exists():
+                with open(path, 'wb') as f:
+                    f.write(b'%PDF-1.4\n' + b'\0' * (PDF_BYTES - 9))
+    return created
+
+
+def progress_rows(videos: List[Tuple[str, str]], count: int, seed: int = 1) -> List[tuple]:
+    """
+    Build progress rows in progress.PROGRESS_COLUMNS order.
+
+    Args:
+        videos: (chapter, file name) pairs; rows beyond len(videos) get
+                synthetic paths in the same chapters
+        count: Number of rows
+        seed: Random seed, for reproducible data
+
+    Returns:
+        List of row tuples
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        chapter, name = videos[i % len(videos)]
+        if i >= len(videos):
+            name = f"{name[:-4]}-{i // len(videos)}.mp4"
+        duration = rng.uniform(300, 3600)
+        percentage = rng.choice((0.0, rng.uniform(1, 99), 100.0))
+        rows.append((
+            f"/static/{chapter}/{name}", chapter, name,
+            duration * percentage / 100, duration, rng.choice((1.0, 1.25, 1.5, 2.0)),
+            percentage,
+            (now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))).strftime('%Y-%m-%d %H:%M:%S'),
+        ))
+    return rows
+
+
+def populate_progress(rows: List[tuple]):
+    """
+    Create the schema (by importing the app) and upsert progress rows.
+
+    Args:
+        rows: Rows from progress_rows()
+    """
+    import app  # Creates the schema on import
+    import database
+    import progress
+    with database.transaction() as conn:
+        conn.executemany(progress.UPSERT_SQL, rows)
+    database.release_connection()
+
+
+def build(workdir: str, chapters: int, videos: int, progress_count: int,
+          pdfs: int = 1, video_bytes: int = VIDEO_BYTES) -> List[Tuple[str, str]]:
+    """
+    Create a complete benchmark environment below workdir.
+
+    isolate() must have been called first.
+
+    Args:
+        workdir: Scratch folder of the benchmark run
+        chapters: Number of chapters
+        videos: Videos per chapter
+        progress_count: Rows to pre-populate in video_progress
+        pdfs: PDFs per chapter
+        video_bytes: Apparent size of each video
+
+    Returns:
+        List of (chapter, video file name) in the content tree
+    """
+    from config import set_static_folder
+    content = os.path.join(workdir, 'content')
+    tree = make_content_tree(content, chapters, videos, pdfs, video_bytes)
+    set_static_folder(content)
+    if progress_count:
+        populate_progress(progress_rows(tree, progress_count))
+    return tree
@@ -0,0 +1,426 @@
+"""
+HTTP Load Test
+
+Drives the real server with simulated viewers and reports latency per
+route:
+- Builds a synthetic content tree and progress database in a scratch
+  folder (see fixtures.py); the user's config is never touched
+- Starts the app through FlaskServerWrapper in a separate process, so the
+  load generator does not compete with the server for the GIL
+- Each viewer keeps one keep-alive connection and, like the player, sends
+  a save-progress heartbeat every 3 s, reads its video with range requests
+  and now and then reloads the dashboard
+- Reports p50/p95/p99 latency and throughput per route, writes them as a
+  JSON baseline and compares against an earlier baseline
+
+Usage:
+    python benchmarks/load_test.py --viewers 20 --duration 30 --output base.json
+    python benchmarks/load_test.py --compare base.json --max-regression 20
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import fixtures
+
+# Seconds between two save-progress heartbeats (the player's interval)
+HEARTBEAT_SECONDS = 3.0
+
+# Seconds between two range requests of a viewer (media buffering)
+RANGE_SECONDS = 1.0
+
+# Bytes per range request
+RANGE_BYTES = 1024 * 1024
+
+# Seconds between two dashboard loads of a viewer
+DASHBOARD_SECONDS = 30.0
+
+# Seconds to wait for the server process to accept connections
+STARTUP_TIMEOUT = 60.0
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    """
+    Return the q-th percentile (0-100) of samples, nearest-rank method.
+
+    Args:
+        samples: Observed values
+        q: Percentile
+
+    Returns:
+        Optional[float]: Percentile, or None without samples
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class Recorder:
+    """Collects request latencies per route from all viewer threads."""
+
+    def __init__(self):
+        """Initialize empty samples."""
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.bytes: Dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, seconds: float, ok: bool, size: int):
+        """Store one request."""
+        with self._lock:
+            if ok:
+                self.samples[route].append(seconds)
+                self.bytes[route] += size
+            else:
+                self.errors[route] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, Any]]:
+        """
+        Summarize the samples.
+
+        Args:
+            elapsed: Wall time of the measurement in seconds
+
+        Returns:
+            Dict mapping route to count, errors, throughput and latency
+            percentiles in milliseconds
+        """
+        result = {}
+        with self._lock:
+            for route in sorted(set(self.samples) | set(self.errors)):
+                samples = self.samples.get(route, [])
+                result[route] = {
+                    'count': len(samples),
+                    'errors': self.errors.get(route, 0),
+                    'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+                    'mb_per_s': round(self.bytes.get(route, 0) / elapsed / (1024 * 1024), 2)
+                                if elapsed else 0,
+                    'p50_ms': _ms(percentile(samples, 50)),
+                    'p95_ms': _ms(percentile(samples, 95)),
+                    'p99_ms': _ms(percentile(samples, 99)),
+                    'max_ms': _ms(max(samples) if samples else None),
+                }
+        return result
+
+
+def _ms(value: Optional[float]) -> Optional[float]:
+    """Seconds to rounded milliseconds."""
+    return None if value is None else round(value * 1000, 3)
+
+
+class Viewer(threading.Thread):
+    """One simulated viewer watching a video in the player."""
+
+    def __init__(self, index: int, port: int, tree: List[Tuple[str, str]], recorder: Recorder,
+                 deadline: float, video_bytes: int, seed: int):
+        """
+        Initialize a viewer.
+
+        Args:
+            index: Viewer number
+            port: Server port
+            tree: (chapter, video) pairs to pick from
+            recorder: Shared latency recorder
+            deadline: time.monotonic() at which to stop
+            video_bytes: Size of each video, for range offsets
+            seed: Random seed
+        """
+        super().__init__(name=f'viewer-{index}', daemon=True)
+        self.port = port
+        self.tree = tree
+        self.recorder = recorder
+        self.deadline = deadline
+        self.video_bytes = video_bytes
+        self.rng = random.Random(seed)
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, route: str, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None):
+        """Send one request on the viewer's connection and time it."""
+        headers = dict(headers or {})
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        ok, size = False, 0
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+                self.conn.request(method, path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                size = len(response.read())
+                ok = response.status < 400
+                if response.will_close:
+                    self.conn.close()
+                    self.conn = None
+                break
+            except (OSError, http.client.HTTPException):
+                # Keep-alive connection closed by the server; reconnect once
+                if self.conn is not None:
+                    self.conn.close()
+                    self.conn = None
+                if attempt:
+                    break
+                start = time.perf_counter()
+        self.recorder.record(route, time.perf_counter() - start, ok, size)
+
+    def run(self):
+        """Watch videos until the deadline."""
+        chapter, video = self.rng.choice(self.tree)
+        path = quote(f"/static/{chapter}/{video}")
+        position = self.rng.uniform(0, 600)
+        duration = 3600.0
+        offset = 0
+        now = time.monotonic()
+        # Spread the viewers' schedules so they do not fire in lockstep
+        due = {
+            'heartbeat': now + self.rng.uniform(0, HEARTBEAT_SECONDS),
+            'range': now + self.rng.uniform(0, RANGE_SECONDS),
+            'dashboard': now + self.rng.uniform(0, DASHBOARD_SECONDS),
+        }
+        self.request('player', 'GET', quote(f"/player/{chapter}"))
+        try:
+            while True:
+                action = min(due, key=due.get)
+                wait = due[action] - time.monotonic()
+                if due[action] >= self.deadline:
+                    break
+                if wait > 0:
+                    time.sleep(wait)
+
+                if action == 'heartbeat':
+                    position += HEARTBEAT_SECONDS
+                    payload = {'video_path': f"/static/{chapter}/{video}", 'chapter': chapter,
+                               'video_name': video, 'current_time': position,
+                               'duration': duration, 'playback_speed': 1.0}
+                    self.request('save-progress', 'POST', '/api/save-progress',
+                                 json.dumps(payload).encode())
+                    due[action] += HEARTBEAT_SECONDS
+                elif action == 'range':
+                    end = min(offset + RANGE_BYTES, self.video_bytes) - 1
+                    self.request('static-range', 'GET', path,
+                                 headers={'Range': f'bytes={offset}-{end}'})
+                    offset = end + 1 if end + 1 < self.video_bytes else 0
+                    due[action] += RANGE_SECONDS
+                else:
+                    self.request('dashboard', 'GET', '/')
+                    self.request('analytics', 'GET', '/api/analytics')
+                    self.request('get-all-progress', 'GET', '/api/get-all-progress')
+                    due[action] += DASHBOARD_SECONDS
+        finally:
+            if self.conn is not None:
+                self.conn.close()
+
+
+def _free_port() -> int:
+    """Ask the OS for an unused local port."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_ready(port: int, process: subprocess.Popen):
+    """Poll the server until it answers or the process exits."""
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server process exited during startup')
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/settings')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start in time')
+
+
+def serve(port: int):
+    """
+    Child process: run the app through FlaskServerWrapper until stdin closes.
+
+    Args:
+        port: Port to listen on
+    """
+    from server import FlaskServerWrapper
+    wrapper = FlaskServerWrapper()
+    if not wrapper.start('127.0.0.1', port):
+        sys.exit(1)
+    try:
+        sys.stdin.read()
+    finally:
+        wrapper.stop()
+
+
+def run_load(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Build fixtures, start the server, run the viewers and collect results.
+
+    Args:
+        args: Parsed command line
+
+    Returns:
+        Dict: Baseline document (parameters, environment and routes)
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix='course-bench-')
+    fixtures.isolate(workdir)
+    build_start = time.perf_counter()
+    tree = fixtures.build(workdir, args.chapters, args.videos, args.progress_rows,
+                          video_bytes=args.video_bytes)
+    from config import set_server_settings
+    set_server_settings(backend=args.backend, threads=args.threads, workers=args.workers)
+    print(f"[BENCH] Fixtures in {workdir} ({len(tree)} videos, "
+          f"{args.progress_rows} progress rows) built in {time.perf_counter() - build_start:.1f}s")
+
+    port = args.port or _free_port()
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)],
+                               stdin=subprocess.PIPE, env=os.environ.copy())
+    try:
+        _wait_until_ready(port, process)
+        print(f"[BENCH] Server ready on port {port}; {args.viewers} viewer(s) for {args.duration}s")
+
+        recorder = Recorder()
+        start = time.monotonic()
+        deadline = start + args.duration
+        viewers = [Viewer(i, port, tree, recorder, deadline, args.video_bytes, args.seed + i)
+                   for i in range(args.viewers)]
+        for viewer in viewers:
+            viewer.start()
+        for viewer in viewers:
+            viewer.join()
+        elapsed = time.monotonic() - start
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'parameters': {
+            'viewers': args.viewers, 'duration': args.duration, 'chapters': args.chapters,
+            'videos': args.videos, 'progress_rows': args.progress_rows,
+            'backend': args.backend, 'threads': args.threads, 'workers': args.workers,
+            'seed': args.seed,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'routes': recorder.report(elapsed),
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    """Print the per-route table."""
+    print(f"\n{'Route':<18}{'Count':>8}{'Err':>6}{'req/s':>9}{'MB/s':>8}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in result['routes'].items():
+        print(f"{route:<18}{row['count']:>8}{row['errors']:>6}{row['throughput_rps']:>9}"
+              f"{row['mb_per_s']:>8}{_fmt(row['p50_ms']):>10}{_fmt(row['p95_ms']):>10}"
+              f"{_fmt(row['p99_ms']):>10}")
+
+
+def _fmt(value: Optional[float]) -> str:
+    """Format an optional number for the tables."""
+    return '-' if value is None else f"{value:.2f}"
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """
+    Print p95 latency and throughput changes against a baseline.
+
+    Args:
+        result: This run
+        baseline: Earlier run loaded from JSON
+        max_regression: Allowed p95 increase in percent
+
+    Returns:
+        bool: True if no route regressed beyond max_regression
+    """
+    if baseline.get('parameters') != result['parameters']:
+        print("[BENCH] Warning: baseline was recorded with different parameters")
+    print(f"\n{'Route':<18}{'p95 base':>10}{'p95 now':>10}{'change':>9}"
+          f"{'req/s base':>12}{'req/s now':>11}")
+    passed = True
+    for route, row in result['routes'].items():
+        old = baseline.get('routes', {}).get(route)
+        if not old or not old.get('p95_ms') or row['p95_ms'] is None:
+            print(f"{route:<18}{'-':>10}{_fmt(row['p95_ms']):>10}")
+            continue
+        change = (row['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+        flag = ''
+        if change > max_regression:
+            flag = '  REGRESSION'
+            passed = False
+        print(f"{route:<18}{_fmt(old['p95_ms']):>10}{_fmt(row['p95_ms']):>10}{change:>+8.1f}%"
+              f"{old['throughput_rps']:>12}{row['throughput_rps']:>11}{flag}")
+    return passed
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Load test the course player HTTP API')
+    parser.add_argument('--viewers', type=int, default=20, help='Concurrent simulated viewers')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+    parser.add_argument('--chapters', type=int, default=20, help='Chapters in the content tree')
+    parser.add_argument('--videos', type=int, default=25, help='Videos per chapter')
+    parser.add_argument('--progress-rows', type=int, default=500,
+                        help='Rows pre-populated in video_progress')
+    parser.add_argument('--video-bytes', type=int, default=fixtures.VIDEO_BYTES,
+                        help='Apparent size of each dummy video')
+    parser.add_argument('--backend', default='pool', choices=('pool', 'threaded', 'waitress'))
+    parser.add_argument('--threads', type=int, default=16, help='Server worker threads')
+    parser.add_argument('--workers', type=int, default=1, help='Server processes (pre-fork)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--port', type=int, default=0, help='Port (default: any free port)')
+    parser.add_argument('--workdir', help='Scratch folder (default: new temp folder)')
+    parser.add_argument('--output', help='Write the results as a JSON baseline')
+    parser.add_argument('--compare', help='Baseline JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='Allowed p95 increase in percent before --compare fails')
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    result = run_load(args)
+    print_report(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n[BENCH] Baseline written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Micro-Benchmarks
+
+Times the Python hot loops behind the dashboard and the player on large
+synthetic trees, without HTTP in the way:
+- catalog.full_scan: index()-style listing of every chapter folder
+  (refresh_catalog with force=True)
+- catalog.sweep_unchanged: the periodic mtime sweep when nothing changed
+- catalog.get_chapters: the chapter/video structure index() renders
+- analytics.get_analytics: the aggregation behind analytics()
+- progress.query_all: the query behind get_all_progress()
+- progress.serialize_all: get_all_progress() including JSON serialization
+
+Each tree size runs in its own process with its own config directory,
+since the database path is resolved once per process. Results are printed
+as a table (min/median/mean/stddev per benchmark), can be saved as JSON
+and compared with an earlier run.
+
+Usage:
+    python benchmarks/micro.py --sizes 1000,10000,100000 --output micro.json
+    python benchmarks/micro.py --compare micro.json
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import fixtures
+
+# Videos per synthetic chapter folder
+VIDEOS_PER_CHAPTER = 100
+
+# Each benchmark repeats until it ran this long (seconds) ...
+MIN_TIME = 1.0
+
+# ... and at least / at most this many rounds
+MIN_ROUNDS = 3
+MAX_ROUNDS = 100
+
+
+def bench(name: str, func: Callable[[], Any], min_time: float = MIN_TIME) -> Dict[str, Any]:
+    """
+    Time a function over several rounds.
+
+    Args:
+        name: Benchmark name
+        func: Function to call once per round
+        min_time: Seconds to keep repeating (within MIN_ROUNDS..MAX_ROUNDS)
+
+    Returns:
+        Dict with name, rounds and min/median/mean/stddev in milliseconds
+    """
+    func()  # Warm-up: caches, prepared statements, lazy imports
+    times = []
+    started = time.perf_counter()
+    while len(times) < MIN_ROUNDS or (time.perf_counter() - started < min_time
+                                      and len(times) < MAX_ROUNDS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {
+        'name': name,
+        'rounds': len(times),
+        'min_ms': round(min(times) * 1000, 3),
+        'median_ms': round(statistics.median(times) * 1000, 3),
+        'mean_ms': round(statistics.mean(times) * 1000, 3),
+        'stddev_ms': round(statistics.pstdev(times) * 1000, 3),
+    }
+
+
+def run_size(workdir: str, videos: int, progress_rows: int, min_time: float) -> List[Dict[str, Any]]:
+    """
+    Child process: build one tree size and run every benchmark on it.
+
+    Args:
+        workdir: Scratch folder for this size (reused between runs)
+        videos: Total number of videos
+        progress_rows: Rows in video_progress
+        min_time: Seconds per benchmark
+
+    Returns:
+        List of bench() results
+    """
+    fixtures.isolate(workdir)
+    chapters = max(1, -(-videos // VIDEOS_PER_CHAPTER))
+    per_chapter = min(videos, VIDEOS_PER_CHAPTER)
+    build_start = time.perf_counter()
+    fixtures.build(workdir, chapters, per_chapter, progress_rows, pdfs=1, video_bytes=0)
+    print(f"[BENCH] {chapters * per_chapter} videos, {progress_rows} progress rows "
+          f"ready in {time.perf_counter() - build_start:.1f}s")
+
+    import analytics as analytics_store
+    import catalog
+    from app import app, get_content_folder, query_progress
+    from flask import jsonify
+
+    content = get_content_folder()
+    catalog.refresh_catalog(content, force=True)
+
+    def serialize_all():
+        with app.test_request_context('/api/get-all-progress'):
+            jsonify(query_progress()).get_data()
+
+    return [
+        bench('catalog.full_scan', lambda: catalog.refresh_catalog(content, force=True), min_time),
+        bench('catalog.sweep_unchanged', lambda: catalog.sweep_catalog(content), min_time),
+        bench('catalog.get_chapters', catalog.get_chapters, min_time),
+        bench('analytics.get_analytics', analytics_store.get_analytics, min_time),
+        bench('progress.query_all', query_progress, min_time),
+        bench('progress.serialize_all', serialize_all, min_time),
+    ]
+
+
+def run_all(args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Run every size in its own process and collect the results.
+
+    Args:
+        args: Parsed command line
+
+    Returns:
+        Dict: Results document (parameters, environment and results)
+    """
+    workdir = args.workdir or tempfile.mkdtemp(prefix='course-micro-')
+    results = []
+    for size in args.sizes:
+        size_dir = os.path.join(workdir, f'size-{size}')
+        os.makedirs(size_dir, exist_ok=True)
+        out_path = os.path.join(size_dir, 'results.json')
+        command = [sys.executable, os.path.abspath(__file__), '--child', str(size),
+                   '--child-output', out_path, '--progress-rows', str(args.progress_rows),
+                   '--min-time', str(args.min_time), '--workdir', size_dir]
+        print(f"[BENCH] Size {size} in {size_dir}")
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL if args.quiet else None)
+        with open(out_path) as f:
+            for row in json.load(f):
+                row['size'] = size
+                results.append(row)
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'parameters': {'sizes': args.sizes, 'progress_rows': args.progress_rows},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+
+def print_table(document: Dict[str, Any]):
+    """Print results grouped by benchmark name."""
+    print(f"\n{'Benchmark':<26}{'Videos':>8}{'Rounds':>8}{'Min ms':>11}{'Median ms':>11}"
+          f"{'Mean ms':>11}{'StdDev':>10}")
+    for row in sorted(document['results'], key=lambda r: (r['name'], r['size'])):
+        print(f"{row['name']:<26}{row['size']:>8}{row['rounds']:>8}{row['min_ms']:>11.3f}"
+              f"{row['median_ms']:>11.3f}{row['mean_ms']:>11.3f}{row['stddev_ms']:>10.3f}")
+
+
+def compare(document: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> bool:
+    """
+    Print median changes against an earlier run.
+
+    Args:
+        document: This run
+        baseline: Earlier run loaded from JSON
+        max_regression: Allowed median increase in percent
+
+    Returns:
+        bool: True if no benchmark regressed beyond max_regression
+    """
+    old = {(row['name'], row['size']): row for row in baseline.get('results', [])}
+    print(f"\n{'Benchmark':<26}{'Videos':>8}{'Base ms':>11}{'Now ms':>11}{'Change':>9}")
+    passed = True
+    for row in sorted(document['results'], key=lambda r: (r['name'], r['size'])):
+        before: Optional[Dict[str, Any]] = old.get((row['name'], row['size']))
+        if not before or not before['median_ms']:
+            print(f"{row['name']:<26}{row['size']:>8}{'-':>11}{row['median_ms']:>11.3f}")
+            continue
+        change = (row['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+        flag = ''
+        if change > max_regression:
+            flag = '  REGRESSION'
+            passed = False
+        print(f"{row['name']:<26}{row['size']:>8}{before['median_ms']:>11.3f}"
+              f"{row['median_ms']:>11.3f}{change:>+8.1f}%{flag}")
+    return passed
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for catalog and analytics')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        type=lambda text: [int(part) for part in text.split(',') if part],
+                        help='Comma-separated video counts')
+    parser.add_argument('--progress-rows', type=int, default=100000,
+                        help='Rows pre-populated in video_progress')
+    parser.add_argument('--min-time', type=float, default=MIN_TIME,
+                        help='Seconds each benchmark repeats for')
+    parser.add_argument('--workdir', help='Scratch folder, reused between runs '
+                                          '(default: new temp folder)')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--compare', help='Earlier JSON results to compare against')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='Allowed median increase in percent before --compare fails')
+    parser.add_argument('--quiet', action='store_true', help="Hide the app's log output")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--child-output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        results = run_size(args.workdir, args.child, args.progress_rows, args.min_time)
+        with open(args.child_output, 'w') as f:
+            json.dump(results, f)
+        return
+
+    document = run_all(args)
+    print_table(document)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=2)
+        print(f"\n[BENCH] Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(document, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
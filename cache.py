@@ -0,0 +1,43 @@
+"""
+Cache Helpers
+
+Shared by the modules that keep generated files per video (thumbnails,
+faststart copies, HLS segments):
+- get_cache_dir(): <config dir>/cache/<name>, or ./cache/<name> when the
+  config module is not available (standalone mode)
+- cache_key(): the name of a video's cache entry, a hash of its chapter,
+  name, size and mtime, so entries of a changed video are never reused
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import hashlib
+from pathlib import Path
+
+# Import configuration module
+try:
+    from config import get_cache_dir
+except ImportError:
+    # Fallback if config not available (standalone mode)
+    def get_cache_dir(name: str) -> Path:
+        path = Path('cache') / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+def cache_key(chapter: str, file_name: str, size: int, mtime: float) -> str:
+    """
+    Build the cache name of a video's generated files.
+
+    Args:
+        chapter: Chapter folder name
+        file_name: Video file name
+        size: Video size in bytes
+        mtime: Video modification time
+
+    Returns:
+        str: 32 hex digits
+    """
+    key = f"{chapter}/{file_name}|{size}|{mtime!r}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
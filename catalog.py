@@ -0,0 +1,469 @@
+"""
+Content Catalog Module
+
+Maintains a persistent index of the course content folder so routes do not
+have to walk the filesystem on every request:
+- Chapters (top-level folders) with their directory mtime
+- Videos and documents per chapter with size and mtime
+- Incremental refresh: a directory is only re-listed when its mtime changes
+- Change sets from the filesystem watcher applied per file, without a rescan
+
+The index lives in the same SQLite database as ``video_progress``.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import database
+import metrics
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.catalog')
+
+# Supported file extensions (kept in sync with the templates)
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+DOCUMENT_EXTENSIONS = ('.pdf', '.docx', '.doc', '.txt')
+
+# Minimum number of seconds between two mtime sweeps of the content folder
+REFRESH_INTERVAL = 2.0
+
+_refresh_lock = threading.Lock()
+_last_refresh = {'root': None, 'time': 0.0}
+
+# Root folder currently kept up to date by a running watcher, if any
+_watched_root = {'path': None}
+
+
+def classify_file(file_name: str) -> Optional[str]:
+    """
+    Classify a file by its extension.
+
+    Args:
+        file_name: Name of the file inside a chapter folder
+
+    Returns:
+        Optional[str]: 'video', 'document', or None if unsupported
+    """
+    if file_name.endswith(VIDEO_EXTENSIONS):
+        return 'video'
+    if file_name.endswith(DOCUMENT_EXTENSIONS):
+        return 'document'
+    return None
+
+
+def _get_meta(c: sqlite3.Cursor, key: str) -> Optional[str]:
+    """Read a single catalog_meta value."""
+    c.execute('SELECT meta_value FROM catalog_meta WHERE meta_key = ?', (key,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+
+def _set_meta(c: sqlite3.Cursor, key: str, value: str):
+    """Write a single catalog_meta value."""
+    c.execute('INSERT OR REPLACE INTO catalog_meta (meta_key, meta_value) VALUES (?, ?)',
+              (key, value))
+
+
+def _list_chapter(base_path: str, chapter: str) -> List[tuple]:
+    """
+    List the supported files of a single chapter folder.
+
+    Args:
+        base_path: Content root folder
+        chapter: Chapter folder name
+
+    Returns:
+        List of (chapter, file_name, kind, size, mtime) rows
+    """
+    chapter_path = os.path.join(base_path, chapter)
+    rows = []
+    with os.scandir(chapter_path) as entries:
+        for entry in entries:
+            kind = classify_file(entry.name)
+            if kind is None:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            rows.append((chapter, entry.name, kind, st.st_size, st.st_mtime))
+    return rows
+
+
+def _replace_chapter(c: sqlite3.Cursor, chapter: str, mtime: float, rows: List[tuple]):
+    """
+    Replace the indexed rows of a chapter with a fresh listing.
+
+    Args:
+        c: Cursor inside an open transaction
+        chapter: Chapter folder name
+        mtime: Current mtime of the chapter folder
+        rows: Output of _list_chapter()
+    """
+    c.execute('DELETE FROM catalog_files WHERE chapter = ?', (chapter,))
+    c.executemany('''INSERT INTO catalog_files (chapter, file_name, kind, size, mtime)
+                     VALUES (?, ?, ?, ?, ?)''', rows)
+    video_count = sum(1 for row in rows if row[2] == 'video')
+    c.execute('INSERT OR REPLACE INTO catalog_chapters (chapter, mtime, video_count) VALUES (?, ?, ?)',
+              (chapter, mtime, video_count))
+
+
+def _remove_chapter(c: sqlite3.Cursor, chapter: str):
+    """Drop a chapter and its files from the index."""
+    c.execute('DELETE FROM catalog_files WHERE chapter = ?', (chapter,))
+    c.execute('DELETE FROM catalog_chapters WHERE chapter = ?', (chapter,))
+
+
+def set_watched_root(base_path: Optional[str]):
+    """
+    Register the folder a running watcher keeps up to date.
+
+    While a root is registered, refresh_catalog() for that root is a no-op
+    and changes arrive through apply_changes() instead.
+
+    Args:
+        base_path: Watched content root, or None when the watcher stops
+    """
+    _watched_root['path'] = os.path.abspath(base_path) if base_path else None
+
+
+def refresh_catalog(base_path: str, force: bool = False) -> bool:
+    """
+    Bring the index up to date with the content folder.
+
+    The root folder is only re-listed when its mtime changed (chapters added,
+    removed or renamed), and each chapter folder is only re-listed when its
+    own mtime changed. Sweeps are throttled to one per REFRESH_INTERVAL and
+    skipped entirely while a watcher covers the folder.
+
+    Args:
+        base_path: Content root folder
+        force: Ignore the throttle and stored mtimes and rescan everything
+
+    Returns:
+        bool: True if any part of the index was rewritten
+    """
+    base_path = os.path.abspath(base_path)
+
+    if not force and _watched_root['path'] == base_path:
+        return False
+
+    with _refresh_lock:
+        now = time.monotonic()
+        if (not force and _last_refresh['root'] == base_path
+                and now - _last_refresh['time'] < REFRESH_INTERVAL):
+            return False
+        return _timed_sweep(base_path, force)
+
+
+def sweep_catalog(base_path: str) -> Set[str]:
+    """
+    Run an unthrottled mtime sweep (used by the polling watcher).
+
+    Does nothing while the index belongs to another root, so a watcher
+    still running for a previous content folder never resets the index.
+
+    Args:
+        base_path: Content root folder
+
+    Returns:
+        Set[str]: Chapters that were re-listed or removed
+    """
+    chapters: Set[str] = set()
+    with _refresh_lock:
+        _timed_sweep(os.path.abspath(base_path), False, keep_root=True, chapters=chapters)
+    return chapters
+
+
+def _timed_sweep(base_path: str, force: bool, keep_root: bool = False,
+                 chapters: Optional[Set[str]] = None) -> bool:
+    """Run _sweep() and record its duration in the scan metrics."""
+    start = time.perf_counter()
+    changed = _sweep(base_path, force, keep_root, chapters)
+    metrics.CATALOG_SCAN_SECONDS.observe(time.perf_counter() - start,
+                                         'true' if changed else 'false')
+    return changed
+
+
+def _sweep(base_path: str, force: bool, keep_root: bool = False,
+           chapters: Optional[Set[str]] = None) -> bool:
+    """
+    Compare stored mtimes with the filesystem; caller holds _refresh_lock.
+
+    Folders are listed before the write transaction starts, so a slow
+    network share never holds the database write lock. With keep_root, an
+    index of a different root is left alone instead of being reset. The
+    names of re-listed and removed chapters are added to 'chapters'.
+    """
+    try:
+        root_mtime = os.stat(base_path).st_mtime
+        c = database.get_connection().cursor()
+        reset = force or _get_meta(c, 'root') != base_path
+        if reset and keep_root:
+            return False
+        if reset:
+            indexed, root_known = {}, None
+        else:
+            c.execute('SELECT chapter, mtime FROM catalog_chapters')
+            indexed = {row[0]: row[1] for row in c.fetchall()}
+            root_known = _get_meta(c, 'root_mtime')
+
+        # Re-list the root only when chapters were added/removed/renamed
+        removed = []
+        if root_known != repr(root_mtime):
+            on_disk = set()
+            with os.scandir(base_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        on_disk.add(entry.name)
+            removed = [chapter for chapter in indexed if chapter not in on_disk]
+            for chapter in removed:
+                del indexed[chapter]
+            for chapter in on_disk - set(indexed):
+                indexed[chapter] = None
+
+        # Re-list only chapters whose folder mtime moved
+        rescanned = []
+        for chapter, known_mtime in indexed.items():
+            try:
+                mtime = os.stat(os.path.join(base_path, chapter)).st_mtime
+            except OSError:
+                removed.append(chapter)
+                continue
+            if mtime != known_mtime:
+                rescanned.append((chapter, mtime, _list_chapter(base_path, chapter)))
+
+        changed = reset or bool(removed) or bool(rescanned) or root_known != repr(root_mtime)
+        if changed:
+            with database.transaction() as conn:
+                c = conn.cursor()
+                if not reset and _get_meta(c, 'root') != base_path:
+                    # Another process switched roots while we were listing
+                    return False
+                if reset:
+                    # A different content folder invalidates the whole index
+                    c.execute('DELETE FROM catalog_files')
+                    c.execute('DELETE FROM catalog_chapters')
+                    _set_meta(c, 'root', base_path)
+                for chapter in removed:
+                    _remove_chapter(c, chapter)
+                for chapter, mtime, rows in rescanned:
+                    _replace_chapter(c, chapter, mtime, rows)
+                _set_meta(c, 'root_mtime', repr(root_mtime))
+            if chapters is not None:
+                chapters.update(removed)
+                chapters.update(chapter for chapter, _, _ in rescanned)
+    except (OSError, sqlite3.Error) as e:
+        logger.error("[CATALOG] Refresh failed: %s", e)
+        return False
+
+    _last_refresh['root'] = base_path
+    _last_refresh['time'] = time.monotonic()
+    if changed:
+        logger.info("[CATALOG] Index refreshed for %s", base_path)
+    return changed
+
+
+def apply_changes(base_path: str, changes: Dict[str, Optional[Set[str]]]) -> int:
+    """
+    Apply a batch of watcher events to the index.
+
+    Only the named entries are stat'ed, so the cost grows with the size of
+    the change set rather than with the size of the content tree.
+
+    Args:
+        base_path: Content root folder
+        changes: Chapter name mapped to the set of touched file names, or to
+                 None when the chapter folder itself was added/removed/renamed
+
+    Returns:
+        int: Number of index rows written or removed (0 when the index
+        belongs to another root, e.g. from a watcher of a previous folder)
+    """
+    base_path = os.path.abspath(base_path)
+    touched = 0
+
+    with _refresh_lock:
+        try:
+            with database.transaction() as conn:
+                c = conn.cursor()
+                if _get_meta(c, 'root') != base_path:
+                    return 0
+                for chapter, file_names in changes.items():
+                    chapter_path = os.path.join(base_path, chapter)
+                    try:
+                        chapter_mtime = os.stat(chapter_path).st_mtime
+                        is_dir = os.path.isdir(chapter_path)
+                    except OSError:
+                        is_dir = False
+
+                    if not is_dir:
+                        _remove_chapter(c, chapter)
+                        touched += 1
+                        continue
+
+                    if file_names is None:
+                        _replace_chapter(c, chapter, chapter_mtime,
+                                         _list_chapter(base_path, chapter))
+                        touched += 1
+                        continue
+
+                    for file_name in file_names:
+                        kind = classify_file(file_name)
+                        if kind is None:
+                            continue
+                        try:
+                            st = os.stat(os.path.join(chapter_path, file_name))
+                        except OSError:
+                            c.execute('DELETE FROM catalog_files WHERE chapter = ? AND file_name = ?',
+                                      (chapter, file_name))
+                        else:
+                            c.execute('''INSERT OR REPLACE INTO catalog_files
+                                         (chapter, file_name, kind, size, mtime)
+                                         VALUES (?, ?, ?, ?, ?)''',
+                                      (chapter, file_name, kind, st.st_size, st.st_mtime))
+                        touched += 1
+
+                    # Record the new folder mtime so a later sweep doesn't re-list it,
+                    # and refresh the cached video count for this chapter only
+                    c.execute('''INSERT OR REPLACE INTO catalog_chapters (chapter, mtime, video_count)
+                                 VALUES (?, ?, (SELECT COUNT(*) FROM catalog_files
+                                                WHERE chapter = ? AND kind = 'video'))''',
+                              (chapter, chapter_mtime, chapter))
+
+                try:
+                    _set_meta(c, 'root_mtime', repr(os.stat(base_path).st_mtime))
+                except OSError:
+                    pass
+        except sqlite3.Error as e:
+            logger.error("[CATALOG] Failed to apply changes: %s", e)
+            return 0
+
+    return touched
+
+
+def get_chapters(chapter: Optional[str] = None) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Return the indexed course structure.
+
+    Args:
+        chapter: Restrict the result to a single chapter
+
+    Returns:
+        Dict mapping chapter name to {'videos': [...], 'pdfs': [...]},
+        sorted by chapter and file name like the original directory walk
+    """
+    c = database.get_connection().cursor()
+    if chapter is None:
+        c.execute('SELECT chapter FROM catalog_chapters ORDER BY chapter')
+    else:
+        c.execute('SELECT chapter FROM catalog_chapters WHERE chapter = ?', (chapter,))
+    days = {row[0]: {'videos': [], 'pdfs': []} for row in c.fetchall()}
+
+    if chapter is None:
+        c.execute('SELECT chapter, file_name, kind FROM catalog_files ORDER BY chapter, file_name')
+    else:
+        c.execute('''SELECT chapter, file_name, kind FROM catalog_files
+                     WHERE chapter = ? ORDER BY file_name''', (chapter,))
+    for chapter_name, file_name, kind in c.fetchall():
+        if chapter_name in days:
+            key = 'videos' if kind == 'video' else 'pdfs'
+            days[chapter_name][key].append(file_name)
+    return days
+
+
+def get_video_counts() -> Dict[str, int]:
+    """
+    Return the number of indexed videos per chapter.
+
+    Chapters without any video are included with a count of 0.
+
+    Returns:
+        Dict mapping chapter name to video count
+    """
+    c = database.get_connection().cursor()
+    c.execute('SELECT chapter, video_count FROM catalog_chapters')
+    return {row[0]: row[1] for row in c.fetchall()}
+
+
+def get_file(chapter: str, file_name: str) -> Optional[Tuple[int, float]]:
+    """
+    Return the indexed size and mtime of a content file.
+
+    Args:
+        chapter: Chapter folder name
+        file_name: File name inside the chapter
+
+    Returns:
+        Optional[Tuple[int, float]]: (size, mtime), or None if not indexed
+    """
+    c = database.get_connection().cursor()
+    c.execute('SELECT size, mtime FROM catalog_files WHERE chapter = ? AND file_name = ?',
+              (chapter, file_name))
+    row = c.fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def get_file_stats(chapter: str, kind: str = 'video') -> Dict[str, Tuple[int, float]]:
+    """
+    Return the indexed size and mtime of every file of one kind in a chapter.
+
+    Args:
+        chapter: Chapter folder name
+        kind: 'video' or 'document'
+
+    Returns:
+        Dict mapping file name to (size, mtime)
+    """
+    c = database.get_connection().cursor()
+    c.execute('SELECT file_name, size, mtime FROM catalog_files WHERE chapter = ? AND kind = ?',
+              (chapter, kind))
+    return {row[0]: (row[1], row[2]) for row in c.fetchall()}
+
+
+def list_files(kind: str = 'video') -> List[Tuple[str, str, int, float]]:
+    """
+    Return every indexed file of one kind.
+
+    Args:
+        kind: 'video' or 'document'
+
+    Returns:
+        List of (chapter, file_name, size, mtime)
+    """
+    c = database.get_connection().cursor()
+    c.execute('SELECT chapter, file_name, size, mtime FROM catalog_files WHERE kind = ?', (kind,))
+    return c.fetchall()
+
+
+def update_file_stat(chapter: str, file_name: str, size: int, mtime: float):
+    """
+    Record a newer size/mtime observed while serving a file.
+
+    Args:
+        chapter: Chapter folder name
+        file_name: File name inside the chapter
+        size: Current size in bytes
+        mtime: Current modification time
+    """
+    with database.transaction() as conn:
+        conn.execute('UPDATE catalog_files SET size = ?, mtime = ? WHERE chapter = ? AND file_name = ?',
+                     (size, mtime, chapter, file_name))
+
+
+def _reset_after_fork():
+    """Replace the refresh lock, which another thread may hold at fork time."""
+    global _refresh_lock
+    _refresh_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -5,6 +5,10 @@ Handles persistent storage of application settings including:
 - Static folder path selection
 - Cross-platform config directory detection
 - Safe path validation and handling
+- Embedded HTTP server backend settings
+- In-memory config cache, re-read only when config.json changes on disk
+- Atomic saves (write to a temp file, then rename)
+- Request profiling settings (see profiler.py)
 
 Author: Course Platform Team
 Version: 1.0
@@ -12,14 +16,44 @@ Version: 1.0
 
 import os
 import sys
+import copy
 import json
+import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Tuple
 
 
 # Application identifier for config directory
 APP_NAME = "OfflineCoursePlayer"
 
+# Embedded HTTP server defaults (see wsgi_servers.py)
+SERVER_BACKENDS = ("pool", "threaded", "waitress")
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+DEFAULT_SERVER_SETTINGS = {
+    "backend": "pool",          # Bounded worker pool with keep-alive
+    "threads": 16,              # Worker threads for pool/waitress
+    "keepalive_timeout": 5,     # Seconds an idle connection is kept open
+    "backlog": 128,             # Listen queue length
+    "workers": 1,               # Processes; above 1 enables pre-fork (POSIX)
+    "log_level": "INFO",        # App log level; DEBUG shows per-request logs
+}
+
+# Request profiling defaults (see profiler.py)
+PROFILING_MODES = ("cprofile", "sampler")
+DEFAULT_PROFILING_SETTINGS = {
+    "enabled": False,           # Off unless turned on from the desktop app or API
+    "sample_rate": 0.05,        # Fraction of requests profiled
+    "mode": "cprofile",         # cprofile (.pstats) or sampler (collapsed stacks)
+}
+
+# Seconds between two checks of config.json's mtime and of folder validity
+CHECK_INTERVAL = 1.0
+
+# Config directories already created by this process
+_created_dirs = set()
+
 
 def get_config_dir() -> Path:
     """
@@ -43,8 +77,10 @@ def get_config_dir() -> Path:
         xdg_config = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser("~/.config"))
         config_dir = Path(xdg_config) / APP_NAME
     
-    # Ensure directory exists
-    config_dir.mkdir(parents=True, exist_ok=True)
+    # Ensure directory exists (once per process)
+    if config_dir not in _created_dirs:
+        config_dir.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(config_dir)
     return config_dir
 
 
@@ -53,6 +89,23 @@ def get_config_file() -> Path:
     return get_config_dir() / "config.json"
 
 
+def get_cache_dir(name: str) -> Path:
+    """
+    Get a cache directory for generated files (thumbnails, remuxes, ...).
+    
+    Args:
+        name: Cache name, used as the subdirectory
+        
+    Returns:
+        Path: Existing directory under <config dir>/cache
+    """
+    cache_dir = get_config_dir() / "cache" / name
+    if cache_dir not in _created_dirs:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(cache_dir)
+    return cache_dir
+
+
 def get_database_path() -> Path:
     """
     Get the path for the SQLite database.
@@ -63,42 +116,150 @@ def get_database_path() -> Path:
     return get_config_dir() / "course_progress.db"
 
 
+class ConfigCache:
+    """Parsed config.json kept in memory and shared by all callers."""
+    
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            check_interval: Minimum seconds between two mtime checks
+        """
+        self.check_interval = check_interval
+        self.lock = threading.RLock()
+        self.generation = 0
+        self._data: Dict[str, Any] = {}
+        self._path: Optional[Path] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked_at = 0.0
+    
+    def _file_stamp(self, path: Path) -> Optional[Tuple[int, int]]:
+        """Return (mtime_ns, size) of the file, or None if it is missing."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+    
+    def get(self) -> Dict[str, Any]:
+        """
+        Return the current configuration (shared, do not modify).
+        
+        The file is stat()ed at most once per check_interval and only
+        parsed again when its mtime or size changed.
+        
+        Returns:
+            Dict: Configuration dictionary, empty if the file doesn't exist
+        """
+        now = time.monotonic()
+        if self._path is not None and now - self._checked_at < self.check_interval:
+            return self._data
+        
+        with self.lock:
+            path = get_config_file()
+            stamp = self._file_stamp(path)
+            if path != self._path or stamp != self._stamp:
+                self._data = self._read(path) if stamp is not None else {}
+                self._path = path
+                self._stamp = stamp
+                self.generation += 1
+            self._checked_at = now
+            return self._data
+    
+    def _read(self, path: Path) -> Dict[str, Any]:
+        """Parse config.json, returning an empty config on errors."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"[CONFIG] Error loading config: {e}")
+            return {}
+    
+    def save(self, config: Dict[str, Any]) -> bool:
+        """
+        Write the configuration atomically and update the cache.
+        
+        Args:
+            config: Configuration dictionary to save
+            
+        Returns:
+            bool: True if save successful, False otherwise
+        """
+        with self.lock:
+            path = get_config_file()
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp",
+                                                dir=str(path.parent))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except (IOError, OSError, TypeError, ValueError) as e:
+                print(f"[CONFIG] Error saving config: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                return False
+            
+            self._data = copy.deepcopy(config)
+            self._path = path
+            self._stamp = self._file_stamp(path)
+            self._checked_at = time.monotonic()
+            self.generation += 1
+            return True
+
+
+# Global cache instance for module-level access
+_config_cache = ConfigCache()
+
+# Results of filesystem checks, keyed by name: (generation, checked_at, value)
+_checks: Dict[str, Tuple[int, float, Any]] = {}
+
+
+def _checked(key: str, compute: Callable[[], Any]) -> Any:
+    """
+    Return a cached filesystem check, recomputed when the config changes
+    or after CHECK_INTERVAL seconds.
+    """
+    generation = _config_cache.generation
+    now = time.monotonic()
+    entry = _checks.get(key)
+    if entry and entry[0] == generation and now - entry[1] < CHECK_INTERVAL:
+        return entry[2]
+    value = compute()
+    _checks[key] = (generation, now, value)
+    return value
+
+
 def load_config() -> Dict[str, Any]:
     """
     Load configuration from file.
     
+    Served from the in-memory cache; the file is only re-read when it
+    changed on disk.
+    
     Returns:
-        Dict: Configuration dictionary, empty if file doesn't exist
+        Dict: Configuration dictionary (a copy), empty if file doesn't exist
     """
-    config_file = get_config_file()
-    if config_file.exists():
-        try:
-            with open(config_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"[CONFIG] Error loading config: {e}")
-            return {}
-    return {}
+    return copy.deepcopy(_config_cache.get())
 
 
 def save_config(config: Dict[str, Any]) -> bool:
     """
     Save configuration to file.
     
+    The file is replaced atomically, so readers never see a partial write.
+    
     Args:
         config: Configuration dictionary to save
         
     Returns:
         bool: True if save successful, False otherwise
     """
-    config_file = get_config_file()
-    try:
-        with open(config_file, "w", encoding="utf-8") as f:
-            json.dump(config, f, indent=2)
-        return True
-    except IOError as e:
-        print(f"[CONFIG] Error saving config: {e}")
-        return False
+    return _config_cache.save(config)
 
 
 def get_static_folder() -> Optional[str]:
@@ -108,11 +269,10 @@ def get_static_folder() -> Optional[str]:
     Returns:
         Optional[str]: Configured static folder path, or None if not set
     """
-    config = load_config()
-    folder = config.get("static_folder")
+    folder = _config_cache.get().get("static_folder")
     
-    # Validate folder still exists
-    if folder and os.path.isdir(folder):
+    # Validate folder still exists (re-checked at most once per CHECK_INTERVAL)
+    if folder and _checked("static_folder", lambda: os.path.isdir(folder)):
         return folder
     return None
 
@@ -131,9 +291,118 @@ def set_static_folder(path: str) -> bool:
     if not validate_folder(path):
         return False
     
-    config = load_config()
-    config["static_folder"] = os.path.abspath(path)
-    return save_config(config)
+    with _config_cache.lock:
+        config = load_config()
+        config["static_folder"] = os.path.abspath(path)
+        return save_config(config)
+
+
+def get_server_settings() -> Dict[str, Any]:
+    """
+    Get the embedded HTTP server settings.
+    
+    Values missing or invalid in the config file fall back to
+    DEFAULT_SERVER_SETTINGS.
+    
+    Returns:
+        Dict: Settings with backend, threads, keepalive_timeout, backlog,
+              workers and log_level
+    """
+    settings = dict(DEFAULT_SERVER_SETTINGS)
+    stored = _config_cache.get().get("server")
+    if not isinstance(stored, dict):
+        return settings
+    
+    if stored.get("backend") in SERVER_BACKENDS:
+        settings["backend"] = stored["backend"]
+    if stored.get("log_level") in LOG_LEVELS:
+        settings["log_level"] = stored["log_level"]
+    for key in ("threads", "keepalive_timeout", "backlog", "workers"):
+        value = stored.get(key)
+        if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+            settings[key] = value
+    return settings
+
+
+def set_server_settings(**settings: Any) -> bool:
+    """
+    Update and persist embedded HTTP server settings.
+    
+    Args:
+        **settings: Any of backend, threads, keepalive_timeout, backlog,
+                    workers, log_level
+        
+    Returns:
+        bool: True if save successful, False if invalid or not saved
+    """
+    unknown = set(settings) - set(DEFAULT_SERVER_SETTINGS)
+    if unknown or settings.get("backend", "pool") not in SERVER_BACKENDS:
+        return False
+    if settings.get("log_level", "INFO") not in LOG_LEVELS:
+        return False
+    
+    with _config_cache.lock:
+        config = load_config()
+        stored = config.get("server") if isinstance(config.get("server"), dict) else {}
+        stored.update(settings)
+        config["server"] = stored
+        return save_config(config)
+
+
+def get_profiling_settings() -> Dict[str, Any]:
+    """
+    Get the request profiling settings.
+    
+    Values missing or invalid in the config file fall back to
+    DEFAULT_PROFILING_SETTINGS.
+    
+    Returns:
+        Dict: Settings with enabled, sample_rate and mode
+    """
+    settings = dict(DEFAULT_PROFILING_SETTINGS)
+    stored = _config_cache.get().get("profiling")
+    if not isinstance(stored, dict):
+        return settings
+    
+    if isinstance(stored.get("enabled"), bool):
+        settings["enabled"] = stored["enabled"]
+    if stored.get("mode") in PROFILING_MODES:
+        settings["mode"] = stored["mode"]
+    rate = stored.get("sample_rate")
+    if isinstance(rate, (int, float)) and not isinstance(rate, bool) and 0 <= rate <= 1:
+        settings["sample_rate"] = float(rate)
+    return settings
+
+
+def set_profiling_settings(**settings: Any) -> bool:
+    """
+    Update and persist request profiling settings.
+    
+    Running servers (every worker process) pick the change up within
+    CHECK_INTERVAL.
+    
+    Args:
+        **settings: Any of enabled, sample_rate, mode
+        
+    Returns:
+        bool: True if save successful, False if invalid or not saved
+    """
+    if set(settings) - set(DEFAULT_PROFILING_SETTINGS):
+        return False
+    if "enabled" in settings and not isinstance(settings["enabled"], bool):
+        return False
+    if settings.get("mode", "cprofile") not in PROFILING_MODES:
+        return False
+    rate = settings.get("sample_rate", 0)
+    if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not 0 <= rate <= 1:
+        return False
+    
+    with _config_cache.lock:
+        config = load_config()
+        stored = config.get("profiling") if isinstance(config.get("profiling"), dict) else {}
+        stored.update(settings)
+        config["profiling"] = stored
+        return save_config(config)
 
 
 def validate_folder(path: str) -> bool:
@@ -190,12 +459,13 @@ def get_default_static_folder() -> Optional[str]:
     Returns:
         Optional[str]: Default static folder if it exists, None otherwise
     """
-    app_dir = get_app_directory()
-    default_static = app_dir / "static"
+    def find_default() -> Optional[str]:
+        default_static = get_app_directory() / "static"
+        if default_static.exists() and default_static.is_dir():
+            return str(default_static)
+        return None
     
-    if default_static.exists() and default_static.is_dir():
-        return str(default_static)
-    return None
+    return _checked("default_static_folder", find_default)
 
 
 # Convenience function to get the effective static folder
@@ -0,0 +1,274 @@
+"""
+Database Access Module
+
+Shared SQLite access layer for the Flask app and background workers:
+- Pooled connections reused across requests instead of connect/close per call
+- WAL journaling so readers never block the writer
+- Tuned synchronous/cache_size pragmas and a busy timeout
+- Per-connection prepared statement cache
+- BEGIN IMMEDIATE write transactions to avoid "database is locked" upgrades
+- Statement timings recorded in metrics.DB_QUERY_SECONDS
+- Fork safety: child processes never touch connections opened by the parent
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set
+
+import metrics
+
+# Import configuration module
+try:
+    from config import get_database_path
+except ImportError:
+    # Fallback if config not available (standalone mode)
+    def get_database_path():
+        return 'course_progress.db'
+
+
+# Maximum number of idle connections kept for reuse
+POOL_SIZE = 8
+
+# Milliseconds a connection waits for a competing writer before giving up
+BUSY_TIMEOUT_MS = 5000
+
+# Page cache per connection in KiB (negative value for the PRAGMA)
+CACHE_SIZE_KIB = 16384
+
+# Number of prepared statements cached per connection
+STATEMENT_CACHE_SIZE = 256
+
+_db_path: Optional[str] = None
+_path_lock = threading.Lock()
+
+
+def get_db_path() -> str:
+    """
+    Get the database path, resolved once per process.
+
+    Returns:
+        str: Path to the SQLite database file
+    """
+    global _db_path
+    if _db_path is None:
+        with _path_lock:
+            if _db_path is None:
+                try:
+                    _db_path = str(get_database_path())
+                except Exception:
+                    _db_path = 'course_progress.db'
+    return _db_path
+
+
+# Statement types reported separately in the query timings
+_STATEMENT_TYPES = {'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'BEGIN', 'PRAGMA'}
+
+
+def _statement_type(sql: str) -> str:
+    """Return the first keyword of a statement as a metrics label."""
+    keyword = sql.lstrip()[:7].split(None, 1)[0].upper() if sql.strip() else ''
+    return keyword if keyword in _STATEMENT_TYPES else 'OTHER'
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor recording the time spent in execute() and executemany()."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_type(sql))
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.DB_QUERY_SECONDS.observe(time.perf_counter() - start, _statement_type(sql))
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (and execute shortcuts) are TimedCursors."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    """Open and tune a new connection."""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,            # Autocommit; writes use transaction()
+        check_same_thread=False,         # Connections move between pooled threads
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection,
+    )
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_SIZE_KIB}')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    return conn
+
+
+class ConnectionPool:
+    """LIFO pool of tuned SQLite connections to a single database file."""
+
+    def __init__(self, path: str, max_idle: int = POOL_SIZE):
+        """
+        Initialize the pool.
+
+        Args:
+            path: Database file path
+            max_idle: Maximum number of idle connections kept open
+        """
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: List[sqlite3.Connection] = []
+        self._open: Set[sqlite3.Connection] = set()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection or open a new one."""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        conn = _connect(self.path)
+        with self._lock:
+            self._open.add(conn)
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, closing it if the pool is full."""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._open.discard(conn)
+        conn.close()
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._open.difference_update(idle)
+        for conn in idle:
+            conn.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+# Pools inherited from a parent process. They are kept referenced, never
+# closed: closing an inherited SQLite handle would drop the parent's
+# POSIX locks on the database file
+_inherited_pools: List[ConnectionPool] = []
+
+
+def get_pool() -> ConnectionPool:
+    """Get or create the global connection pool."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_path())
+    return _pool
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get the connection held by the current thread.
+
+    The connection stays with the thread until release_connection() is
+    called (the Flask app does this at the end of every request).
+
+    Returns:
+        sqlite3.Connection: Tuned connection in autocommit mode
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = get_pool().acquire()
+        _local.conn = conn
+        _local.depth = 0
+    return conn
+
+
+def release_connection():
+    """Return the current thread's connection to the pool."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        _local.conn = None
+        get_pool().release(conn)
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Run a block inside a write transaction.
+
+    Starts with BEGIN IMMEDIATE so the write lock is taken up front and
+    waits on the busy timeout instead of failing on a later lock upgrade.
+    Nested calls join the outer transaction.
+
+    Yields:
+        sqlite3.Connection: Connection with an open transaction
+    """
+    conn = get_connection()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+
+    conn.execute('BEGIN IMMEDIATE')
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+    finally:
+        _local.depth = 0
+
+
+def close_all():
+    """Release this thread's connection and close all pooled connections."""
+    release_connection()
+    if _pool is not None:
+        _pool.close_all()
+
+
+def _reset_after_fork():
+    """Give a forked child process its own pool and connection state."""
+    global _pool, _pool_lock, _path_lock, _local
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+    _path_lock = threading.Lock()
+    _local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -6,14 +6,27 @@ Features:
 - Start/Stop server controls
 - Native folder picker for content selection
 - Server log display
+- Live request metrics panel (from /api/metrics)
+- Request profiling toggle and diagnostics page shortcut
+- Fast cold start: the window is shown before Flask and the app are
+  imported (in a background thread); time to first paint and to server
+  readiness are logged
 - Auto-start on launch if folder configured
 
 Author: Course Platform Team
 Version: 1.0
 """
 
+import time
+
+# Reference point for the startup timings (the launcher passes its own)
+_IMPORT_STARTED = time.perf_counter()
+
 import sys
 import os
+import json
+import threading
+import urllib.request
 import webbrowser
 from typing import Optional
 
@@ -24,40 +37,114 @@ os.chdir(APP_DIR)
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QTextEdit, QFileDialog, QFrame, QMessageBox
+    QPushButton, QLabel, QTextEdit, QFileDialog, QFrame, QMessageBox,
+    QCheckBox, QDoubleSpinBox
 )
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject
 from PyQt6.QtGui import QFont, QIcon, QColor, QPalette
 
 from config import get_static_folder, set_static_folder, get_effective_static_folder
+from config import get_profiling_settings, set_profiling_settings
 from server import FlaskServerWrapper
 
 
+# Milliseconds between two refreshes of the metrics panel
+METRICS_REFRESH_MS = 5000
+
+# Route rows shown in the metrics panel, busiest first
+METRICS_TOP_ROUTES = 8
+
+
 class LogSignal(QObject):
     """Signal class for thread-safe log updates."""
     log_message = pyqtSignal(str)
+    metrics_text = pyqtSignal(str)
+    server_started = pyqtSignal(bool)
+
+
+def _format_seconds(value) -> str:
+    """Format a latency estimate for the metrics panel."""
+    if value is None:
+        return "-"
+    if value == float('inf'):
+        return ">10s"
+    return f"{value * 1000:.1f}ms" if value < 1 else f"{value:.1f}s"
+
+
+def format_metrics(summary: dict) -> str:
+    """
+    Render the /api/metrics?format=json summary as a fixed-width table.
+    
+    Args:
+        summary: Summary from metrics.get_summary()
+        
+    Returns:
+        str: Text for the metrics panel
+    """
+    queries = summary.get('db_queries', [])
+    query_count = sum(row['count'] for row in queries)
+    media_mb = sum(summary.get('media_bytes', {}).values()) / (1024 * 1024)
+    flushes = summary.get('progress_flush_rows', [])
+    flushed_rows = sum((row['mean'] or 0) * row['count'] for row in flushes)
+    processes = summary.get('processes', 1)
+    workers = f"{processes} workers · " if processes > 1 else ""
+    lines = [
+        f"{workers}Uptime {int(summary.get('uptime_seconds', 0)) // 60} min · "
+        f"DB statements {query_count} · Media {media_mb:.1f} MB · "
+        f"Progress rows flushed {int(flushed_rows)}",
+        "",
+        f"{'Route':<36}{'Count':>7}{'p50':>9}{'p95':>9}{'p99':>9}",
+    ]
+    routes = sorted(summary.get('requests', []), key=lambda row: row['count'], reverse=True)
+    for row in routes[:METRICS_TOP_ROUTES]:
+        name = f"{row['method']} {row['route']} {row['status']}"
+        if len(name) > 35:
+            name = name[:34] + "…"
+        lines.append(f"{name:<36}{row['count']:>7}{_format_seconds(row['p50']):>9}"
+                     f"{_format_seconds(row['p95']):>9}{_format_seconds(row['p99']):>9}")
+    if not routes:
+        lines.append("No requests yet")
+    return "\n".join(lines)
 
 
 class OfflineCoursePlayerApp(QMainWindow):
     """Main application window for Offline Course Player."""
     
-    def __init__(self):
+    def __init__(self, launch_started: Optional[float] = None):
+        """
+        Build the window; the server is started once the event loop runs.
+        
+        Args:
+            launch_started: time.perf_counter() at launch, for startup timings
+        """
         super().__init__()
         self.server = FlaskServerWrapper()
         self.log_signal = LogSignal()
         self.log_signal.log_message.connect(self._append_log)
+        self.log_signal.metrics_text.connect(self._show_metrics)
+        self.log_signal.server_started.connect(self._on_server_started)
+        self._metrics_pending = False
+        self._starting = False
+        self._launch_started = launch_started if launch_started is not None else _IMPORT_STARTED
+        self._first_paint_logged = False
+        self._ready_logged = False
         
         self.setup_ui()
         self.update_status()
         
-        # Auto-start if folder is configured
-        QTimer.singleShot(500, self.auto_start_if_ready)
+        # Refresh the metrics panel while the server runs
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self.refresh_metrics)
+        self.metrics_timer.start(METRICS_REFRESH_MS)
+        
+        # Auto-start if folder is configured, as soon as the window is up
+        QTimer.singleShot(0, self.auto_start_if_ready)
     
     def setup_ui(self):
         """Initialize the user interface."""
         self.setWindowTitle("Offline Course Player")
-        self.setMinimumSize(550, 450)
-        self.resize(600, 500)
+        self.setMinimumSize(550, 600)
+        self.resize(600, 680)
         
         # Try to set icon if available
         icon_path = os.path.join(APP_DIR, "icons", "app_icon.png")
@@ -198,6 +285,55 @@ class OfflineCoursePlayerApp(QMainWindow):
         separator2.setStyleSheet("background-color: #444;")
         layout.addWidget(separator2)
         
+        # Metrics section
+        metrics_header = QHBoxLayout()
+        metrics_label = QLabel("Request Metrics:")
+        metrics_label.setStyleSheet("font-weight: bold;")
+        metrics_header.addWidget(metrics_label)
+        metrics_header.addStretch()
+        
+        # Profiling toggle (saved in config.json, applied without restart)
+        profiling = get_profiling_settings()
+        self.profile_check = QCheckBox("Profile")
+        self.profile_check.setToolTip("Profile a sample of requests (cProfile or stack sampler)")
+        self.profile_check.setChecked(profiling["enabled"])
+        self.profile_check.toggled.connect(self.apply_profiling)
+        metrics_header.addWidget(self.profile_check)
+        
+        self.profile_rate = QDoubleSpinBox()
+        self.profile_rate.setRange(0.1, 100.0)
+        self.profile_rate.setSingleStep(1.0)
+        self.profile_rate.setDecimals(1)
+        self.profile_rate.setSuffix(" %")
+        self.profile_rate.setToolTip("Share of requests profiled")
+        self.profile_rate.setValue(max(0.1, profiling["sample_rate"] * 100))
+        self.profile_rate.editingFinished.connect(self.apply_profiling)
+        metrics_header.addWidget(self.profile_rate)
+        
+        self.diagnostics_btn = QPushButton("🔥 Diagnostics")
+        self.diagnostics_btn.setToolTip("Open the hot function table in the browser")
+        self.diagnostics_btn.clicked.connect(self.open_diagnostics)
+        self.diagnostics_btn.setEnabled(False)
+        metrics_header.addWidget(self.diagnostics_btn)
+        layout.addLayout(metrics_header)
+        
+        self.metrics_text = QTextEdit()
+        self.metrics_text.setReadOnly(True)
+        self.metrics_text.setFont(QFont("Consolas", 9))
+        self.metrics_text.setFixedHeight(160)
+        self.metrics_text.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
+        self.metrics_text.setStyleSheet("""
+            QTextEdit {
+                background-color: #1e1e1e;
+                color: #ddd;
+                border: 1px solid #444;
+                border-radius: 6px;
+                padding: 8px;
+            }
+        """)
+        self.metrics_text.setPlainText("Server not running")
+        layout.addWidget(self.metrics_text)
+        
         # Log section
         log_label = QLabel("Server Logs:")
         log_label.setStyleSheet("font-weight: bold;")
@@ -269,20 +405,37 @@ class OfflineCoursePlayerApp(QMainWindow):
             self.folder_label.setStyleSheet("color: #ff9800;")
             self.folder_label.setToolTip("")
     
+    def paintEvent(self, event):
+        """Log the time from launch to the first painted frame."""
+        super().paintEvent(event)
+        if not self._first_paint_logged:
+            self._first_paint_logged = True
+            elapsed = time.perf_counter() - self._launch_started
+            self.log(f"[APP] Window painted {elapsed:.2f}s after launch")
+    
     def update_status(self):
         """Update server status display."""
-        if self.server.is_server_running():
+        if self._starting:
+            self.status_label.setText("● Starting...")
+            self.status_label.setStyleSheet("color: #ffb74d; font-weight: bold;")
+            self.start_btn.setEnabled(False)
+            self.stop_btn.setEnabled(False)
+            self.browser_btn.setEnabled(False)
+            self.diagnostics_btn.setEnabled(False)
+        elif self.server.is_server_running():
             self.status_label.setText("● Running")
             self.status_label.setStyleSheet("color: #4CAF50; font-weight: bold;")
             self.start_btn.setEnabled(False)
             self.stop_btn.setEnabled(True)
             self.browser_btn.setEnabled(True)
+            self.diagnostics_btn.setEnabled(True)
         else:
             self.status_label.setText("● Stopped")
             self.status_label.setStyleSheet("color: #ff6b6b; font-weight: bold;")
             self.start_btn.setEnabled(True)
             self.stop_btn.setEnabled(False)
             self.browser_btn.setEnabled(False)
+            self.diagnostics_btn.setEnabled(False)
     
     def _append_log(self, message: str):
         """Append message to log display (thread-safe via signal)."""
@@ -295,6 +448,42 @@ class OfflineCoursePlayerApp(QMainWindow):
         """Log a message (thread-safe)."""
         self.log_signal.log_message.emit(message)
     
+    def _show_metrics(self, text: str):
+        """Display fetched metrics (thread-safe via signal)."""
+        self._metrics_pending = False
+        self.metrics_text.setPlainText(text)
+    
+    def refresh_metrics(self):
+        """Fetch the metrics summary off the UI thread."""
+        if not self.server.is_server_running() or self._metrics_pending:
+            return
+        self._metrics_pending = True
+        
+        def fetch():
+            try:
+                url = "http://127.0.0.1:5000/api/metrics?format=json"
+                with urllib.request.urlopen(url, timeout=2) as response:
+                    text = format_metrics(json.loads(response.read()))
+            except Exception as e:
+                text = f"Metrics unavailable: {e}"
+            self.log_signal.metrics_text.emit(text)
+        
+        threading.Thread(target=fetch, daemon=True).start()
+    
+    def apply_profiling(self):
+        """Save the profiling toggle and sample rate."""
+        enabled = self.profile_check.isChecked()
+        rate = round(self.profile_rate.value() / 100, 4)
+        if set_profiling_settings(enabled=enabled, sample_rate=rate):
+            state = f"on ({rate:.1%} of requests)" if enabled else "off"
+            self.log(f"[APP] Request profiling {state}")
+        else:
+            self.log("[APP] Failed to save profiling settings")
+    
+    def open_diagnostics(self):
+        """Open the diagnostics page with the hot function table."""
+        webbrowser.open("http://127.0.0.1:5000/diagnostics")
+    
     def select_folder(self):
         """Open folder picker dialog."""
         current = get_static_folder() or os.path.expanduser("~")
@@ -330,6 +519,9 @@ class OfflineCoursePlayerApp(QMainWindow):
             self.start_server()
         else:
             self.log("[APP] No content folder configured. Please select a folder.")
+            # Import the app meanwhile, so starting later is quick
+            self.server.log_callback = self.log
+            self.server.preload()
     
     def start_server(self):
         """Start the Flask server."""
@@ -342,18 +534,30 @@ class OfflineCoursePlayerApp(QMainWindow):
             )
             return
         
+        if self._starting:
+            return
         self.log("[APP] Starting server...")
         
         # Set server log callback
         self.server.log_callback = self.log
         
-        if self.server.start():
-            self.update_status()
-            # Auto-open browser after short delay
-            QTimer.singleShot(1000, self.open_browser)
-        else:
+        # Import and start in the background; the result arrives as a signal
+        self._starting = True
+        self.update_status()
+        self.server.start_async(callback=self.log_signal.server_started.emit)
+    
+    def _on_server_started(self, ok: bool):
+        """Handle the result of a background start (thread-safe via signal)."""
+        self._starting = False
+        self.update_status()
+        if not ok:
             self.log("[APP] Failed to start server")
-            self.update_status()
+            return
+        if not self._ready_logged:
+            self._ready_logged = True
+            elapsed = time.perf_counter() - self._launch_started
+            self.log(f"[APP] Server ready {elapsed:.2f}s after launch")
+        self.open_browser()
     
     def stop_server(self):
         """Stop the Flask server."""
@@ -375,12 +579,17 @@ class OfflineCoursePlayerApp(QMainWindow):
         event.accept()
 
 
-def main():
-    """Application entry point."""
+def main(launch_started: Optional[float] = None):
+    """
+    Application entry point.
+    
+    Args:
+        launch_started: time.perf_counter() when the launcher started
+    """
     app = QApplication(sys.argv)
     app.setApplicationName("Offline Course Player")
     
-    window = OfflineCoursePlayerApp()
+    window = OfflineCoursePlayerApp(launch_started)
     window.show()
     
     sys.exit(app.exec())
@@ -0,0 +1,584 @@
+"""
+HLS Streaming Module
+
+On-the-fly HLS for videos browsers cannot play or seek well (.mkv, .avi):
+- The VOD playlist is computed from the video's duration; no file is read
+  to build it
+- Each segment is transcoded on request with ffmpeg (H.264/AAC in
+  fragmented MP4), seeking in the input first, so any segment costs one
+  segment of work wherever the viewer jumps to
+- ffmpeg's output is split into the shared init segment (ftyp + moov,
+  EXT-X-MAP) and the media segment (moof + mdat), whose decode times are
+  moved to the segment's place on the video's timeline, so browsers
+  without native HLS can play the stream through Media Source Extensions
+- Segments are cached under <config dir>/cache/hls/<stream id>/, named by
+  a hash of the video's chapter, name, size and mtime, and evicted least
+  recently served first once the cache exceeds its cap
+- The next few segments of the video being watched are prefetched by a
+  small pool of background threads
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import math
+import os
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from cache import get_cache_dir
+from singleton import ProcessSingleton
+from thumbnails import find_ffmpeg
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.hls')
+
+# File types served through HLS by the player
+HLS_EXTENSIONS = ('.mkv', '.avi')
+
+# Segment length in seconds
+SEGMENT_SECONDS = 6
+
+# Init segment (ftyp + moov) shared by every segment of a stream
+INIT_NAME = 'init.mp4'
+
+# Bandwidth announced in the master playlist, which HLS requires; players
+# of a single-variant stream do not use it
+ESTIMATED_BANDWIDTH = 4000000
+
+# Segments generated ahead of the one requested
+PREFETCH_SEGMENTS = 3
+
+# Concurrent background ffmpeg processes
+PREFETCH_WORKERS = 2
+
+# Size cap of the segment cache
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+# Seconds between two cache size checks
+TRIM_INTERVAL = 60
+
+# Seconds one segment may take before ffmpeg is killed
+SEGMENT_TIMEOUT = 120
+
+# Seconds between two LRU timestamp updates of the same segment
+TOUCH_INTERVAL = 60
+
+
+def is_available() -> bool:
+    """Return True if segments can be generated (ffmpeg is installed)."""
+    return find_ffmpeg() is not None
+
+
+def segment_count(duration: float) -> int:
+    """Return the number of segments of a video."""
+    return max(1, math.ceil(duration / SEGMENT_SECONDS))
+
+
+def build_playlist(duration: float, stream: str) -> str:
+    """
+    Build the VOD media playlist of a video.
+
+    Segment URIs are relative to the playlist and carry the stream id, so
+    segments of a changed video never come from a stale browser cache.
+
+    Args:
+        duration: Video duration in seconds
+        stream: Stream id, the video's cache_key()
+
+    Returns:
+        str: M3U8 playlist text
+    """
+    lines = ['#EXTM3U', '#EXT-X-VERSION:7', f'#EXT-X-TARGETDURATION:{SEGMENT_SECONDS}',
+             '#EXT-X-MEDIA-SEQUENCE:0', '#EXT-X-PLAYLIST-TYPE:VOD',
+             '#EXT-X-INDEPENDENT-SEGMENTS', f'#EXT-X-MAP:URI="{INIT_NAME}?v={stream}"']
+    for index in range(segment_count(duration)):
+        length = min(SEGMENT_SECONDS, duration - index * SEGMENT_SECONDS)
+        lines.append(f'#EXTINF:{max(length, 0.001):.3f},')
+        lines.append(f'{index}.m4s?v={stream}')
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def build_master_playlist(stream: str, codecs: str) -> str:
+    """
+    Build the master playlist announcing the stream's codecs.
+
+    Media Source Extensions need the codecs before the first append, so
+    the player reads them from here.
+
+    Args:
+        stream: Stream id, the video's cache_key()
+        codecs: RFC 6381 codecs from codecs_of()
+
+    Returns:
+        str: M3U8 playlist text
+    """
+    return '\n'.join([
+        '#EXTM3U', '#EXT-X-VERSION:7', '#EXT-X-INDEPENDENT-SEGMENTS',
+        f'#EXT-X-STREAM-INF:BANDWIDTH={ESTIMATED_BANDWIDTH},CODECS="{codecs}"',
+        f'index.m3u8?v={stream}',
+    ]) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Fragmented MP4
+# ---------------------------------------------------------------------------
+
+def _boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int, int]]:
+    """
+    Yield the boxes between two offsets of an in-memory MP4.
+
+    Yields:
+        (type, box offset, header length, box size)
+
+    Raises:
+        ValueError: If a box runs past the end
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError('truncated box')
+        yield kind, offset, header, size
+        offset += size
+
+
+def _children(data: bytes, offset: int, header: int, size: int,
+              kind: bytes) -> List[Tuple[int, int, int]]:
+    """Return (offset, header, size) of the child boxes of one type."""
+    return [(child, child_header, child_size)
+            for child_kind, child, child_header, child_size
+            in _boxes(data, offset + header, offset + size) if child_kind == kind]
+
+
+def _track_timescales(data: bytes, moov: Tuple[int, int, int]) -> Dict[int, int]:
+    """Map track_ID to its media timescale (tkhd and mdhd of every trak)."""
+    timescales = {}
+    for trak in _children(data, *moov, b'trak'):
+        for offset, header, _ in _children(data, *trak, b'tkhd'):
+            version = data[offset + header]
+            track_id = struct.unpack_from('>I', data, offset + header + (20 if version == 1 else 12))[0]
+        for mdia in _children(data, *trak, b'mdia'):
+            for offset, header, _ in _children(data, *mdia, b'mdhd'):
+                version = data[offset + header]
+                timescales[track_id] = struct.unpack_from(
+                    '>I', data, offset + header + (20 if version == 1 else 12))[0]
+    return timescales
+
+
+def split_fragments(data: bytes, start: float) -> Tuple[bytes, bytes]:
+    """
+    Split ffmpeg's fragmented MP4 output into init and media segment.
+
+    The media segment's decode times (tfdt) are moved so each track starts
+    at 'start' seconds, which puts independently encoded segments on one
+    timeline.
+
+    Args:
+        data: Complete ffmpeg output (ftyp, moov, then moof/mdat pairs)
+        start: Position of the segment in the video, in seconds
+
+    Returns:
+        (init segment, media segment)
+
+    Raises:
+        ValueError: If the output is not fragmented MP4 or a decode time
+                    does not fit its field
+    """
+    boxes = list(_boxes(data, 0, len(data)))
+    kinds = [box[0] for box in boxes]
+    if b'moov' not in kinds or b'moof' not in kinds:
+        raise ValueError('not a fragmented MP4')
+    init = b''.join(data[offset:offset + size]
+                    for kind, offset, _, size in boxes if kind in (b'ftyp', b'moov'))
+    moov = boxes[kinds.index(b'moov')][1:]
+    timescales = _track_timescales(data, moov)
+
+    media = bytearray(b''.join(data[offset:offset + size]
+                               for kind, offset, _, size in boxes if kind in (b'moof', b'mdat')))
+    first: Dict[int, int] = {}
+    for kind, moof, header, size in _boxes(media, 0, len(media)):
+        if kind != b'moof':
+            continue
+        for traf in _children(media, moof, header, size, b'traf'):
+            track_id = None
+            for offset, box_header, _ in _children(media, *traf, b'tfhd'):
+                track_id = struct.unpack_from('>I', media, offset + box_header + 4)[0]
+            if track_id not in timescales:
+                raise ValueError('fragment of an unknown track')
+            for offset, box_header, _ in _children(media, *traf, b'tfdt'):
+                field = offset + box_header + 4
+                wide = media[offset + box_header] == 1
+                decode_time = struct.unpack_from('>Q' if wide else '>I', media, field)[0]
+                first.setdefault(track_id, decode_time)
+                moved = round(start * timescales[track_id]) + decode_time - first[track_id]
+                if not 0 <= moved < (1 << (64 if wide else 32)):
+                    raise ValueError('decode time out of range')
+                struct.pack_into('>Q' if wide else '>I', media, field, moved)
+    return init, bytes(media)
+
+
+def codecs_of(init: bytes) -> str:
+    """
+    Return the RFC 6381 codecs string of an init segment.
+
+    Args:
+        init: Init segment from split_fragments()
+
+    Returns:
+        str: E.g. 'avc1.64001f,mp4a.40.2'
+
+    Raises:
+        ValueError: If no supported track is found
+    """
+    codecs = []
+    for kind, moov, header, size in _boxes(init, 0, len(init)):
+        if kind != b'moov':
+            continue
+        for trak in _children(init, moov, header, size, b'trak'):
+            for mdia in _children(init, *trak, b'mdia'):
+                for minf in _children(init, *mdia, b'minf'):
+                    for stbl in _children(init, *minf, b'stbl'):
+                        for offset, box_header, box_size in _children(init, *stbl, b'stsd'):
+                            # Full box header and entry count precede the entries
+                            for entry, entry_offset, entry_header, entry_size in _boxes(
+                                    init, offset + box_header + 8, offset + box_size):
+                                if entry == b'mp4a':
+                                    codecs.append('mp4a.40.2')
+                                elif entry == b'avc1':
+                                    # 78 bytes of visual sample entry fields come first
+                                    for config, config_header, _ in _children(
+                                            init, entry_offset, entry_header + 78,
+                                            entry_size, b'avcC'):
+                                        profile, compat, level = init[config + config_header + 1:
+                                                                      config + config_header + 4]
+                                        codecs.append(f'avc1.{profile:02x}{compat:02x}{level:02x}')
+    if not codecs:
+        raise ValueError('no H.264/AAC track')
+    return ','.join(codecs)
+
+
+def _write_atomic(target: Path, data: bytes):
+    """Write a cache file so readers never see it half written."""
+    fd, tmp_path = tempfile.mkstemp(prefix='.segment.', suffix='.tmp', dir=str(target.parent))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _encode_segment(ffmpeg: str, source: str, start: float, length: float, target: Path) -> bool:
+    """
+    Transcode one segment; the file appears atomically on success.
+
+    Also writes the stream's init segment next to it if it is missing.
+    """
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.segment.', suffix='.tmp', dir=str(target.parent))
+    except OSError:
+        # Folder removed by a concurrent cache trim
+        return False
+    os.close(fd)
+    try:
+        # -ss before -i seeks in the input, so the cost does not grow with the
+        # position. Without B-frames every segment starts with a frame whose
+        # presentation time equals its decode time, so moving the decode
+        # times leaves no gap between segments. Fixed audio parameters keep
+        # every segment compatible with the one init segment.
+        command = [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error',
+                   '-ss', f'{start:.3f}', '-i', source, '-t', f'{length:.3f}',
+                   '-map', '0:v:0', '-map', '0:a:0?',
+                   '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+                   '-bf', '0',
+                   '-c:a', 'aac', '-ac', '2', '-ar', '48000', '-b:a', '128k',
+                   '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+                   '-f', 'mp4', '-y', tmp_path]
+        try:
+            result = subprocess.run(command, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                    timeout=SEGMENT_TIMEOUT,
+                                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        except (OSError, subprocess.SubprocessError):
+            return False
+        if result.returncode != 0:
+            return False
+        with open(tmp_path, 'rb') as f:
+            init, media = split_fragments(f.read(), start)
+        init_path = target.parent / INIT_NAME
+        if not init_path.is_file():
+            _write_atomic(init_path, init)
+        _write_atomic(target, media)
+        return True
+    except (OSError, ValueError) as e:
+        logger.warning("[HLS] Unusable ffmpeg output for %s: %s", os.path.basename(source), e)
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _touch(path: Path):
+    """Mark a cached segment as recently used for LRU eviction."""
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove_stream_dir(stream_dir: str):
+    """Delete a stream folder that has no segments left, with its init segment."""
+    try:
+        os.unlink(os.path.join(stream_dir, INIT_NAME))
+    except OSError:
+        pass
+    try:
+        os.rmdir(stream_dir)
+    except OSError:
+        pass
+
+
+def trim_cache(max_bytes: int = MAX_CACHE_BYTES) -> int:
+    """
+    Evict the least recently used segments until the cache fits the cap.
+
+    Init segments are not evicted on their own; they go with the last
+    segment of their stream.
+
+    Args:
+        max_bytes: Size cap in bytes
+
+    Returns:
+        int: Number of segments removed
+    """
+    cache_dir = get_cache_dir('hls')
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as streams:
+        stream_dirs = [entry.path for entry in streams if entry.is_dir()]
+    for stream_dir in stream_dirs:
+        found = 0
+        with os.scandir(stream_dir) as it:
+            for entry in it:
+                if entry.name == INIT_NAME or entry.name.startswith('.'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+                found += 1
+        if not found:
+            # Left behind by videos whose segments all failed
+            _remove_stream_dir(stream_dir)
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        # Drop the stream's folder with its last segment
+        stream_dir = os.path.dirname(path)
+        try:
+            names = os.listdir(stream_dir)
+        except OSError:
+            continue
+        if not any(name != INIT_NAME and not name.startswith('.') for name in names):
+            _remove_stream_dir(stream_dir)
+    if removed:
+        logger.info("[HLS] Evicted %d cached segment(s)", removed)
+    return removed
+
+
+class HlsSegmenter:
+    """Produces segments on request and prefetches the ones that follow."""
+
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        """
+        Initialize an idle segmenter.
+
+        Args:
+            workers: Number of concurrent background ffmpeg processes
+        """
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._current: Optional[str] = None
+        self._inflight: Dict[Tuple[str, int], Future] = {}
+        self._queued: Set[Tuple[str, int]] = set()
+        self._last_trim = 0.0
+
+    def get_segment(self, source: str, stream: str, index: int, duration: float) -> Optional[str]:
+        """
+        Return a segment, generating it first if it is not cached.
+
+        Makes this the stream being watched: queued prefetches of any other
+        stream are skipped when they come up.
+
+        Args:
+            source: Path of the video file
+            stream: Stream id, the video's cache_key()
+            index: Segment number
+            duration: Video duration in seconds
+
+        Returns:
+            Optional[str]: Path of the media segment, or None if ffmpeg is
+            missing or failed
+        """
+        ffmpeg = find_ffmpeg()
+        if ffmpeg is None or not 0 <= index < segment_count(duration):
+            return None
+        with self._lock:
+            self._current = stream
+        target = self._segment_path(stream, index)
+        if target.is_file() and (target.parent / INIT_NAME).is_file():
+            _touch(target)
+            ready = True
+        else:
+            ready = self._build(ffmpeg, source, stream, index, duration)
+        self._prefetch(ffmpeg, source, stream, index + 1, duration)
+        return str(target) if ready else None
+
+    def get_init(self, source: str, stream: str, duration: float) -> Optional[str]:
+        """
+        Return the init segment of a stream, generating segment 0 for it if needed.
+
+        Args:
+            source: Path of the video file
+            stream: Stream id, the video's cache_key()
+            duration: Video duration in seconds
+
+        Returns:
+            Optional[str]: Path of the init segment, or None if ffmpeg is
+            missing or failed
+        """
+        init_path = get_cache_dir('hls') / stream / INIT_NAME
+        if not init_path.is_file():
+            if self.get_segment(source, stream, 0, duration) is None:
+                return None
+        return str(init_path) if init_path.is_file() else None
+
+    def _segment_path(self, stream: str, index: int) -> Path:
+        """Return the cache path of a segment, creating its folder."""
+        stream_dir = get_cache_dir('hls') / stream
+        stream_dir.mkdir(exist_ok=True)
+        return stream_dir / f"{index}.m4s"
+
+    def _build(self, ffmpeg: str, source: str, stream: str, index: int, duration: float) -> bool:
+        """Generate one segment, or wait for the thread already doing so."""
+        job = (stream, index)
+        with self._lock:
+            future = self._inflight.get(job)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[job] = future
+        if not owner:
+            try:
+                return future.result(timeout=SEGMENT_TIMEOUT)
+            except Exception:
+                return False
+
+        ready = False
+        try:
+            target = self._segment_path(stream, index)
+            if target.is_file() and (target.parent / INIT_NAME).is_file():
+                # A prefetch finished it after the caller looked
+                ready = True
+                return ready
+            start = index * SEGMENT_SECONDS
+            length = min(SEGMENT_SECONDS, duration - start)
+            ready = _encode_segment(ffmpeg, source, start, length, target)
+            if not ready:
+                logger.warning("[HLS] Segment %d of %s failed", index, os.path.basename(source))
+        finally:
+            with self._lock:
+                del self._inflight[job]
+            future.set_result(ready)
+        self._maybe_trim()
+        return ready
+
+    def _prefetch(self, ffmpeg: str, source: str, stream: str, first: int, duration: float):
+        """Queue the segments following the one just served."""
+        last = min(first + PREFETCH_SEGMENTS, segment_count(duration))
+        with self._lock:
+            for index in range(first, last):
+                job = (stream, index)
+                if job in self._queued or job in self._inflight:
+                    continue
+                if self._segment_path(stream, index).is_file():
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='hls-prefetch')
+                self._queued.add(job)
+                self._executor.submit(self._prefetch_job, ffmpeg, source, stream, index, duration)
+
+    def _prefetch_job(self, ffmpeg: str, source: str, stream: str, index: int, duration: float):
+        """Worker job: generate one segment unless the viewer moved on."""
+        with self._lock:
+            self._queued.discard((stream, index))
+            if self._current != stream:
+                return
+        if not self._segment_path(stream, index).is_file():
+            self._build(ffmpeg, source, stream, index, duration)
+
+    def _maybe_trim(self):
+        """Trim the cache at most once per TRIM_INTERVAL."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_trim < TRIM_INTERVAL:
+                return
+            self._last_trim = now
+        try:
+            trim_cache()
+        except OSError as e:
+            logger.error("[HLS] Cache trim failed: %s", e)
+
+    def stop(self):
+        """Drop queued prefetches; running ffmpeg processes finish on their own."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._current = None
+            self._queued.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global segmenter instance for module-level access
+_segmenter = ProcessSingleton(HlsSegmenter)
+
+
+def get_segmenter() -> HlsSegmenter:
+    """
+    Get or create the global HLS segmenter.
+
+    Returns:
+        HlsSegmenter: Segmenter instance
+    """
+    return _segmenter.get()
+
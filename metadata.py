@@ -0,0 +1,703 @@
+"""
+Video Metadata Module
+
+Reads duration, resolution and bitrate from video container headers in pure
+Python, without decoding any frames:
+- MP4/MOV: the moov box (mvhd duration, tkhd size of the video track),
+  found by skipping from box header to box header; files whose moov comes
+  after the media data are flagged as not faststart
+- Matroska/WebM: Segment Info and Tracks, via the SeekHead when they are
+  stored after the clusters
+- AVI: the RIFF avih header (and the OpenDML frame count for large files)
+
+Results are stored next to the catalog in video_metadata and stay valid
+while the file's size and mtime are unchanged. A background prober fills in
+missing or stale rows, probing files on a worker pool; after a catalog
+change it only looks at the chapters and files that changed. Files that
+cannot be read get a row with probe_error set, so they are retried once
+their size or mtime changes rather than on every pass.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, BinaryIO, Dict, List, Optional, Set, Tuple
+
+import database
+from singleton import ProcessSingleton
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.metadata')
+
+# Parallel probes; header reads are I/O bound, so this also helps on one core
+PROBE_WORKERS = min(8, (os.cpu_count() or 2) * 2)
+
+# Results written per transaction while a pass is running
+WRITE_BATCH = 50
+
+# Seconds before an unforced schedule() re-checks the catalog
+RESCAN_INTERVAL = 30.0
+
+# Largest moov / Matroska header element read into memory
+MAX_HEADER_BYTES = 64 * 1024 * 1024
+
+
+# ---------------------------------------------------------------------------
+# MP4 / MOV
+# ---------------------------------------------------------------------------
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Yield (type, payload start, payload end) for the boxes in a buffer."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            return
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _find_box(data: bytes, kind: bytes, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """Return (payload start, payload end) of the first child box of a type."""
+    for box_kind, box_start, box_end in _iter_boxes(data, start, end):
+        if box_kind == kind:
+            return box_start, box_end
+    return None
+
+
+def iter_mp4_boxes(f: BinaryIO, size: int):
+    """
+    Yield the top-level boxes of an MP4 file by reading box headers only.
+
+    Args:
+        f: File opened in binary mode
+        size: File size in bytes
+
+    Yields:
+        (type, box offset, box size)
+    """
+    offset = 0
+    while offset + 8 <= size:
+        f.seek(offset)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        box_size, box_kind = struct.unpack_from('>I4s', header)
+        if box_size == 1:
+            if len(header) < 16:
+                return
+            box_size = struct.unpack_from('>Q', header, 8)[0]
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < 8:
+            return
+        yield box_kind, offset, box_size
+        offset += box_size
+
+
+def find_mp4_box(f: BinaryIO, size: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Locate a top-level box by reading box headers only.
+
+    Args:
+        f: File opened in binary mode
+        size: File size in bytes
+        kind: Four-character box type, e.g. b'moov'
+
+    Returns:
+        Optional[Tuple[int, int]]: (box offset, box size), or None
+    """
+    for box_kind, offset, box_size in iter_mp4_boxes(f, size):
+        if box_kind == kind:
+            return offset, box_size
+    return None
+
+
+def _probe_mp4(f: BinaryIO, size: int) -> Optional[Dict[str, Any]]:
+    """Read duration, video track size and faststart layout from the moov box."""
+    found = first_mdat = None
+    for kind, offset, box_size in iter_mp4_boxes(f, size):
+        if kind == b'mdat' and first_mdat is None:
+            first_mdat = offset
+        elif kind == b'moov':
+            found = (offset, box_size)
+            break
+    if found is None or found[1] > MAX_HEADER_BYTES:
+        return None
+    # The player can only start once it has the moov box
+    faststart = first_mdat is None
+    f.seek(found[0])
+    moov = f.read(found[1])
+    header = 16 if struct.unpack_from('>I', moov)[0] == 1 else 8
+
+    duration = None
+    mvhd = _find_box(moov, b'mvhd', header, len(moov))
+    if mvhd is not None:
+        start = mvhd[0]
+        if moov[start] == 1:
+            timescale, length = struct.unpack_from('>IQ', moov, start + 20)
+            unknown = length == 0xFFFFFFFFFFFFFFFF
+        else:
+            timescale, length = struct.unpack_from('>II', moov, start + 12)
+            unknown = length == 0xFFFFFFFF
+        if timescale and length and not unknown:
+            duration = length / timescale
+
+    # Fragmented files keep the total in mvex/mehd
+    if duration is None and mvhd is not None:
+        mvex = _find_box(moov, b'mvex', header, len(moov))
+        mehd = _find_box(moov, b'mehd', *mvex) if mvex else None
+        if mehd is not None:
+            start = mehd[0]
+            length = (struct.unpack_from('>Q', moov, start + 4)[0] if moov[start] == 1
+                      else struct.unpack_from('>I', moov, start + 4)[0])
+            timescale = struct.unpack_from('>I', moov, mvhd[0] + (20 if moov[mvhd[0]] == 1 else 12))[0]
+            if timescale and length:
+                duration = length / timescale
+
+    width = height = None
+    for kind, start, end in _iter_boxes(moov, header):
+        if kind != b'trak':
+            continue
+        mdia = _find_box(moov, b'mdia', start, end)
+        hdlr = _find_box(moov, b'hdlr', *mdia) if mdia else None
+        if hdlr is None or moov[hdlr[0] + 8:hdlr[0] + 12] != b'vide':
+            continue
+        tkhd = _find_box(moov, b'tkhd', start, end)
+        if tkhd is not None and tkhd[1] - tkhd[0] >= 84:
+            # Width and height are the last two 16.16 fixed-point fields
+            w, h = struct.unpack_from('>II', moov, tkhd[1] - 8)
+            width, height = w >> 16, h >> 16
+            break
+
+    return {'container': 'mp4', 'duration': duration, 'width': width, 'height': height,
+            'faststart': faststart}
+
+
+# ---------------------------------------------------------------------------
+# Matroska / WebM
+# ---------------------------------------------------------------------------
+
+EBML_HEADER = 0x1A45DFA3
+EBML_DOC_TYPE = 0x4282
+MKV_SEGMENT = 0x18538067
+MKV_SEEK_HEAD = 0x114D9B74
+MKV_SEEK = 0x4DBB
+MKV_SEEK_ID = 0x53AB
+MKV_SEEK_POSITION = 0x53AC
+MKV_INFO = 0x1549A966
+MKV_TIMECODE_SCALE = 0x2AD7B1
+MKV_DURATION = 0x4489
+MKV_TRACKS = 0x1654AE6B
+MKV_TRACK_ENTRY = 0xAE
+MKV_TRACK_TYPE = 0x83
+MKV_VIDEO = 0xE0
+MKV_PIXEL_WIDTH = 0xB0
+MKV_PIXEL_HEIGHT = 0xBA
+MKV_CLUSTER = 0x1F43B675
+
+
+def _read_vint(data: bytes, offset: int, keep_marker: bool) -> Tuple[Optional[int], int]:
+    """
+    Decode an EBML variable-length integer.
+
+    Returns:
+        (value, length); value is None for the reserved "unknown size"
+    """
+    first = data[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or offset + length > len(data):
+        raise ValueError('invalid EBML integer')
+    value = first if keep_marker else first & (mask - 1)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None, length
+    return value, length
+
+
+def _ebml_header(data: bytes, offset: int = 0) -> Tuple[int, Optional[int], int]:
+    """Return (element id, data size, header length) at an offset."""
+    element_id, id_length = _read_vint(data, offset, True)
+    data_size, size_length = _read_vint(data, offset + id_length, False)
+    return element_id, data_size, id_length + size_length
+
+
+def _iter_elements(data: bytes, start: int = 0, end: Optional[int] = None):
+    """Yield (id, payload start, payload end) for elements in a buffer."""
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        element_id, data_size, header = _ebml_header(data, offset)
+        if data_size is None:
+            return
+        yield element_id, offset + header, min(offset + header + data_size, end)
+        offset += header + data_size
+
+
+def _ebml_uint(data: bytes, start: int, end: int) -> int:
+    return int.from_bytes(data[start:end], 'big')
+
+
+def _read_element_at(f: BinaryIO, offset: int) -> Optional[Tuple[int, Optional[int], int]]:
+    """Read the element header at a file offset: (id, size, header length)."""
+    f.seek(offset)
+    header = f.read(12)
+    if not header:
+        return None
+    return _ebml_header(header)
+
+
+def _probe_matroska(f: BinaryIO, size: int) -> Optional[Dict[str, Any]]:
+    """Read duration and video size from the Segment's Info and Tracks."""
+    found = _read_element_at(f, 0)
+    if found is None or found[0] != EBML_HEADER or found[1] is None:
+        return None
+    doc_type = b''
+    f.seek(found[2])
+    header_data = f.read(found[1])
+    for element_id, start, end in _iter_elements(header_data):
+        if element_id == EBML_DOC_TYPE:
+            doc_type = header_data[start:end].rstrip(b'\x00')
+
+    segment_offset = found[1] + found[2]
+    segment = _read_element_at(f, segment_offset)
+    if segment is None or segment[0] != MKV_SEGMENT:
+        return None
+    data_start = segment_offset + segment[2]
+    data_end = size if segment[1] is None else min(data_start + segment[1], size)
+
+    sections: Dict[int, bytes] = {}
+    seek_positions: Dict[int, int] = {}
+    offset = data_start
+    while offset < data_end and not (MKV_INFO in sections and MKV_TRACKS in sections):
+        element = _read_element_at(f, offset)
+        if element is None:
+            break
+        element_id, data_size, header = element
+        if element_id == MKV_CLUSTER or data_size is None:
+            break
+        if element_id in (MKV_INFO, MKV_TRACKS, MKV_SEEK_HEAD) and data_size <= MAX_HEADER_BYTES:
+            f.seek(offset + header)
+            payload = f.read(data_size)
+            if element_id == MKV_SEEK_HEAD:
+                for seek_id, start, end in _iter_elements(payload):
+                    if seek_id != MKV_SEEK:
+                        continue
+                    target = position = None
+                    for child_id, child_start, child_end in _iter_elements(payload, start, end):
+                        if child_id == MKV_SEEK_ID:
+                            target = _ebml_uint(payload, child_start, child_end)
+                        elif child_id == MKV_SEEK_POSITION:
+                            position = _ebml_uint(payload, child_start, child_end)
+                    if target is not None and position is not None:
+                        seek_positions.setdefault(target, position)
+            else:
+                sections[element_id] = payload
+        offset += header + data_size
+
+    # Info/Tracks written after the clusters are reachable through the SeekHead
+    for element_id in (MKV_INFO, MKV_TRACKS):
+        if element_id in sections or element_id not in seek_positions:
+            continue
+        element = _read_element_at(f, data_start + seek_positions[element_id])
+        if element and element[0] == element_id and element[1] is not None \
+                and element[1] <= MAX_HEADER_BYTES:
+            f.seek(data_start + seek_positions[element_id] + element[2])
+            sections[element_id] = f.read(element[1])
+
+    duration = None
+    info = sections.get(MKV_INFO)
+    if info is not None:
+        timecode_scale = 1000000
+        raw_duration = None
+        for element_id, start, end in _iter_elements(info):
+            if element_id == MKV_TIMECODE_SCALE:
+                timecode_scale = _ebml_uint(info, start, end) or timecode_scale
+            elif element_id == MKV_DURATION and end - start in (4, 8):
+                raw_duration = struct.unpack('>f' if end - start == 4 else '>d', info[start:end])[0]
+        if raw_duration and raw_duration > 0:
+            duration = raw_duration * timecode_scale / 1e9
+
+    width = height = None
+    tracks = sections.get(MKV_TRACKS)
+    if tracks is not None:
+        for element_id, start, end in _iter_elements(tracks):
+            if element_id != MKV_TRACK_ENTRY:
+                continue
+            track_type = None
+            video = None
+            for child_id, child_start, child_end in _iter_elements(tracks, start, end):
+                if child_id == MKV_TRACK_TYPE:
+                    track_type = _ebml_uint(tracks, child_start, child_end)
+                elif child_id == MKV_VIDEO:
+                    video = (child_start, child_end)
+            if track_type == 1 and video is not None:
+                for child_id, child_start, child_end in _iter_elements(tracks, *video):
+                    if child_id == MKV_PIXEL_WIDTH:
+                        width = _ebml_uint(tracks, child_start, child_end)
+                    elif child_id == MKV_PIXEL_HEIGHT:
+                        height = _ebml_uint(tracks, child_start, child_end)
+                break
+
+    container = 'webm' if doc_type == b'webm' else 'matroska'
+    return {'container': container, 'duration': duration, 'width': width, 'height': height}
+
+
+# ---------------------------------------------------------------------------
+# AVI
+# ---------------------------------------------------------------------------
+
+def _probe_avi(f: BinaryIO, size: int) -> Optional[Dict[str, Any]]:
+    """Read frame rate, frame count and size from the hdrl list."""
+    f.seek(0)
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'AVI ':
+        return None
+    f.seek(12)
+    list_header = f.read(12)
+    if len(list_header) < 12 or list_header[:4] != b'LIST' or list_header[8:12] != b'hdrl':
+        return None
+    list_size = struct.unpack_from('<I', list_header, 4)[0]
+    if list_size > MAX_HEADER_BYTES:
+        return None
+    hdrl = f.read(list_size - 4)
+
+    usec_per_frame = total_frames = width = height = None
+    offset = 0
+    while offset + 8 <= len(hdrl):
+        chunk_id, chunk_size = struct.unpack_from('<4sI', hdrl, offset)
+        body = offset + 8
+        if chunk_id == b'avih' and chunk_size >= 40:
+            usec_per_frame, = struct.unpack_from('<I', hdrl, body)
+            total_frames, = struct.unpack_from('<I', hdrl, body + 16)
+            width, height = struct.unpack_from('<II', hdrl, body + 32)
+        elif chunk_id == b'LIST' and hdrl[body:body + 4] == b'odml':
+            # OpenDML (files over 1 GB): avih only counts the first RIFF chunk
+            if hdrl[body + 4:body + 8] == b'dmlh':
+                total_frames = struct.unpack_from('<I', hdrl, body + 12)[0] or total_frames
+        offset = body + chunk_size + (chunk_size & 1)
+
+    duration = None
+    if usec_per_frame and total_frames:
+        duration = usec_per_frame * total_frames / 1e6
+    return {'container': 'avi', 'duration': duration, 'width': width, 'height': height}
+
+
+_PROBES = {
+    '.mp4': _probe_mp4,
+    '.m4v': _probe_mp4,
+    '.mov': _probe_mp4,
+    '.mkv': _probe_matroska,
+    '.webm': _probe_matroska,
+    '.avi': _probe_avi,
+}
+
+
+def probe_file(path: str) -> Dict[str, Any]:
+    """
+    Read a video's metadata from its container headers.
+
+    Args:
+        path: Absolute path of the video file
+
+    Returns:
+        Dict with size, mtime, container, duration (seconds), width,
+        height, bitrate (bits per second) and faststart (MP4/MOV only);
+        values that could not be determined are None
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        result = {'size': st.st_size, 'mtime': st.st_mtime, 'container': None,
+                  'duration': None, 'width': None, 'height': None, 'bitrate': None,
+                  'faststart': None}
+        probe = _PROBES.get(os.path.splitext(path)[1].lower())
+        if probe is None:
+            return result
+        try:
+            found = probe(f, st.st_size)
+        except (ValueError, struct.error, IndexError):
+            found = None
+    if found:
+        result.update(found)
+    if result['duration']:
+        result['bitrate'] = int(result['size'] * 8 / result['duration'])
+    return result
+
+
+def get_metadata(chapter: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Return the stored metadata of a chapter's videos.
+
+    Only rows matching the catalog's current size and mtime are returned.
+
+    Args:
+        chapter: Chapter folder name
+
+    Returns:
+        Dict mapping file name to {duration, width, height, bitrate,
+        container, faststart}
+    """
+    c = database.get_connection().cursor()
+    c.execute('''SELECT m.file_name, m.duration, m.width, m.height, m.bitrate, m.container,
+                        m.faststart
+                 FROM catalog_files f
+                 JOIN video_metadata m ON m.chapter = f.chapter AND m.file_name = f.file_name
+                                      AND m.size = f.size AND m.mtime = f.mtime
+                 WHERE f.chapter = ? AND f.kind = 'video' AND m.probe_error IS NULL''', (chapter,))
+    return {
+        row[0]: {'duration': row[1], 'width': row[2], 'height': row[3],
+                 'bitrate': row[4], 'container': row[5],
+                 'faststart': None if row[6] is None else bool(row[6])}
+        for row in c.fetchall()
+    }
+
+
+def get_slow_start_files() -> List[Tuple[str, str, int, float]]:
+    """
+    Return the MP4/MOV files whose moov box comes after the media data.
+
+    Returns:
+        List of (chapter, file_name, size, mtime), sorted by chapter and name
+    """
+    c = database.get_connection().cursor()
+    c.execute('''SELECT f.chapter, f.file_name, f.size, f.mtime
+                 FROM catalog_files f
+                 JOIN video_metadata m ON m.chapter = f.chapter AND m.file_name = f.file_name
+                                      AND m.size = f.size AND m.mtime = f.mtime
+                 WHERE f.kind = 'video' AND m.faststart = 0
+                 ORDER BY f.chapter, f.file_name''')
+    return c.fetchall()
+
+
+class MetadataProber:
+    """Background pass that probes catalog videos without current metadata."""
+
+    def __init__(self, workers: int = PROBE_WORKERS):
+        """
+        Initialize an idle prober.
+
+        Args:
+            workers: Number of parallel probe threads
+        """
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._root: Optional[str] = None
+        self._full = False
+        self._changes: Dict[str, Optional[Set[str]]] = {}
+        self._stopping = False
+        self._last_pass = 0.0
+
+    def schedule(self, base_path: str, force: bool = False,
+                 changes: Optional[Dict[str, Optional[Set[str]]]] = None):
+        """
+        Start a probe pass in the background unless one ran recently.
+
+        Args:
+            base_path: Content root folder the catalog describes
+            force: The catalog just changed; check every video even if a
+                   pass ran within RESCAN_INTERVAL
+            changes: Check only these chapters and files, in the format of
+                     catalog.apply_changes() (None for a whole chapter)
+        """
+        base_path = os.path.abspath(base_path)
+        with self._lock:
+            if self._stopping:
+                return
+            if base_path != self._root:
+                self._root = base_path
+                self._changes = {}
+                self._full = True
+            elif changes is not None:
+                for chapter, file_names in changes.items():
+                    known = self._changes.get(chapter, set())
+                    if known is None or file_names is None:
+                        self._changes[chapter] = None
+                    else:
+                        self._changes[chapter] = known | file_names
+            elif force or time.monotonic() - self._last_pass >= RESCAN_INTERVAL:
+                self._full = True
+            if self._thread is None and (self._full or self._changes):
+                self._thread = threading.Thread(target=self._run, name='metadata-prober',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """Probe passes until no further pass was requested."""
+        try:
+            while True:
+                with self._lock:
+                    base_path, full, changes = self._root, self._full, self._changes
+                    self._full, self._changes = False, {}
+                    if self._stopping or not (full or changes):
+                        self._thread = None
+                        return
+                try:
+                    self._probe_pass(base_path, None if full else changes)
+                except Exception as e:
+                    logger.exception("[METADATA] Probe pass failed: %s", e)
+                if full:
+                    with self._lock:
+                        self._last_pass = time.monotonic()
+        finally:
+            database.release_connection()
+
+    def _probe_pass(self, base_path: str,
+                    changes: Optional[Dict[str, Optional[Set[str]]]] = None):
+        """
+        Probe the videos whose metadata is missing or stale.
+
+        Args:
+            base_path: Content root folder
+            changes: Only look at these chapters and files; None checks
+                     the whole catalog
+        """
+        stale_sql = '''SELECT f.chapter, f.file_name, f.size, f.mtime
+                       FROM catalog_files f
+                       LEFT JOIN video_metadata m ON m.chapter = f.chapter AND m.file_name = f.file_name
+                       WHERE f.kind = 'video'
+                         AND (m.chapter IS NULL OR m.size != f.size OR m.mtime != f.mtime)'''
+        c = database.get_connection().cursor()
+        if changes is None:
+            c.execute(stale_sql)
+            stale = c.fetchall()
+        else:
+            stale = []
+            for chapter, file_names in changes.items():
+                if file_names is None:
+                    c.execute(stale_sql + ' AND f.chapter = ?', (chapter,))
+                    stale.extend(c.fetchall())
+                    continue
+                for file_name in file_names:
+                    c.execute(stale_sql + ' AND f.chapter = ? AND f.file_name = ?',
+                              (chapter, file_name))
+                    stale.extend(c.fetchall())
+
+        started = time.monotonic()
+        probed = failed = slow_starts = 0
+        if stale:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='metadata-probe')
+                executor = self._executor
+            futures = {
+                executor.submit(probe_file, os.path.join(base_path, chapter, file_name)):
+                    (chapter, file_name, size, mtime)
+                for chapter, file_name, size, mtime in stale
+            }
+            rows: List[tuple] = []
+            for future in as_completed(futures):
+                if self._stopping:
+                    break
+                if future.cancelled():
+                    continue
+                chapter, file_name, size, mtime = futures[future]
+                try:
+                    result = future.result()
+                except OSError as e:
+                    # Stored under the catalog's size and mtime, so the file
+                    # is not retried until it changes
+                    rows.append((chapter, file_name, size, mtime, None, None, None, None,
+                                 None, None, e.strerror or type(e).__name__))
+                    failed += 1
+                else:
+                    faststart = result['faststart']
+                    rows.append((chapter, file_name, result['size'], result['mtime'],
+                                 result['container'], result['duration'], result['width'],
+                                 result['height'], result['bitrate'],
+                                 None if faststart is None else int(faststart), None))
+                    if faststart is False:
+                        slow_starts += 1
+                if len(rows) >= WRITE_BATCH:
+                    probed += self._write(rows)
+                    rows = []
+            for future in futures:
+                future.cancel()
+            probed += self._write(rows)
+
+        # Forget files that left the catalog
+        orphan_sql = '''DELETE FROM video_metadata WHERE NOT EXISTS
+                        (SELECT 1 FROM catalog_files f
+                         WHERE f.chapter = video_metadata.chapter
+                           AND f.file_name = video_metadata.file_name)'''
+        with database.transaction() as conn:
+            if changes is None:
+                conn.execute(orphan_sql)
+            else:
+                for chapter, file_names in changes.items():
+                    if file_names is None:
+                        conn.execute(orphan_sql + ' AND chapter = ?', (chapter,))
+                    else:
+                        conn.executemany(orphan_sql + ' AND chapter = ? AND file_name = ?',
+                                         [(chapter, file_name) for file_name in file_names])
+        if probed:
+            logger.info("[METADATA] Probed %d video(s) in %.1fs", probed, time.monotonic() - started)
+        if failed:
+            logger.warning("[METADATA] %d video(s) could not be read; retried once they change", failed)
+        if slow_starts:
+            logger.info("[METADATA] %d MP4 file(s) are not faststart (see /api/faststart)", slow_starts)
+
+    def _write(self, rows: List[tuple]) -> int:
+        """Store a batch of probe results in one transaction."""
+        if not rows:
+            return 0
+        with database.transaction() as conn:
+            conn.executemany('''INSERT OR REPLACE INTO video_metadata
+                                (chapter, file_name, size, mtime, container, duration,
+                                 width, height, bitrate, faststart, probe_error)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        return len(rows)
+
+    def stop(self):
+        """Cancel queued probes and wait for the running pass to end."""
+        with self._lock:
+            self._stopping = True
+            thread, executor = self._thread, self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._lock:
+            self._stopping = False
+
+
+# Global prober instance for module-level access
+_prober = ProcessSingleton(MetadataProber)
+
+
+def get_prober() -> MetadataProber:
+    """
+    Get or create the global metadata prober.
+
+    Returns:
+        MetadataProber: Prober instance
+    """
+    return _prober.get()
+
@@ -0,0 +1,474 @@
+"""
+Metrics Module
+
+In-process instrumentation for the server's hot paths:
+- Histograms (cumulative buckets, sum and count) and counters, optionally
+  labelled, updated under one short lock per metric
+- Request latency per route, SQLite statement timings, bytes sent for
+  media, catalog scan durations and progress buffer flush sizes
+- Rendered in the Prometheus text format for /api/metrics, or summarized
+  with estimated percentiles for the desktop app's metrics panel
+
+Values are kept per process. Pre-fork workers each write a snapshot of
+theirs to a folder shared with the other workers every SHARE_INTERVAL, and
+a scrape merges the snapshots, so it reports every worker whichever one
+answers it.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Row count buckets for batched writes
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Seconds between two snapshots written by a process sharing its metrics
+SHARE_INTERVAL = 2.0
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    """Render {name="value",...}, or '' without labels."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    """Render a sample value, without a fraction for whole numbers."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        """
+        Initialize an empty counter.
+
+        Args:
+            name: Metric name
+            help_text: One-line description for # HELP
+            labels: Label names, in the order values are passed
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        """Add amount to the series of the given label values."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> Dict[Tuple[str, ...], float]:
+        """Return a copy of every series."""
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, merged: Dict[Tuple[str, ...], float], rows: List[list]):
+        """Add snapshot rows ([label values, value]) to merged series."""
+        for labels, value in rows:
+            labels = tuple(labels)
+            merged[labels] = merged.get(labels, 0) + value
+
+    def render(self, series: Optional[Dict[Tuple[str, ...], float]] = None) -> List[str]:
+        """Render the samples (default: this process's) in the Prometheus text format."""
+        if series is None:
+            series = self.collect()
+        return [f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}'
+                for labels, value in sorted(series.items())]
+
+    def reset(self):
+        """Drop every series."""
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Bucketed distribution of observed values, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            name: Metric name
+            help_text: One-line description for # HELP
+            labels: Label names, in the order values are passed
+            buckets: Sorted upper bounds; +Inf is implied
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # Label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        """Record one value in the series of the given label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the duration of a block in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def collect(self) -> Dict[Tuple[str, ...], Tuple[List[int], float, int]]:
+        """Return a copy of every series as (bucket counts, sum, count)."""
+        with self._lock:
+            return {labels: (list(counts), total, count)
+                    for labels, (counts, total, count) in self._series.items()}
+
+    def quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        """
+        Estimate a quantile from bucket counts (upper bound of its bucket).
+
+        Args:
+            q: Quantile between 0 and 1
+            counts: Per-bucket counts from collect()
+
+        Returns:
+            Optional[float]: Estimated value; None without observations, or
+            inf when it falls in the +Inf bucket
+        """
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def merge(self, merged: Dict[Tuple[str, ...], Tuple[List[int], float, int]],
+              rows: List[list]):
+        """Add snapshot rows ([label values, bucket counts, sum, count]) to merged series."""
+        for labels, counts, total, count in rows:
+            if len(counts) != len(self.buckets) + 1:
+                continue  # Written by a release with other buckets
+            labels = tuple(labels)
+            known = merged.get(labels)
+            if known is not None:
+                counts = [a + b for a, b in zip(known[0], counts)]
+                total += known[1]
+                count += known[2]
+            merged[labels] = (list(counts), total, count)
+
+    def render(self, series: Optional[Dict[Tuple[str, ...], tuple]] = None) -> List[str]:
+        """Render the samples (default: this process's) in the Prometheus text format."""
+        if series is None:
+            series = self.collect()
+        lines = []
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, labels, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            le = _format_labels(self.labels, labels, ('le', '+Inf'))
+            lines.append(f'{self.name}_bucket{le} {count}')
+            plain = _format_labels(self.labels, labels)
+            lines.append(f'{self.name}_sum{plain} {_format_value(total)}')
+            lines.append(f'{self.name}_count{plain} {count}')
+        return lines
+
+    def reset(self):
+        """Drop every series."""
+        with self._lock:
+            self._series.clear()
+
+
+# ============================================================================
+# Instrumented metrics
+# ============================================================================
+
+REQUEST_SECONDS = Histogram(
+    'course_http_request_duration_seconds',
+    'Time to build a response, by route, method and status',
+    ('route', 'method', 'status'))
+
+DB_QUERY_SECONDS = Histogram(
+    'course_db_query_duration_seconds',
+    'Time spent in SQLite execute()/executemany(), by statement type',
+    ('statement',))
+
+MEDIA_BYTES = Counter(
+    'course_media_bytes_total',
+    'Bytes sent by serve_static (body length of 200/206 responses)',
+    ('kind',))
+
+CATALOG_SCAN_SECONDS = Histogram(
+    'course_catalog_scan_duration_seconds',
+    'Duration of catalog mtime sweeps, by whether the index changed',
+    ('changed',))
+
+PROGRESS_FLUSH_ROWS = Histogram(
+    'course_progress_flush_rows',
+    'Rows written per progress buffer flush',
+    buckets=SIZE_BUCKETS)
+
+PROGRESS_FLUSH_SECONDS = Histogram(
+    'course_progress_flush_duration_seconds',
+    'Duration of progress buffer flush transactions')
+
+ALL_METRICS = (REQUEST_SECONDS, DB_QUERY_SECONDS, MEDIA_BYTES, CATALOG_SCAN_SECONDS,
+               PROGRESS_FLUSH_ROWS, PROGRESS_FLUSH_SECONDS)
+
+_started = time.time()
+
+# Folder this process shares snapshots through (pre-fork workers), with the
+# event and thread writing them
+_share_dir: Optional[str] = None
+_share_stop: Optional[threading.Event] = None
+_share_thread: Optional[threading.Thread] = None
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Return this process's metrics as JSON-serializable data.
+
+    Returns:
+        Dict with 'pid', 'started' and 'series' (metric name -> rows of
+        label values and their values)
+    """
+    series = {}
+    for metric in ALL_METRICS:
+        if metric.kind == 'counter':
+            series[metric.name] = [[list(labels), value]
+                                   for labels, value in metric.collect().items()]
+        else:
+            series[metric.name] = [[list(labels), counts, total, count]
+                                   for labels, (counts, total, count) in metric.collect().items()]
+    return {'pid': os.getpid(), 'started': _started, 'series': series}
+
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    """Return the file a process writes its snapshots to."""
+    return os.path.join(directory, f"{pid}.json")
+
+
+def _write_snapshot(directory: str):
+    """Replace this process's snapshot file atomically."""
+    try:
+        fd, tmp_path = tempfile.mkstemp(prefix='.metrics.', suffix='.tmp', dir=directory)
+    except OSError:
+        return  # Folder removed while the server stops
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp_path, _snapshot_path(directory, os.getpid()))
+    except OSError:
+        pass
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _share_loop(directory: str, stop: threading.Event):
+    """Write a snapshot every SHARE_INTERVAL until stopped."""
+    while True:
+        _write_snapshot(directory)
+        if stop.wait(SHARE_INTERVAL):
+            return
+
+
+def share_to(directory: str):
+    """
+    Share this process's metrics with the other processes using a folder.
+
+    Starts a thread writing a snapshot every SHARE_INTERVAL; scrapes of
+    any of the processes then merge every snapshot in the folder.
+
+    Args:
+        directory: Folder shared by the worker processes
+    """
+    global _share_dir, _share_stop, _share_thread
+    stop_sharing()
+    _share_dir = directory
+    _share_stop = threading.Event()
+    _share_thread = threading.Thread(target=_share_loop, args=(directory, _share_stop),
+                                     name='metrics-share', daemon=True)
+    _share_thread.start()
+
+
+def stop_sharing():
+    """Stop writing snapshots and remove this process's snapshot file."""
+    global _share_dir, _share_stop, _share_thread
+    if _share_stop is not None:
+        _share_stop.set()
+    if _share_thread is not None:
+        _share_thread.join(timeout=1)
+    if _share_dir is not None:
+        remove_snapshot(_share_dir, os.getpid())
+    _share_dir = _share_stop = _share_thread = None
+
+
+def remove_snapshot(directory: str, pid: int):
+    """
+    Drop the snapshot of a process that exited.
+
+    Args:
+        directory: Folder shared by the worker processes
+        pid: Process id of the exited worker
+    """
+    try:
+        os.unlink(_snapshot_path(directory, pid))
+    except OSError:
+        pass
+
+
+def _gather() -> Tuple[List[Dict[str, Any]], Dict[str, dict]]:
+    """
+    Collect the snapshots of every sharing process and merge their series.
+
+    This process contributes its live values; the others their last
+    snapshot. Without sharing, only this process is reported.
+
+    Returns:
+        (snapshots, metric name -> merged series)
+    """
+    snapshots = [snapshot()]
+    directory = _share_dir
+    if directory is not None:
+        own = os.path.basename(_snapshot_path(directory, os.getpid()))
+        try:
+            entries = [entry.path for entry in os.scandir(directory)
+                       if entry.name.endswith('.json') and entry.name != own]
+        except OSError:
+            entries = []
+        for path in entries:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # Removed or being replaced; its next snapshot counts
+
+    merged = {}
+    for metric in ALL_METRICS:
+        series = merged[metric.name] = {}
+        for data in snapshots:
+            metric.merge(series, data.get('series', {}).get(metric.name, []))
+    return snapshots, merged
+
+
+def render_prometheus() -> str:
+    """
+    Render every metric in the Prometheus text exposition format (0.0.4).
+
+    With pre-fork workers, the values are totals over every worker and the
+    start time is the oldest worker's.
+
+    Returns:
+        str: Exposition text ending with a newline
+    """
+    snapshots, merged = _gather()
+    started = min(data['started'] for data in snapshots)
+    lines = [
+        '# HELP course_process_start_time_seconds Start time of the process since the epoch',
+        '# TYPE course_process_start_time_seconds gauge',
+        f'course_process_start_time_seconds {_format_value(round(started, 3))}',
+        '# HELP course_processes Server processes the values are summed over',
+        '# TYPE course_processes gauge',
+        f'course_processes {len(snapshots)}',
+    ]
+    for metric in ALL_METRICS:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.render(merged[metric.name]))
+    return '\n'.join(lines) + '\n'
+
+
+def _summarize(histogram: Histogram, series: Dict[Tuple[str, ...], tuple]) -> List[Dict[str, Any]]:
+    """Count, mean and estimated p50/p95/p99 of every series."""
+    rows = []
+    for labels, (counts, total, count) in sorted(series.items()):
+        row = dict(zip(histogram.labels, labels))
+        row.update({
+            'count': count,
+            'mean': total / count if count else None,
+            'p50': histogram.quantile(0.50, counts),
+            'p95': histogram.quantile(0.95, counts),
+            'p99': histogram.quantile(0.99, counts),
+        })
+        rows.append(row)
+    return rows
+
+
+def get_summary() -> Dict[str, Any]:
+    """
+    Summarize the metrics for display (used by the desktop app).
+
+    Percentiles are bucket upper bounds, so they are estimates. With
+    pre-fork workers, the values are totals over every worker.
+
+    Returns:
+        Dict with 'pid' (the answering process), 'processes' (number of
+        processes summed), 'uptime_seconds', 'requests', 'db_queries',
+        'media_bytes', 'catalog_scans', 'progress_flush_rows' and
+        'progress_flushes'
+    """
+    snapshots, merged = _gather()
+    return {
+        'pid': os.getpid(),
+        'processes': len(snapshots),
+        'uptime_seconds': time.time() - min(data['started'] for data in snapshots),
+        'requests': _summarize(REQUEST_SECONDS, merged[REQUEST_SECONDS.name]),
+        'db_queries': _summarize(DB_QUERY_SECONDS, merged[DB_QUERY_SECONDS.name]),
+        'media_bytes': {labels[0]: value for labels, value in merged[MEDIA_BYTES.name].items()},
+        'catalog_scans': _summarize(CATALOG_SCAN_SECONDS, merged[CATALOG_SCAN_SECONDS.name]),
+        'progress_flush_rows': _summarize(PROGRESS_FLUSH_ROWS, merged[PROGRESS_FLUSH_ROWS.name]),
+        'progress_flushes': _summarize(PROGRESS_FLUSH_SECONDS, merged[PROGRESS_FLUSH_SECONDS.name]),
+    }
+
+
+def _reset_after_fork():
+    """Start a forked child with empty metrics that it does not share yet."""
+    global _started, _share_dir, _share_stop, _share_thread
+    _started = time.time()
+    _share_dir = _share_stop = _share_thread = None
+    for metric in ALL_METRICS:
+        metric._lock = threading.Lock()
+        metric.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,453 @@
+"""
+Schema Migrations Module
+
+Versioned changes to the SQLite schema, applied in order:
+- schema_version records each applied migration (version, name, time)
+- migrate() runs the pending ones inside init_db()'s write transaction, so
+  existing databases are upgraded in place and a failure leaves them
+  unchanged
+- PRAGMA user_version mirrors the latest applied version; init_db() reads
+  it to skip all of this when the database is current
+- Migration 1 is the schema as it was before versioning (CREATE ... IF NOT
+  EXISTS throughout), so databases from any earlier release start from it
+- The schema uses generated columns, so SQLite 3.31 or newer is required;
+  check_sqlite_version() refuses older libraries with a clear message
+
+New schema changes are added as a new function at the end of MIGRATIONS;
+applied migrations are never edited.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Callable, List, Sequence, Tuple
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.migrations')
+
+# Oldest SQLite library that can read the schema (generated columns)
+MIN_SQLITE_VERSION = (3, 31, 0)
+
+
+# Every migration carries its own copy of the SQL it runs, so later changes
+# to the modules that own these tables cannot change what an old migration
+# does to a database that has not been upgraded yet.
+
+
+def _stats_delta_v1(row: str, sign: str) -> str:
+    """Trigger body adding/removing one progress row to its chapter's stats (v1)."""
+    completed = f"(CASE WHEN {row}.completed = 1 THEN 1 ELSE 0 END)"
+    percentage = f"COALESCE({row}.watch_percentage, 0)"
+    watch_time = f"(COALESCE({row}.duration, 0) * COALESCE({row}.watch_percentage, 0) / 100.0)"
+    return f'''INSERT INTO chapter_progress_stats
+                   (chapter, watched_count, completed_count, total_progress, watch_time)
+               VALUES (COALESCE({row}.chapter, ''), {sign}1, {sign}{completed},
+                       {sign}{percentage}, {sign}{watch_time})
+               ON CONFLICT(chapter) DO UPDATE SET
+                   watched_count = watched_count {sign} 1,
+                   completed_count = completed_count {sign} {completed},
+                   total_progress = total_progress {sign} {percentage},
+                   watch_time = watch_time {sign} {watch_time};'''
+
+
+def _progress_triggers_v1(c: sqlite3.Cursor):
+    """Revision and chapter stats triggers on video_progress (v1)."""
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS video_progress_revision_{event.lower()}
+                      AFTER {event} ON video_progress
+                      BEGIN
+                          UPDATE progress_revision SET revision = revision + 1 WHERE id = 1;
+                      END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS video_progress_stats_insert
+                  AFTER INSERT ON video_progress
+                  BEGIN
+                      {_stats_delta_v1('NEW', '+')}
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS video_progress_stats_update
+                  AFTER UPDATE ON video_progress
+                  BEGIN
+                      {_stats_delta_v1('OLD', '-')}
+                      {_stats_delta_v1('NEW', '+')}
+                  END''')
+    c.execute(f'''CREATE TRIGGER IF NOT EXISTS video_progress_stats_delete
+                  AFTER DELETE ON video_progress
+                  BEGIN
+                      {_stats_delta_v1('OLD', '-')}
+                  END''')
+
+
+def _rebuild_stats_v1(c: sqlite3.Cursor):
+    """Recompute chapter_progress_stats from video_progress (v1 columns)."""
+    c.execute('DELETE FROM chapter_progress_stats')
+    c.execute('''INSERT INTO chapter_progress_stats
+                     (chapter, watched_count, completed_count, total_progress, watch_time)
+                 SELECT COALESCE(chapter, ''),
+                        COUNT(*),
+                        SUM(CASE WHEN completed = 1 THEN 1 ELSE 0 END),
+                        SUM(COALESCE(watch_percentage, 0)),
+                        SUM(COALESCE(duration, 0) * COALESCE(watch_percentage, 0) / 100.0)
+                 FROM video_progress
+                 GROUP BY COALESCE(chapter, '')''')
+
+
+def _columns(c: sqlite3.Cursor, table: str) -> List[str]:
+    """Return the column names of a table."""
+    return [row[1] for row in c.execute(f'PRAGMA table_info({table})').fetchall()]
+
+
+def _baseline(conn: sqlite3.Connection):
+    """
+    Tables, triggers and default rows from before versioning.
+
+    Every statement is idempotent, and tables of older releases get the
+    columns added since (catalog video_count, metadata faststart).
+    """
+    c = conn.cursor()
+
+    # Video progress tracking
+    c.execute('''CREATE TABLE IF NOT EXISTS video_progress
+                 (video_path TEXT PRIMARY KEY,
+                  chapter TEXT,
+                  video_name TEXT,
+                  current_time REAL,
+                  duration REAL,
+                  playback_speed REAL DEFAULT 1.0,
+                  watch_percentage REAL DEFAULT 0,
+                  last_watched TIMESTAMP,
+                  completed INTEGER DEFAULT 0)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_video_progress_chapter ON video_progress (chapter)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_video_progress_last_watched ON video_progress (last_watched)')
+
+    # Progress revision counter (ETags)
+    c.execute('''CREATE TABLE IF NOT EXISTS progress_revision
+                 (id INTEGER PRIMARY KEY CHECK (id = 1),
+                  revision INTEGER NOT NULL)''')
+    c.execute('INSERT OR IGNORE INTO progress_revision (id, revision) VALUES (1, 0)')
+
+    # User settings with the defaults of the first release, and their
+    # revision counter
+    c.execute('''CREATE TABLE IF NOT EXISTS user_settings
+                 (setting_key TEXT PRIMARY KEY,
+                  setting_value TEXT)''')
+    c.executemany('INSERT OR IGNORE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+                  [('max_playback_speed', '2.0'),
+                   ('auto_resume', 'true'),
+                   ('save_last_chapter', 'true'),
+                   ('last_chapter', ''),
+                   ('theme', 'dark'),
+                   ('current_playback_speed', '1')])
+    c.execute('''CREATE TABLE IF NOT EXISTS settings_revision
+                 (id INTEGER PRIMARY KEY CHECK (id = 1),
+                  revision INTEGER NOT NULL)''')
+    c.execute('INSERT OR IGNORE INTO settings_revision (id, revision) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS user_settings_revision_{event.lower()}
+                      AFTER {event} ON user_settings
+                      BEGIN
+                          UPDATE settings_revision SET revision = revision + 1 WHERE id = 1;
+                      END''')
+
+    # Content catalog
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_meta
+                 (meta_key TEXT PRIMARY KEY,
+                  meta_value TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_chapters
+                 (chapter TEXT PRIMARY KEY,
+                  mtime REAL,
+                  video_count INTEGER NOT NULL DEFAULT 0)''')
+    if 'video_count' not in _columns(c, 'catalog_chapters'):
+        # Indexed before video_count existed: add it and force a rescan
+        c.execute('ALTER TABLE catalog_chapters ADD COLUMN video_count INTEGER NOT NULL DEFAULT 0')
+        c.execute('UPDATE catalog_chapters SET mtime = NULL')
+    c.execute('''CREATE TABLE IF NOT EXISTS catalog_files
+                 (chapter TEXT,
+                  file_name TEXT,
+                  kind TEXT,
+                  size INTEGER,
+                  mtime REAL,
+                  PRIMARY KEY (chapter, file_name))''')
+
+    # Probed video metadata
+    c.execute('''CREATE TABLE IF NOT EXISTS video_metadata
+                 (chapter TEXT,
+                  file_name TEXT,
+                  size INTEGER,
+                  mtime REAL,
+                  container TEXT,
+                  duration REAL,
+                  width INTEGER,
+                  height INTEGER,
+                  bitrate INTEGER,
+                  faststart INTEGER,
+                  PRIMARY KEY (chapter, file_name))''')
+    if 'faststart' not in _columns(c, 'video_metadata'):
+        # Probed before faststart existed: add it and re-probe MP4s
+        c.execute('ALTER TABLE video_metadata ADD COLUMN faststart INTEGER')
+        c.execute("DELETE FROM video_metadata WHERE container = 'mp4'")
+
+    # Materialized per-chapter analytics, built from existing progress
+    # the first time
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chapter_progress_stats'")
+    stats_existed = c.fetchone() is not None
+    c.execute('''CREATE TABLE IF NOT EXISTS chapter_progress_stats
+                 (chapter TEXT PRIMARY KEY,
+                  watched_count INTEGER NOT NULL DEFAULT 0,
+                  completed_count INTEGER NOT NULL DEFAULT 0,
+                  total_progress REAL NOT NULL DEFAULT 0,
+                  watch_time REAL NOT NULL DEFAULT 0)''')
+    _progress_triggers_v1(c)
+    if not stats_existed:
+        _rebuild_stats_v1(c)
+
+
+def _rebuild_table(conn: sqlite3.Connection, table: str, create_sql: str,
+                   columns: Sequence[str], keys: Sequence[str]):
+    """
+    Recreate a table with a new definition and copy its rows over.
+
+    Indexes and triggers on the old table are dropped with it; the caller
+    creates them again.
+
+    Args:
+        conn: Connection inside the migration transaction
+        table: Table to rebuild
+        create_sql: CREATE TABLE statement with a {name} placeholder
+        columns: Columns copied from the old table
+        keys: Primary key columns; rows with a NULL key are dropped, as
+              WITHOUT ROWID tables do not accept them
+    """
+    new_table = f'{table}_new'
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    not_null = ' AND '.join(f'"{key}" IS NOT NULL' for key in keys)
+    conn.execute(f'DROP TABLE IF EXISTS {new_table}')
+    conn.execute(create_sql.format(name=new_table))
+    conn.execute(f'INSERT INTO {new_table} ({column_list}) '
+                 f'SELECT {column_list} FROM {table} WHERE {not_null}')
+    conn.execute(f'DROP TABLE {table}')
+    conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+
+
+def _without_rowid(conn: sqlite3.Connection):
+    """
+    Store the tables keyed by path or (chapter, file name) WITHOUT ROWID,
+    and derive video_progress.completed from watch_percentage.
+
+    Their rows are small and always looked up by the primary key, so a
+    clustered key saves the separate primary key index and one B-tree
+    search per lookup. completed becomes a generated column, so it can no
+    longer disagree with watch_percentage.
+    """
+    _rebuild_table(conn, 'video_progress', '''CREATE TABLE {name}
+                 (video_path TEXT PRIMARY KEY NOT NULL,
+                  chapter TEXT,
+                  video_name TEXT,
+                  "current_time" REAL,
+                  duration REAL,
+                  playback_speed REAL DEFAULT 1.0,
+                  watch_percentage REAL DEFAULT 0,
+                  last_watched TIMESTAMP,
+                  completed INTEGER GENERATED ALWAYS AS
+                      (CASE WHEN watch_percentage >= 90 THEN 1 ELSE 0 END) VIRTUAL)
+                 WITHOUT ROWID''',
+                   ('video_path', 'chapter', 'video_name', 'current_time', 'duration',
+                    'playback_speed', 'watch_percentage', 'last_watched'),
+                   ('video_path',))
+
+    # The triggers went with the old table; the stats are rebuilt in case
+    # stored completion flags disagreed with the percentages
+    c = conn.cursor()
+    _progress_triggers_v1(c)
+    _rebuild_stats_v1(c)
+
+    _rebuild_table(conn, 'catalog_files', '''CREATE TABLE {name}
+                 (chapter TEXT,
+                  file_name TEXT,
+                  kind TEXT,
+                  size INTEGER,
+                  mtime REAL,
+                  PRIMARY KEY (chapter, file_name))
+                 WITHOUT ROWID''',
+                   ('chapter', 'file_name', 'kind', 'size', 'mtime'),
+                   ('chapter', 'file_name'))
+
+    _rebuild_table(conn, 'video_metadata', '''CREATE TABLE {name}
+                 (chapter TEXT,
+                  file_name TEXT,
+                  size INTEGER,
+                  mtime REAL,
+                  container TEXT,
+                  duration REAL,
+                  width INTEGER,
+                  height INTEGER,
+                  bitrate INTEGER,
+                  faststart INTEGER,
+                  PRIMARY KEY (chapter, file_name))
+                 WITHOUT ROWID''',
+                   ('chapter', 'file_name', 'size', 'mtime', 'container', 'duration',
+                    'width', 'height', 'bitrate', 'faststart'),
+                   ('chapter', 'file_name'))
+
+
+def _progress_indexes(conn: sqlite3.Connection):
+    """
+    Covering indexes for per-chapter and recent-activity progress queries.
+
+    idx_video_progress_chapter holds every column query_progress() and the
+    analytics join read, so per-chapter reads never touch the table.
+    idx_video_progress_last_watched serves the 'since' filter.
+    """
+    conn.execute('DROP INDEX IF EXISTS idx_video_progress_chapter')
+    conn.execute('DROP INDEX IF EXISTS idx_video_progress_last_watched')
+    conn.execute('''CREATE INDEX idx_video_progress_chapter ON video_progress
+                    (chapter, video_name, completed, watch_percentage, duration,
+                     "current_time", playback_speed, last_watched)''')
+    conn.execute('CREATE INDEX idx_video_progress_last_watched ON video_progress (last_watched)')
+
+
+def _playback_defaults(conn: sqlite3.Connection):
+    """Default rows for the settings added after the baseline (autoplay, HLS)."""
+    conn.executemany('INSERT OR IGNORE INTO user_settings (setting_key, setting_value) VALUES (?, ?)',
+                     [('autoplay_next', 'true'),
+                      ('hls_playback', 'true')])
+
+
+def _chapter_durations(conn: sqlite3.Connection):
+    """
+    Per-chapter course length and time remaining, kept for analytics.
+
+    Triggers on the tables the totals are computed from only mark the
+    chapter stale; analytics recomputes stale chapters when it reads them.
+    Every indexed chapter starts stale.
+    """
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS chapter_durations
+                 (chapter TEXT PRIMARY KEY NOT NULL,
+                  videos_with_duration INTEGER NOT NULL DEFAULT 0,
+                  total_duration REAL NOT NULL DEFAULT 0,
+                  remaining_duration REAL NOT NULL DEFAULT 0,
+                  stale INTEGER NOT NULL DEFAULT 1)
+                 WITHOUT ROWID''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_chapter_durations_stale
+                 ON chapter_durations (chapter) WHERE stale = 1''')
+
+    def mark(row: str) -> str:
+        return f'''INSERT INTO chapter_durations (chapter, stale)
+                   VALUES (COALESCE({row}.chapter, ''), 1)
+                   ON CONFLICT(chapter) DO UPDATE SET stale = 1 WHERE stale = 0;'''
+
+    sources = {
+        'catalog_files': 'UPDATE',
+        'video_metadata': 'UPDATE',
+        # Playback position alone does not change any total
+        'video_progress': 'UPDATE OF chapter, video_name, duration, watch_percentage',
+    }
+    for table, update in sources.items():
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_durations_insert
+                      AFTER INSERT ON {table}
+                      BEGIN
+                          {mark('NEW')}
+                      END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_durations_update
+                      AFTER {update} ON {table}
+                      BEGIN
+                          {mark('OLD')}
+                          {mark('NEW')}
+                      END''')
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_durations_delete
+                      AFTER DELETE ON {table}
+                      BEGIN
+                          {mark('OLD')}
+                      END''')
+    c.execute('INSERT OR IGNORE INTO chapter_durations (chapter) SELECT chapter FROM catalog_chapters')
+
+
+def _probe_errors(conn: sqlite3.Connection):
+    """Failed probes are stored with the error, so they are not retried on every pass."""
+    conn.execute('ALTER TABLE video_metadata ADD COLUMN probe_error TEXT')
+
+
+# (version, name, function), in the order they are applied
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'baseline schema', _baseline),
+    (2, 'WITHOUT ROWID tables, generated completed column', _without_rowid),
+    (3, 'covering indexes for progress queries', _progress_indexes),
+    (4, 'playback settings defaults', _playback_defaults),
+    (5, 'per-chapter duration totals', _chapter_durations),
+    (6, 'probe failure markers', _probe_errors),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def check_sqlite_version():
+    """
+    Fail early if the SQLite library cannot read the schema.
+
+    Raises:
+        RuntimeError: If sqlite3 is linked against a library older than
+                      MIN_SQLITE_VERSION
+    """
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        required = '.'.join(str(part) for part in MIN_SQLITE_VERSION)
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old: the course database "
+                           f"needs SQLite {required} or newer (generated columns). "
+                           f"Use a Python build with a newer sqlite3 library.")
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """
+    Return the latest migration applied to a database.
+
+    Args:
+        conn: Open connection
+
+    Returns:
+        int: Version, 0 for databases from before versioning
+    """
+    exists = conn.execute("SELECT 1 FROM sqlite_master "
+                          "WHERE type = 'table' AND name = 'schema_version'").fetchone()
+    if not exists:
+        return 0
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> List[int]:
+    """
+    Apply every pending migration and update PRAGMA user_version.
+
+    Args:
+        conn: Connection inside a write transaction
+
+    Returns:
+        List[int]: Versions applied, in order
+
+    Raises:
+        RuntimeError: If the SQLite library is too old (see check_sqlite_version)
+    """
+    check_sqlite_version()
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     name TEXT NOT NULL,
+                     applied_at TIMESTAMP NOT NULL)''')
+    version = current_version(conn)
+    if version > LATEST_VERSION:
+        logger.warning("[MIGRATE] Database is at version %d, newer than this release (%d); "
+                       "leaving it unchanged", version, LATEST_VERSION)
+        return []
+
+    applied = []
+    for number, name, func in MIGRATIONS:
+        if number <= version:
+            continue
+        start = time.perf_counter()
+        func(conn)
+        conn.execute("INSERT INTO schema_version (version, name, applied_at) "
+                     "VALUES (?, ?, datetime('now', 'localtime'))", (number, name))
+        applied.append(number)
+        logger.info("[MIGRATE] Applied %d: %s (%.2fs)", number, name, time.perf_counter() - start)
+    conn.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+    return applied
@@ -0,0 +1,246 @@
+"""
+Pre-fork Server Module
+
+Runs the app in several worker processes that share one listening socket
+(POSIX only):
+- The parent binds the socket, forks the workers and restarts any that die
+- Each worker runs the configured single-process backend on the shared socket
+- Workers share the catalog index and progress database through SQLite WAL;
+  the content watcher runs in the parent only
+- Progress is written through on every save instead of being buffered, so
+  every worker sees it at once and hands out the same progress ETags
+- Worker log output is sent back to the parent's log callback
+- Workers share metric snapshots through a temporary folder, so
+  /api/metrics reports all of them whichever worker answers
+- SIGTERM makes a worker finish its requests and flush buffered progress
+  and settings
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+
+# Seconds a worker gets to finish after SIGTERM before it is killed
+WORKER_STOP_TIMEOUT = 10.0
+
+# Minimum seconds between two restarts of the same worker slot
+RESTART_DELAY = 1.0
+
+
+def is_supported() -> bool:
+    """Pre-fork mode needs fork(), so it is unavailable on Windows."""
+    return hasattr(os, 'fork') and 'fork' in multiprocessing.get_all_start_methods()
+
+
+class _QueueLogHandler(logging.Handler):
+    """Forwards worker log records to the parent as formatted strings."""
+
+    def __init__(self, log_queue):
+        super().__init__()
+        self.log_queue = log_queue
+
+    def emit(self, record):
+        try:
+            self.log_queue.put_nowait(self.format(record))
+        except Exception:
+            pass
+
+
+def _worker_main(index: int, sock: socket.socket, app, host: str, port: int,
+                 settings: Dict[str, Any], log_queue, metrics_dir: str):
+    """
+    Worker process entry point.
+
+    Args:
+        index: Worker slot number (for log messages)
+        sock: Listening socket inherited from the parent
+        app: WSGI application (inherited through fork)
+        host: Bound host, for the server's environ
+        port: Bound port, for the server's environ
+        settings: Server settings for the per-worker backend
+        log_queue: Queue carrying log lines to the parent
+        metrics_dir: Folder the workers share metric snapshots through
+    """
+    import database
+    import metrics
+    from hls import get_segmenter
+    from metadata import get_prober
+    from progress import get_buffer
+    from remux import get_queue
+    from settings_store import get_store
+    from thumbnails import get_generator
+    from wsgi_servers import create_server
+
+    def log(message: str):
+        try:
+            log_queue.put_nowait(f"[WORKER {index}] {message}")
+        except Exception:
+            pass
+
+    # Send app/werkzeug logs to the parent instead of its GUI callbacks
+    handler = _QueueLogHandler(log_queue)
+    handler.setFormatter(logging.Formatter(f'[%(asctime)s] [WORKER {index}] %(message)s',
+                                           datefmt='%H:%M:%S'))
+    for logger_name in ['werkzeug', 'flask.app', 'app']:
+        logger = logging.getLogger(logger_name)
+        logger.handlers = [handler]
+    logging.getLogger('app').setLevel(settings.get('log_level', 'INFO'))
+
+    # A worker's write-behind buffer would be invisible to the others
+    get_buffer().write_through = True
+    metrics.share_to(metrics_dir)
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = create_server(app, host, port, dict(settings, workers=1), sock=sock)
+
+    def on_sigterm(signum, frame):
+        # shutdown() blocks until serve_forever() returns, so it cannot run
+        # on the thread that is inside serve_forever()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+    log(f"Started (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        get_prober().stop()
+        get_generator().stop()
+        get_queue().stop()
+        get_segmenter().stop()
+        get_buffer().stop()
+        get_store().flush()
+        database.close_all()
+        metrics.stop_sharing()
+        log("Stopped")
+
+
+class PreforkServer:
+    """Supervises worker processes; same interface as the other backends."""
+
+    def __init__(self, host: str, port: int, app, settings: Dict[str, Any],
+                 log_callback: Optional[Callable[[str], None]] = None):
+        """
+        Bind the shared listening socket.
+
+        Args:
+            host: Host address to bind to
+            port: Port number
+            app: WSGI application
+            settings: Server settings; "workers" is the process count
+            log_callback: Optional callback for log messages
+        """
+        self.host = host
+        self.app = app
+        self.settings = settings
+        self.workers = settings.get('workers', 2)
+        self.log_callback = log_callback
+        self._context = multiprocessing.get_context('fork')
+        self._log_queue = self._context.Queue()
+        self._processes: List[Optional[multiprocessing.Process]] = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._stopping = threading.Event()
+        self._stopped = threading.Event()
+        self.metrics_dir = tempfile.mkdtemp(prefix='course-metrics-')
+
+        self.socket = socket.create_server((host, port), backlog=settings.get('backlog', 128))
+        # Non-blocking, so an idle worker that loses the accept() race
+        # goes back to waiting instead of blocking in accept()
+        self.socket.setblocking(False)
+        self.port = self.socket.getsockname()[1]
+
+    def _log(self, message: str):
+        """Send log message to callback."""
+        if self.log_callback:
+            self.log_callback(message)
+        print(message)
+
+    def _spawn(self, index: int):
+        """Fork the worker for a slot."""
+        process = self._context.Process(
+            target=_worker_main, name=f'course-worker-{index}',
+            args=(index, self.socket, self.app, self.host, self.port, self.settings,
+                  self._log_queue, self.metrics_dir),
+            daemon=True)
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def serve_forever(self):
+        """Start the workers, relay their logs and restart any that exit."""
+        self._stopped.clear()
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            self._log(f"[SERVER] Pre-fork mode: {self.workers} worker processes")
+
+            while not self._stopping.is_set():
+                self._drain_logs(timeout=0.5)
+                for index, process in enumerate(self._processes):
+                    if self._stopping.is_set():
+                        break
+                    if process is not None and not process.is_alive():
+                        if time.monotonic() - self._started_at[index] < RESTART_DELAY:
+                            continue
+                        self._log(f"[SERVER] Worker {index} exited with code "
+                                  f"{process.exitcode}, restarting")
+                        process.join(0)
+                        # Its counters end with it; the restarted worker starts at zero
+                        metrics.remove_snapshot(self.metrics_dir, process.pid)
+                        self._spawn(index)
+        finally:
+            self._drain_logs(timeout=0)
+            self._stopped.set()
+
+    def _drain_logs(self, timeout: float):
+        """Forward pending worker log lines to the callback."""
+        try:
+            message = self._log_queue.get(timeout=timeout) if timeout else \
+                self._log_queue.get_nowait()
+        except (queue.Empty, OSError, ValueError):
+            return
+        while True:
+            self._log(message)
+            try:
+                message = self._log_queue.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                return
+
+    def shutdown(self):
+        """Stop the supervisor loop and terminate every worker gracefully."""
+        self._stopping.set()
+        self._stopped.wait(timeout=5)
+
+        processes = [p for p in self._processes if p is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                self._log(f"[SERVER] Worker {process.name} did not stop, killing it")
+                process.kill()
+                process.join(1)
+        self._drain_logs(timeout=0)
+        self._processes = [None] * self.workers
+
+    def server_close(self):
+        """Close the listening socket and the log queue, and drop the metric snapshots."""
+        self.socket.close()
+        self._log_queue.close()
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
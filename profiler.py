@@ -0,0 +1,458 @@
+"""
+Profiling Module
+
+Opt-in request profiling for a running server:
+- WSGI middleware around the Flask app that profiles a configurable
+  fraction of requests; the settings live in config.json (see config.py),
+  so the desktop app or /api/profiling switch it on without a restart and
+  every worker process follows within a second
+- cprofile mode: one cProfile session at a time, saved as .pstats
+- sampler mode: a background thread samples the stacks of the profiled
+  requests' threads and saves them as collapsed stacks (.folded, the input
+  format of flamegraph.pl and speedscope)
+- Files go to <config dir>/profiles; only the newest MAX_PROFILE_FILES are kept
+- Hot functions aggregated over the recent files of all processes, for
+  the diagnostics page
+
+Only the application call is profiled: a streamed response body (send_file)
+is sent afterwards and not included.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from singleton import ProcessSingleton
+
+# Import configuration module
+try:
+    from config import get_config_dir, get_profiling_settings
+except ImportError:
+    # Fallback if config not available (standalone mode): profiling stays off
+    def get_config_dir():
+        return Path('.')
+    def get_profiling_settings():
+        return {'enabled': False, 'sample_rate': 0.0, 'mode': 'cprofile'}
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.profiler')
+
+# Profile files kept on disk, oldest removed first
+MAX_PROFILE_FILES = 500
+
+# Newest profile files aggregated into the hot function table
+RECENT_PROFILES = 200
+
+# Seconds between two stack samples in sampler mode
+SAMPLE_INTERVAL = 0.005
+
+# Paths never profiled (the profiling UI itself)
+EXCLUDED_PREFIXES = ('/api/profiling', '/diagnostics')
+
+# Profile file extensions
+PSTATS_SUFFIX = '.pstats'
+FOLDED_SUFFIX = '.folded'
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_ADDRESS = re.compile(r' at 0x[0-9a-fA-F]+')
+
+
+def get_profile_dir() -> Path:
+    """
+    Get the folder profile files are written to.
+
+    Returns:
+        Path: Existing <config dir>/profiles directory
+    """
+    path = Path(get_config_dir()) / 'profiles'
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def function_label(filename: str, line: int, name: str) -> str:
+    """
+    Build a short, stable label for a function.
+
+    cProfile entries and sampled frames use the same label, so both kinds
+    of profile aggregate into one table.
+
+    Args:
+        filename: Code object's file ('~' for cProfile built-ins)
+        line: First line of the function
+        name: Function name
+
+    Returns:
+        str: 'name (file:line)', with the file relative to the app folder
+        or reduced to its last two components
+    """
+    if filename == '~':
+        # Built-ins may embed an object address, which differs per process
+        return _ADDRESS.sub('', name)
+    if filename.startswith(_APP_DIR + os.sep):
+        short = filename[len(_APP_DIR) + 1:]
+    else:
+        short = os.sep.join(filename.split(os.sep)[-2:])
+    return f"{name} ({short}:{line})"
+
+
+def collapse_stack(frame) -> str:
+    """
+    Render a frame and its callers as one collapsed stack, root first.
+
+    Args:
+        frame: Innermost frame
+
+    Returns:
+        str: Labels joined by ';'
+    """
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(function_label(code.co_filename, code.co_firstlineno, code.co_name))
+        frame = frame.f_back
+    labels.reverse()
+    # ';' separates frames and ' ' the count in the collapsed format
+    return ';'.join(label.replace(';', ':') for label in labels)
+
+
+class StackSampler:
+    """Background thread sampling the stacks of registered threads."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        """
+        Initialize an idle sampler.
+
+        Args:
+            interval: Seconds between two samples
+        """
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Counter] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def begin(self, thread_id: int):
+        """Start collecting samples of a thread."""
+        with self._lock:
+            self._active[thread_id] = Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profile-sampler',
+                                                daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def end(self, thread_id: int) -> Counter:
+        """
+        Stop collecting samples of a thread.
+
+        Returns:
+            Counter: Collapsed stack -> sample count
+        """
+        with self._lock:
+            return self._active.pop(thread_id, Counter())
+
+    def _run(self):
+        """Sample while threads are registered; sleep otherwise."""
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, counts in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None and thread_id != own_id:
+                        counts[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+class Profiler:
+    """Decides which requests to profile, runs them and writes the results."""
+
+    def __init__(self, settings: Callable[[], Dict[str, Any]] = get_profiling_settings):
+        """
+        Initialize the profiler.
+
+        Args:
+            settings: Returns the current settings (enabled, sample_rate, mode)
+        """
+        self._settings = settings
+        self._cprofile_lock = threading.Lock()
+        self._sampler = StackSampler()
+        self._lock = threading.Lock()
+        self._written = 0
+        self._seq = 0
+        self._hot_key: Optional[Tuple[str, ...]] = None
+        self._hot_rows: List[Dict[str, Any]] = []
+
+    def should_profile(self, path: str) -> Optional[str]:
+        """
+        Decide whether to profile a request.
+
+        Args:
+            path: Request path
+
+        Returns:
+            Optional[str]: Profiling mode, or None to run it normally
+        """
+        settings = self._settings()
+        if not settings['enabled'] or path.startswith(EXCLUDED_PREFIXES):
+            return None
+        if random.random() >= settings['sample_rate']:
+            return None
+        return settings['mode']
+
+    def run(self, mode: str, label: str, func: Callable[[], Any]) -> Any:
+        """
+        Run a function under the profiler and save the result.
+
+        Args:
+            mode: 'cprofile' or 'sampler'
+            label: Request description used in the file name
+            func: The request handler call
+
+        Returns:
+            The function's return value
+        """
+        if mode == 'sampler':
+            thread_id = threading.get_ident()
+            self._sampler.begin(thread_id)
+            try:
+                return func()
+            finally:
+                self._save_folded(label, self._sampler.end(thread_id))
+
+        # cProfile can only run one session at a time; other requests
+        # arriving meanwhile are not sampled
+        if not self._cprofile_lock.acquire(blocking=False):
+            return func()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                return func()
+            finally:
+                profile.disable()
+        finally:
+            self._cprofile_lock.release()
+            self._save_pstats(label, profile)
+
+    def _file_path(self, label: str, suffix: str) -> Path:
+        """Return a new, unique profile file path."""
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:60] or 'root'
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return get_profile_dir() / f"{stamp}-{os.getpid()}-{seq:05d}-{slug}{suffix}"
+
+    def _save_pstats(self, label: str, profile: cProfile.Profile):
+        """Write a cProfile session as .pstats."""
+        try:
+            profile.dump_stats(str(self._file_path(label, PSTATS_SUFFIX)))
+        except OSError as e:
+            logger.warning("[PROFILE] Could not save profile: %s", e)
+            return
+        self._after_write()
+
+    def _save_folded(self, label: str, stacks: Counter):
+        """Write sampled stacks in the collapsed format."""
+        if not stacks:
+            return
+        lines = [f"{stack} {count}\n" for stack, count in stacks.most_common()]
+        try:
+            with open(self._file_path(label, FOLDED_SUFFIX), 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+        except OSError as e:
+            logger.warning("[PROFILE] Could not save profile: %s", e)
+            return
+        self._after_write()
+
+    def _after_write(self):
+        """Prune old files every few writes."""
+        with self._lock:
+            self._written += 1
+            due = self._written % 20 == 1
+        if due:
+            self.prune()
+
+    def list_files(self) -> List[Path]:
+        """
+        List profile files, newest first.
+
+        Returns:
+            List[Path]: .pstats and .folded files of every process
+        """
+        try:
+            entries = [entry for entry in os.scandir(get_profile_dir())
+                       if entry.name.endswith((PSTATS_SUFFIX, FOLDED_SUFFIX))]
+        except OSError:
+            return []
+        entries.sort(key=lambda entry: entry.name, reverse=True)
+        return [Path(entry.path) for entry in entries]
+
+    def prune(self, keep: int = MAX_PROFILE_FILES) -> int:
+        """
+        Remove all but the newest profile files.
+
+        Args:
+            keep: Files to keep (0 removes all)
+
+        Returns:
+            int: Files removed
+        """
+        removed = 0
+        for path in self.list_files()[keep:]:
+            try:
+                path.unlink()
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def hot_functions(self, limit: int = 30) -> List[Dict[str, Any]]:
+        """
+        Aggregate the recent profiles into a table of hot functions.
+
+        cProfile files contribute call counts and exact times; sampled
+        stacks contribute SAMPLE_INTERVAL per sample. The result is cached
+        until the set of recent files changes.
+
+        Args:
+            limit: Rows to return
+
+        Returns:
+            List of dicts with function, calls, self_seconds and
+            total_seconds, sorted by self_seconds
+        """
+        files = self.list_files()[:RECENT_PROFILES]
+        key = tuple(path.name for path in files)
+        with self._lock:
+            if key == self._hot_key:
+                return self._hot_rows[:limit]
+
+        rows: Dict[str, Dict[str, Any]] = {}
+
+        def row(label: str) -> Dict[str, Any]:
+            if label not in rows:
+                rows[label] = {'function': label, 'calls': 0,
+                               'self_seconds': 0.0, 'total_seconds': 0.0}
+            return rows[label]
+
+        pstats_files = [str(path) for path in files if path.suffix == PSTATS_SUFFIX]
+        for path in pstats_files:
+            try:
+                stats = pstats.Stats(path).stats
+            except Exception as e:
+                logger.warning("[PROFILE] Skipping unreadable profile %s: %s", path, e)
+                continue
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.items():
+                entry = row(function_label(filename, line, name))
+                entry['calls'] += calls
+                entry['self_seconds'] += tottime
+                entry['total_seconds'] += cumtime
+
+        for path in files:
+            if path.suffix == FOLDED_SUFFIX:
+                self._add_folded(path, row)
+
+        ranked = sorted(rows.values(), key=lambda r: r['self_seconds'], reverse=True)
+        with self._lock:
+            self._hot_key = key
+            self._hot_rows = ranked
+        return ranked[:limit]
+
+    @staticmethod
+    def _add_folded(path: Path, row: Callable[[str], Dict[str, Any]]):
+        """Add one collapsed stack file to the hot function rows."""
+        try:
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if not stack or not count.isdigit():
+                continue
+            seconds = int(count) * SAMPLE_INTERVAL
+            frames = stack.split(';')
+            row(frames[-1])['self_seconds'] += seconds
+            for label in set(frames):
+                row(label)['total_seconds'] += seconds
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Describe the settings and the saved profiles.
+
+        Returns:
+            Dict with 'settings', 'directory', 'files' (count) and 'recent'
+            (newest file names)
+        """
+        files = self.list_files()
+        return {
+            'settings': self._settings(),
+            'directory': str(get_profile_dir()),
+            'files': len(files),
+            'recent': [path.name for path in files[:20]],
+        }
+
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling a sample of requests."""
+
+    def __init__(self, wsgi_app: Callable, profiler: Optional[Profiler] = None):
+        """
+        Wrap a WSGI application.
+
+        Args:
+            wsgi_app: Application to wrap (Flask's app.wsgi_app)
+            profiler: Profiler to use (default: the global one)
+        """
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        """Run the request, under the profiler when it is sampled."""
+        profiler = self.profiler or get_profiler()
+        path = environ.get('PATH_INFO', '')
+        mode = profiler.should_profile(path)
+        if mode is None:
+            return self.wsgi_app(environ, start_response)
+        label = f"{environ.get('REQUEST_METHOD', 'GET')} {path}"
+        return profiler.run(mode, label, lambda: self.wsgi_app(environ, start_response))
+
+
+# Global profiler instance for module-level access
+_profiler = ProcessSingleton(Profiler)
+
+
+def get_profiler() -> Profiler:
+    """
+    Get or create the global profiler.
+
+    Returns:
+        Profiler: Profiler instance
+    """
+    return _profiler.get()
+
@@ -0,0 +1,367 @@
+"""
+Progress Write-Behind Module
+
+Buffers video progress heartbeats in memory and writes them in batches:
+- Repeated updates for the same video_path are coalesced
+- Flushed in one transaction on a timer or once the buffer is large
+- Flushed immediately on pause/ended/unload events and at shutdown
+- Readers overlay buffered values so they always see the latest state
+- A revision counter (database + buffer) for cheap change detection
+- Pre-fork workers write through, since other worker processes cannot
+  see this process's buffer
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import database
+import metrics
+from singleton import ProcessSingleton
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.progress')
+
+# Seconds between two background flushes
+FLUSH_INTERVAL = 5.0
+
+# Flush early once this many distinct videos are pending
+MAX_PENDING = 100
+
+# Player events that must reach the database right away
+FLUSH_EVENTS = ('pause', 'ended', 'unload')
+
+# Format of last_watched; compares correctly as text
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Column order used for every progress write
+PROGRESS_COLUMNS = ('video_path', 'chapter', 'video_name', 'current_time', 'duration',
+                    'playback_speed', 'watch_percentage', 'last_watched')
+
+# Watch percentage at which a video counts as completed; the database
+# derives video_progress.completed from it (see migrations.py)
+COMPLETION_PERCENTAGE = 90
+
+# A true UPSERT (not INSERT OR REPLACE) so the analytics triggers see an
+# UPDATE of the existing row instead of a silent delete + insert
+UPSERT_SQL = '''INSERT INTO video_progress
+                (video_path, chapter, video_name, "current_time", duration, playback_speed,
+                 watch_percentage, last_watched)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(video_path) DO UPDATE SET
+                    chapter = excluded.chapter,
+                    video_name = excluded.video_name,
+                    "current_time" = excluded."current_time",
+                    duration = excluded.duration,
+                    playback_speed = excluded.playback_speed,
+                    watch_percentage = excluded.watch_percentage,
+                    last_watched = excluded.last_watched'''
+
+# Replayed updates (queued while offline) carry the time they were recorded
+# and must not overwrite progress saved after them
+REPLAY_UPSERT_SQL = UPSERT_SQL + '''
+                WHERE video_progress.last_watched IS NULL
+                   OR excluded.last_watched >= video_progress.last_watched'''
+
+
+# Identifies this process in revision tags that cover buffered rows, so a
+# restart (or another worker process) never reuses such a tag
+_BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def get_revision_tag() -> str:
+    """
+    Return a tag that changes whenever progress visible to this process changes.
+
+    While nothing is buffered this is the database revision alone, so every
+    process sharing the database (pre-fork workers, restarts) hands out the
+    same tag for the same data. Buffered rows add this process's boot id and
+    buffer revision.
+
+    Returns:
+        str: Opaque revision tag
+    """
+    buffer = get_buffer()
+    pending, buffer_revision = buffer.state()
+    c = database.get_connection().cursor()
+    c.execute('SELECT revision FROM progress_revision WHERE id = 1')
+    row = c.fetchone()
+    revision = row[0] if row else 0
+    if not pending:
+        return str(revision)
+    return f"{revision}.{_BOOT_ID}.{buffer_revision}"
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """
+    Read a client timestamp as naive local time, like last_watched.
+
+    Args:
+        value: Unix time in seconds, or an ISO 8601 string
+
+    Returns:
+        Optional[datetime]: Local time, or None if missing or unreadable
+    """
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value)
+        if isinstance(value, str):
+            parsed = datetime.fromisoformat(value)
+            if parsed.tzinfo is not None:
+                parsed = parsed.astimezone().replace(tzinfo=None)
+            return parsed
+    except (ValueError, OverflowError, OSError):
+        pass
+    return None
+
+
+def validate_payload(data: Any) -> Optional[str]:
+    """
+    Check a progress payload before it is turned into a row.
+
+    Args:
+        data: Decoded JSON item
+
+    Returns:
+        Optional[str]: Error message, or None if the payload is usable
+    """
+    if not isinstance(data, dict):
+        return 'Record must be a JSON object'
+    video_path = data.get('video_path')
+    if not isinstance(video_path, str) or not video_path:
+        return 'Missing video_path'
+    for field in ('current_time', 'duration', 'playback_speed'):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+            return f'Invalid {field}'
+    if data.get('recorded_at') is not None and parse_timestamp(data['recorded_at']) is None:
+        return 'Invalid recorded_at'
+    return None
+
+
+def build_record(data: Dict[str, Any], recorded_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Turn a save-progress payload into a full progress row.
+
+    Args:
+        data: JSON payload posted by the player
+        recorded_at: When the client recorded a replayed update (stored as
+                     last_watched, capped at now); None for live updates
+
+    Returns:
+        Dict with one key per column in PROGRESS_COLUMNS, plus 'completed'
+        (derived by the database when stored)
+    """
+    current_time = data.get('current_time', 0)
+    duration = data.get('duration', 0)
+
+    # Calculate watch percentage and completion status
+    watch_percentage = (current_time / duration * 100) if duration > 0 else 0
+    completed = 1 if watch_percentage >= COMPLETION_PERCENTAGE else 0
+
+    # A client clock ahead of ours must not block every later update
+    now = datetime.now()
+    last_watched = min(recorded_at, now) if recorded_at else now
+
+    return {
+        'video_path': data.get('video_path'),
+        'chapter': data.get('chapter'),
+        'video_name': data.get('video_name'),
+        'current_time': current_time,
+        'duration': duration,
+        'playback_speed': data.get('playback_speed', 1.0),
+        'watch_percentage': watch_percentage,
+        'last_watched': last_watched.strftime(TIMESTAMP_FORMAT),
+        'completed': completed,
+    }
+
+
+class ProgressBuffer:
+    """In-memory write-behind buffer for video_progress rows."""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, max_pending: int = MAX_PENDING):
+        """
+        Initialize the buffer.
+
+        Args:
+            flush_interval: Seconds between background flushes
+            max_pending: Number of pending videos that triggers an early flush
+        """
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        # Write every row right away (set in pre-fork workers)
+        self.write_through = False
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.revision = 0
+
+    def put(self, record: Dict[str, Any]):
+        """
+        Queue a progress row, replacing any pending row for the same video.
+
+        With write_through set the row is written before returning; if that
+        fails it stays buffered for the background flusher.
+
+        Args:
+            record: Row built by build_record()
+        """
+        with self._lock:
+            self._pending[record['video_path']] = record
+            self.revision += 1
+            pending = len(self._pending)
+        self._ensure_thread()
+        if self.write_through:
+            self.flush()
+        elif pending >= self.max_pending:
+            self._wake.set()
+
+    def state(self) -> Tuple[bool, int]:
+        """Return whether rows are pending, and the buffer revision."""
+        with self._lock:
+            return bool(self._pending), self.revision
+
+    def put_many(self, records: List[Dict[str, Any]]) -> int:
+        """
+        Write replayed rows together with everything pending in one transaction.
+
+        Pending rows are written first; a replayed row then only replaces
+        stored progress whose last_watched is not newer than its own, so
+        the most recent update of each video wins.
+
+        Args:
+            records: Rows built by build_record() with the client's recorded_at
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            sqlite3.Error: If the transaction failed (pending rows stay
+                           buffered; replayed rows are left to the caller)
+        """
+        return self.flush(raise_errors=True, replays=records)
+
+    def get(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """Return the pending row for a video, if any."""
+        with self._lock:
+            record = self._pending.get(video_path)
+            return dict(record) if record else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a copy of all pending rows keyed by video_path."""
+        with self._lock:
+            return {path: dict(record) for path, record in self._pending.items()}
+
+    def flush(self, raise_errors: bool = False, replays: List[Dict[str, Any]] = ()) -> int:
+        """
+        Write all pending rows in a single transaction.
+
+        Rows that fail to write are put back unless a newer update for the
+        same video arrived in the meantime.
+
+        Args:
+            raise_errors: Re-raise a failed write instead of logging it
+            replays: Replayed rows written after the pending ones with
+                     REPLAY_UPSERT_SQL (see put_many())
+
+        Returns:
+            int: Number of rows written
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not replays:
+                    return 0
+                batch, self._pending = self._pending, {}
+
+            rows = [tuple(record[col] for col in PROGRESS_COLUMNS) for record in batch.values()]
+            replay_rows = [tuple(record[col] for col in PROGRESS_COLUMNS) for record in replays]
+            start = time.perf_counter()
+            try:
+                with database.transaction() as conn:
+                    written = conn.executemany(UPSERT_SQL, rows).rowcount if rows else 0
+                    if replay_rows:
+                        written += conn.executemany(REPLAY_UPSERT_SQL, replay_rows).rowcount
+            except Exception as e:
+                with self._lock:
+                    for path, record in batch.items():
+                        self._pending.setdefault(path, record)
+                logger.error("[PROGRESS BUFFER] Flush failed, %d row(s) kept: %s", len(batch), e)
+                if raise_errors:
+                    raise
+                return 0
+            metrics.PROGRESS_FLUSH_SECONDS.observe(time.perf_counter() - start)
+            metrics.PROGRESS_FLUSH_ROWS.observe(written)
+            logger.debug("[PROGRESS BUFFER] Flushed %d row(s)", written)
+            return written
+
+    def _ensure_thread(self):
+        """Start the background flusher on first use."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='progress-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Background loop: flush every interval or when woken early."""
+        try:
+            while not self._stopping:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self.flush()
+        finally:
+            database.release_connection()
+
+    def stop(self):
+        """Flush remaining rows and stop the background flusher."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        database.release_connection()
+
+
+# Global buffer instance for module-level access
+_buffer = ProcessSingleton(ProgressBuffer,
+                           on_create=lambda instance: atexit.register(instance.flush))
+
+
+def get_buffer() -> ProgressBuffer:
+    """
+    Get or create the global progress buffer.
+
+    Returns:
+        ProgressBuffer: Buffer instance
+    """
+    return _buffer.get()
+
+
+def _reset_after_fork():
+    """
+    Give a forked child its own revision tags.
+
+    Its buffer starts empty (see ProcessSingleton); rows pending at fork
+    time belong to the parent, which flushes them.
+    """
+    global _BOOT_ID
+    _BOOT_ID = uuid.uuid4().hex[:12]
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,435 @@
+"""
+Faststart Remux Module
+
+Rewrites MP4/MOV files whose moov box sits after the media data, so
+browsers can start playback without first fetching the end of the file:
+- Pure-Python atom relocation: moov is moved in front of the media data
+  and every chunk offset (stco/co64) is shifted by its size
+- ffmpeg copy-remux (-c copy -movflags +faststart) for files the
+  relocation cannot handle, when ffmpeg is installed
+- Results go to <config dir>/cache/faststart, named by a hash of the
+  video's chapter, name, size and mtime; serve_static() serves the copy
+  instead of the original while it is current
+- Copies keep the original's container (a .mov stays QuickTime) even
+  though every cache file is named <key>.mp4, so they are served with the
+  original's Content-Type
+- One background job at a time, started on request
+- Copies whose original changed or left the catalog are deleted by the
+  same worker, after catalog changes and before each batch of remuxes
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import catalog
+import database
+import metadata
+from cache import cache_key, get_cache_dir
+from singleton import ProcessSingleton
+from thumbnails import find_ffmpeg
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.remux')
+
+# File types that can be remuxed
+REMUX_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+
+# Copy buffer for the relocation
+COPY_CHUNK = 1024 * 1024
+
+# Seconds one ffmpeg remux may take before it is killed
+FFMPEG_TIMEOUT = 3600
+
+# Seconds between two checks of the cache directory for copies made by
+# other processes
+INDEX_CHECK_INTERVAL = 1.0
+
+# Boxes on the path from moov to the chunk offset tables
+_CONTAINER_BOXES = (b'trak', b'mdia', b'minf', b'stbl')
+
+
+def _box_header(data: bytes, offset: int) -> Tuple[bytes, int, int]:
+    """Return (type, header length, box size) of the box at an offset."""
+    size, kind = struct.unpack_from('>I4s', data, offset)
+    header = 8
+    if size == 1:
+        size = struct.unpack_from('>Q', data, offset + 8)[0]
+        header = 16
+    elif size == 0:
+        size = len(data) - offset
+    if size < header or offset + size > len(data):
+        raise ValueError('truncated box')
+    return kind, header, size
+
+
+def _shift_chunk_offsets(moov: bytearray, start: int, end: int, shift: int,
+                         moved_from: int, moved_to: int):
+    """Add shift to every chunk offset pointing into [moved_to, moved_from)."""
+    offset = start
+    while offset < end:
+        kind, header, size = _box_header(moov, offset)
+        body = offset + header
+        if kind in _CONTAINER_BOXES:
+            _shift_chunk_offsets(moov, body, offset + size, shift, moved_from, moved_to)
+        elif kind in (b'stco', b'co64'):
+            count = struct.unpack_from('>I', moov, body + 4)[0]
+            width = 4 if kind == b'stco' else 8
+            code = '>I' if kind == b'stco' else '>Q'
+            if body + 8 + count * width > offset + size:
+                raise ValueError('truncated chunk offset table')
+            for index in range(count):
+                position = body + 8 + index * width
+                value = struct.unpack_from(code, moov, position)[0]
+                if moved_to <= value < moved_from:
+                    value += shift
+                    if width == 4 and value > 0xFFFFFFFF:
+                        # Would need stco -> co64, which changes the moov size
+                        raise ValueError('chunk offsets exceed 32 bits')
+                    struct.pack_into(code, moov, position, value)
+        elif kind == b'cmov':
+            raise ValueError('compressed moov box')
+        offset += size
+
+
+def _copy_range(src, dst, start: int, end: int):
+    """Copy bytes [start, end) of src to the current position of dst."""
+    src.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        data = src.read(min(COPY_CHUNK, remaining))
+        if not data:
+            raise ValueError('unexpected end of file')
+        dst.write(data)
+        remaining -= len(data)
+
+
+def relocate_moov(source: str, target: str):
+    """
+    Write a faststart copy by moving moov in front of the first mdat.
+
+    Args:
+        source: Original MP4/MOV file
+        target: Output file (created or replaced)
+
+    Raises:
+        ValueError: If the file is not a plain, non-faststart MP4 that can
+                    be rewritten this way
+        OSError: On read/write errors
+    """
+    with open(source, 'rb') as src:
+        size = os.fstat(src.fileno()).st_size
+        boxes = list(metadata.iter_mp4_boxes(src, size))
+        kinds = [box[0] for box in boxes]
+        if b'moof' in kinds:
+            raise ValueError('fragmented MP4')
+        if b'moov' not in kinds or b'mdat' not in kinds:
+            raise ValueError('no moov or mdat box')
+        _, moov_offset, moov_size = boxes[kinds.index(b'moov')]
+        _, mdat_offset, _ = boxes[kinds.index(b'mdat')]
+        if moov_offset < mdat_offset:
+            raise ValueError('already faststart')
+        if moov_size > metadata.MAX_HEADER_BYTES:
+            raise ValueError('moov box too large')
+
+        src.seek(moov_offset)
+        moov = bytearray(src.read(moov_size))
+        _, header, _ = _box_header(moov, 0)
+        # Everything from the first mdat up to the old moov moves back by moov_size
+        _shift_chunk_offsets(moov, header, moov_size, moov_size, moov_offset, mdat_offset)
+
+        with open(target, 'wb') as dst:
+            _copy_range(src, dst, 0, mdat_offset)
+            dst.write(moov)
+            _copy_range(src, dst, mdat_offset, moov_offset)
+            _copy_range(src, dst, moov_offset + moov_size, size)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+
+def _ffmpeg_remux(ffmpeg: str, source: str, target: str) -> bool:
+    """Copy-remux with ffmpeg, moving moov to the front."""
+    output_format = 'mov' if source.lower().endswith('.mov') else 'mp4'
+    command = [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error', '-i', source,
+               '-map', '0', '-c', 'copy', '-movflags', '+faststart',
+               '-f', output_format, '-y', target]
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL, timeout=FFMPEG_TIMEOUT,
+                                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return result.returncode == 0 and os.path.getsize(target) > 0
+
+
+class RemuxQueue:
+    """Background queue producing faststart copies one file at a time."""
+
+    def __init__(self):
+        """Initialize an idle queue and index the existing cache."""
+        self._lock = threading.Lock()
+        self._jobs: queue.Queue = queue.Queue()
+        self._queued: Set[str] = set()
+        self._failed: Dict[str, str] = {}
+        # key -> (size, mtime) of the copy, used as send_media() hints
+        self._available: Dict[str, Tuple[int, float]] = {}
+        self._index_stamp: Optional[int] = None
+        self._index_checked = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._prune_pending = False
+        self._stopping = False
+
+    def _cache_index(self) -> Dict[str, Tuple[int, float]]:
+        """
+        Keys of the copies in the cache directory, with their size and mtime.
+
+        The directory is listed again only when its mtime changed, checked
+        at most once per INDEX_CHECK_INTERVAL, so copies written by other
+        worker processes are picked up.
+        """
+        now = time.monotonic()
+        if self._index_stamp is not None and now - self._index_checked < INDEX_CHECK_INTERVAL:
+            return self._available
+        cache_dir = get_cache_dir('faststart')
+        try:
+            stamp = os.stat(cache_dir).st_mtime_ns
+        except OSError:
+            return self._available
+        if stamp != self._index_stamp:
+            available = {}
+            for entry in os.scandir(cache_dir):
+                if entry.name.endswith('.mp4'):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    available[entry.name[:-4]] = (st.st_size, st.st_mtime)
+            self._available = available
+            self._index_stamp = stamp
+        self._index_checked = now
+        return self._available
+
+    def get_remuxed(self, chapter: str, file_name: str, size: int,
+                    mtime: float) -> Optional[Tuple[str, int, float]]:
+        """
+        Return the faststart copy of a video if one is current.
+
+        Answered from the cache index, without touching the disk.
+
+        Args:
+            chapter: Chapter folder name
+            file_name: Video file name
+            size: Current size of the original
+            mtime: Current mtime of the original
+
+        Returns:
+            Optional[Tuple[str, int, float]]: Path, size and mtime of the
+            copy, or None
+        """
+        key = cache_key(chapter, file_name, size, mtime)
+        stat = self._cache_index().get(key)
+        if stat is None:
+            return None
+        return str(get_cache_dir('faststart') / f"{key}.mp4"), stat[0], stat[1]
+
+    def discard(self, chapter: str, file_name: str, size: int, mtime: float):
+        """Forget a copy that disappeared from the cache directory."""
+        self._available.pop(cache_key(chapter, file_name, size, mtime), None)
+
+    def status(self, chapter: str, file_name: str, size: int, mtime: float) -> str:
+        """
+        Return 'remuxed', 'queued', 'failed' or 'original' for a video.
+        """
+        key = cache_key(chapter, file_name, size, mtime)
+        if key in self._cache_index():
+            return 'remuxed'
+        with self._lock:
+            if key in self._queued:
+                return 'queued'
+            if key in self._failed:
+                return 'failed'
+        return 'original'
+
+    def enqueue(self, base_path: str, files: List[Tuple[str, str, int, float]]) -> int:
+        """
+        Queue videos for remuxing.
+
+        Args:
+            base_path: Content root folder
+            files: (chapter, file_name, size, mtime) per video
+
+        Returns:
+            int: Number of videos newly queued
+        """
+        available = self._cache_index()
+        added = 0
+        with self._lock:
+            for chapter, file_name, size, mtime in files:
+                if not file_name.lower().endswith(REMUX_EXTENSIONS):
+                    continue
+                key = cache_key(chapter, file_name, size, mtime)
+                if key in available or key in self._queued:
+                    continue
+                self._failed.pop(key, None)
+                self._queued.add(key)
+                self._jobs.put((base_path, chapter, file_name, key))
+                added += 1
+            if added:
+                # Make room by dropping outdated copies first
+                self._prune_pending = True
+                self._start_worker()
+        return added
+
+    def request_prune(self):
+        """Have the worker delete outdated copies; called after catalog changes."""
+        with self._lock:
+            self._prune_pending = True
+            self._start_worker()
+
+    def _start_worker(self):
+        """Start the worker thread if it is not running; caller holds _lock."""
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='faststart-remux',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Worker loop: prune and remux until there is nothing left to do."""
+        try:
+            while True:
+                with self._lock:
+                    prune, self._prune_pending = self._prune_pending, False
+                    if self._stopping or (not prune and self._jobs.empty()):
+                        self._thread = None
+                        return
+                if prune:
+                    try:
+                        self.prune(catalog.list_files('video'))
+                    except (OSError, sqlite3.Error) as e:
+                        logger.error("[REMUX] Pruning the cache failed: %s", e)
+                    continue
+                base_path, chapter, file_name, key = self._jobs.get()
+                try:
+                    self._remux(base_path, chapter, file_name, key)
+                finally:
+                    with self._lock:
+                        self._queued.discard(key)
+        finally:
+            database.release_connection()
+
+    def _remux(self, base_path: str, chapter: str, file_name: str, key: str):
+        """Produce one faststart copy, relocating first and using ffmpeg second."""
+        source = os.path.join(base_path, chapter, file_name)
+        cache_dir = get_cache_dir('faststart')
+        fd, tmp_path = tempfile.mkstemp(prefix='.remux.', suffix='.tmp', dir=str(cache_dir))
+        os.close(fd)
+        try:
+            try:
+                relocate_moov(source, tmp_path)
+                method = 'relocated'
+            except ValueError as e:
+                ffmpeg = find_ffmpeg()
+                if ffmpeg is None or not _ffmpeg_remux(ffmpeg, source, tmp_path):
+                    with self._lock:
+                        self._failed[key] = str(e)
+                    logger.warning("[REMUX] Cannot remux %s/%s: %s", chapter, file_name, e)
+                    return
+                method = 'ffmpeg'
+            target = cache_dir / f"{key}.mp4"
+            os.replace(tmp_path, target)
+            st = os.stat(target)
+            self._available[key] = (st.st_size, st.st_mtime)
+            logger.info("[REMUX] %s/%s: faststart copy ready (%s)", chapter, file_name, method)
+        except OSError as e:
+            with self._lock:
+                self._failed[key] = str(e)
+            logger.error("[REMUX] Failed for %s/%s: %s", chapter, file_name, e)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def prune(self, current: List[Tuple[str, str, int, float]]) -> int:
+        """
+        Delete copies whose original changed or left the catalog.
+
+        Args:
+            current: (chapter, file_name, size, mtime) of every indexed video
+
+        Returns:
+            int: Number of copies deleted
+        """
+        keep = {cache_key(*entry) for entry in current}
+        cache_dir = get_cache_dir('faststart')
+        removed = 0
+        for key in list(self._cache_index()):
+            if key in keep:
+                continue
+            try:
+                os.unlink(cache_dir / f"{key}.mp4")
+            except OSError:
+                pass
+            self._available.pop(key, None)
+            removed += 1
+        if removed:
+            logger.info("[REMUX] Removed %d outdated faststart copy(ies)", removed)
+        return removed
+
+    def stop(self):
+        """Drop queued jobs; a remux in progress finishes first."""
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+            while not self._jobs.empty():
+                try:
+                    _, _, _, key = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                self._queued.discard(key)
+        if thread is not None:
+            thread.join(timeout=5)
+
+
+# Global queue instance for module-level access
+_queue = ProcessSingleton(RemuxQueue)
+
+
+def get_queue() -> RemuxQueue:
+    """
+    Get or create the global remux queue.
+
+    Returns:
+        RemuxQueue: Queue instance
+    """
+    return _queue.get()
+
+
+def get_report() -> Dict[str, Any]:
+    """
+    Describe every non-faststart video and the state of its copy.
+
+    Returns:
+        Dict in the /api/faststart response format
+    """
+    remuxer = get_queue()
+    files = []
+    for chapter, file_name, size, mtime in metadata.get_slow_start_files():
+        files.append({
+            'chapter': chapter,
+            'file_name': file_name,
+            'size': size,
+            'status': remuxer.status(chapter, file_name, size, mtime),
+        })
+    return {'ffmpeg': find_ffmpeg() is not None, 'files': files}
+
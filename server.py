@@ -3,7 +3,11 @@ Flask Server Wrapper Module
 
 Provides server lifecycle management for GUI integration:
 - Start/stop Flask server in background thread
+- Non-blocking start for the GUI: the app (Flask, database setup) is
+  imported in a background thread, and readiness is signalled by an event
+- Selectable server backend (see wsgi_servers.py)
 - Log capture and forwarding to callback
+- Background content folder watcher for the catalog
 - Clean shutdown handling
 
 Author: Course Platform Team
@@ -17,11 +21,13 @@ import logging
 import io
 import time
 from typing import Callable, Optional
-from werkzeug.serving import make_server
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# Seconds start() waits for the server thread to begin serving
+READY_TIMEOUT = 10.0
+
 
 class FlaskServerWrapper:
     """Wrapper class to manage Flask server lifecycle."""
@@ -39,6 +45,11 @@ class FlaskServerWrapper:
         self.is_running = False
         self._app = None
         self._log_stream = None
+        self._watcher = None
+        self._watcher_lock = threading.RLock()
+        self._folder_hook = False
+        self._pid = os.getpid()
+        self._ready = threading.Event()
         
     def _setup_logging(self):
         """Configure logging to capture Flask output."""
@@ -65,6 +76,14 @@ class FlaskServerWrapper:
                 logger = logging.getLogger(logger_name)
                 logger.addHandler(handler)
                 logger.setLevel(logging.INFO)
+        
+        # Per-request app logs are DEBUG; the level comes from the settings
+        try:
+            from config import get_server_settings
+            level = get_server_settings()['log_level']
+        except ImportError:
+            level = 'INFO'
+        logging.getLogger('app').setLevel(level)
     
     def _log(self, message: str):
         """Send log message to callback."""
@@ -89,8 +108,10 @@ class FlaskServerWrapper:
         
         try:
             # Import app here to avoid circular imports and ensure fresh config
+            started = time.perf_counter()
             from app import app
             self._app = app
+            self._log(f"[SERVER] App loaded in {time.perf_counter() - started:.2f}s")
             
             # Setup logging
             self._setup_logging()
@@ -99,27 +120,35 @@ class FlaskServerWrapper:
             import logging as log
             log.getLogger('werkzeug').setLevel(log.WARNING)
             
-            # Create server
-            self.server = make_server(host, port, app, threaded=True)
-            self.server.timeout = 1  # Allow periodic checks
+            # Create server for the configured backend
+            from wsgi_servers import create_server
+            self.server = create_server(app, host, port, log_callback=self.log_callback)
+            
+            # Keep the content catalog in sync while serving
+            self._start_watcher()
+            
+            # Start server in background thread; the socket is already
+            # listening, so requests queue up until the loop runs
+            ready = self._ready = threading.Event()
             
-            # Start server in background thread
             def run_server():
                 self._log(f"[SERVER] Starting on http://{host}:{port}")
                 self.is_running = True
+                ready.set()
                 try:
                     self.server.serve_forever()
                 except Exception as e:
                     self._log(f"[SERVER] Error: {e}")
                 finally:
                     self.is_running = False
+                    ready.set()
                     self._log("[SERVER] Stopped")
             
             self.server_thread = threading.Thread(target=run_server, daemon=True)
             self.server_thread.start()
             
-            # Wait briefly for server to start
-            time.sleep(0.5)
+            # Wait until the server thread is serving (or has failed)
+            ready.wait(READY_TIMEOUT)
             
             if self.is_running:
                 self._log(f"[SERVER] Running at http://{host}:{port}")
@@ -130,8 +159,125 @@ class FlaskServerWrapper:
                 
         except Exception as e:
             self._log(f"[SERVER] Failed to start: {e}")
+            self._stop_watcher()
             return False
     
+    def start_async(self, host: str = '127.0.0.1', port: int = 5000,
+                    callback: Optional[Callable[[bool], None]] = None) -> threading.Thread:
+        """
+        Start the server without blocking the caller (the GUI thread).
+        
+        Args:
+            host: Host address to bind to
+            port: Port number
+            callback: Called from the background thread with start()'s result
+            
+        Returns:
+            threading.Thread: The thread running start()
+        """
+        def run():
+            result = self.start(host, port)
+            if callback:
+                callback(result)
+        
+        thread = threading.Thread(target=run, name='server-start', daemon=True)
+        thread.start()
+        return thread
+    
+    def preload(self) -> threading.Thread:
+        """
+        Import the app (Flask, database setup) in the background, so a
+        later start() does not wait for it.
+        
+        Returns:
+            threading.Thread: The importing thread
+        """
+        def run():
+            try:
+                started = time.perf_counter()
+                import app  # noqa: F401
+                self._log(f"[SERVER] App preloaded in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                self._log(f"[SERVER] Preload failed: {e}")
+        
+        thread = threading.Thread(target=run, name='app-preload', daemon=True)
+        thread.start()
+        return thread
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the server thread is serving.
+        
+        Args:
+            timeout: Seconds to wait (None waits forever)
+            
+        Returns:
+            bool: True if the server is running
+        """
+        self._ready.wait(timeout)
+        return self.is_running
+    
+    def _start_watcher(self, base_path: Optional[str] = None):
+        """
+        Start the catalog watcher for a content folder.
+        
+        Args:
+            base_path: Folder to watch (default: the configured one)
+        """
+        from app import get_content_folder, on_content_folder_change
+        from watcher import CatalogWatcher
+        
+        if not self._folder_hook:
+            on_content_folder_change(self._on_content_folder_change)
+            self._folder_hook = True
+        
+        base_path = base_path or get_content_folder()
+        if not base_path:
+            return
+        with self._watcher_lock:
+            try:
+                self._watcher = CatalogWatcher(base_path, self.log_callback,
+                                               folder_source=get_content_folder,
+                                               on_folder_change=self._on_content_folder_change)
+                self._watcher.start()
+            except Exception as e:
+                self._log(f"[SERVER] Content watcher unavailable: {e}")
+                self._watcher = None
+    
+    def _stop_watcher(self):
+        """Stop the catalog watcher if one is running."""
+        with self._watcher_lock:
+            if self._watcher:
+                self._watcher.stop()
+                self._watcher = None
+    
+    def _on_content_folder_change(self, folder: Optional[str]):
+        """
+        Move the watcher to a new content folder.
+        
+        Called by the content-folder route and by the watcher itself when
+        it notices the configured folder changed (e.g. from a pre-fork
+        worker or the desktop app). The restart runs on its own thread, as
+        the watcher thread cannot join itself.
+        
+        Args:
+            folder: New content folder, or None if none is configured
+        """
+        # Pre-fork workers inherit this hook but not the watcher
+        if os.getpid() != self._pid:
+            return
+        
+        def restart():
+            with self._watcher_lock:
+                current = self._watcher.base_path if self._watcher else None
+                if folder and current == os.path.abspath(folder):
+                    return
+                self._stop_watcher()
+                if self.is_running and folder:
+                    self._start_watcher(folder)
+        
+        threading.Thread(target=restart, name='watcher-restart', daemon=True).start()
+    
     def stop(self) -> bool:
         """
         Stop the Flask server gracefully.
@@ -146,11 +292,31 @@ class FlaskServerWrapper:
         try:
             self._log("[SERVER] Shutting down...")
             self.server.shutdown()
+            self.server.server_close()
             
             # Wait for thread to finish
             if self.server_thread:
                 self.server_thread.join(timeout=5)
             
+            self._stop_watcher()
+            
+            # Cancel queued metadata probes, thumbnail, remux and HLS jobs
+            from hls import get_segmenter
+            from metadata import get_prober
+            from remux import get_queue
+            from thumbnails import get_generator
+            get_prober().stop()
+            get_generator().stop()
+            get_queue().stop()
+            get_segmenter().stop()
+            
+            # Write any buffered progress heartbeats and deferred settings
+            # before reporting shutdown
+            from progress import get_buffer
+            from settings_store import get_store
+            get_buffer().stop()
+            get_store().flush()
+            
             self.is_running = False
             self.server = None
             self.server_thread = None
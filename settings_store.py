@@ -0,0 +1,312 @@
+"""
+User Settings Store Module
+
+Typed, cached access to the user_settings table:
+- Known settings have a type (bool/float/str), validated on write
+- Values are cached in memory; the API still sees the stored strings
+- Changes are written in one transaction
+- A revision counter (bumped by triggers) lets other processes notice
+  changes with one cheap query per REVALIDATE_INTERVAL
+- Content-based ETag for conditional GETs
+- Deferred writes for values updated on the request path (last_chapter)
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import database
+from singleton import ProcessSingleton
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.settings_store')
+
+# Stored (string) defaults. Their rows are inserted by the migrations
+# (see migrations.py), so a new key also needs a migration adding its row;
+# until then decode_value() falls back to the value here
+DEFAULT_SETTINGS = {
+    'max_playback_speed': '2.0',
+    'auto_resume': 'true',
+    'save_last_chapter': 'true',
+    'last_chapter': '',
+    'theme': 'dark',
+    'current_playback_speed': '1',
+    'autoplay_next': 'true',
+    'hls_playback': 'true',
+}
+
+# Value type of each known setting; unknown keys are kept as strings
+SETTING_TYPES = {
+    'max_playback_speed': float,
+    'auto_resume': bool,
+    'save_last_chapter': bool,
+    'last_chapter': str,
+    'theme': str,
+    'current_playback_speed': float,
+    'autoplay_next': bool,
+    'hls_playback': bool,
+}
+
+# Allowed values for enumerated settings
+SETTING_CHOICES = {
+    'theme': ('dark', 'light'),
+}
+
+# Seconds between two checks for changes made by other processes
+REVALIDATE_INTERVAL = 1.0
+
+# Seconds a deferred write waits so bursts are written together
+DEFER_DELAY = 1.0
+
+UPSERT_SQL = '''INSERT INTO user_settings (setting_key, setting_value)
+                VALUES (?, ?)
+                ON CONFLICT(setting_key) DO UPDATE SET
+                    setting_value = excluded.setting_value'''
+
+
+def encode_value(key: str, value: Any) -> str:
+    """
+    Validate a setting value and convert it to its stored string form.
+
+    Args:
+        key: Setting name
+        value: Value as posted by the client
+
+    Returns:
+        str: Value to store
+
+    Raises:
+        ValueError: If the value does not fit the setting's type
+    """
+    kind = SETTING_TYPES.get(key, str)
+    if kind is bool:
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        text = str(value).strip().lower()
+        if text not in ('true', 'false'):
+            raise ValueError(f'{key} must be true or false')
+        return text
+
+    if kind is float:
+        if isinstance(value, bool):
+            raise ValueError(f'{key} must be a number')
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'{key} must be a number') from None
+        if not math.isfinite(number) or number <= 0:
+            raise ValueError(f'{key} must be a positive number')
+        return value.strip() if isinstance(value, str) else str(value)
+
+    if isinstance(value, (dict, list)):
+        raise ValueError(f'{key} must be a plain value')
+    text = '' if value is None else str(value)
+    choices = SETTING_CHOICES.get(key)
+    if choices and text not in choices:
+        raise ValueError(f"{key} must be one of: {', '.join(choices)}")
+    return text
+
+
+def decode_value(key: str, raw: Optional[str]) -> Any:
+    """
+    Convert a stored string to the setting's type.
+
+    Args:
+        key: Setting name
+        raw: Stored value (None if missing)
+
+    Returns:
+        Typed value, falling back to the default for unreadable values
+    """
+    kind = SETTING_TYPES.get(key, str)
+    if raw is None:
+        raw = DEFAULT_SETTINGS.get(key, '')
+    if kind is bool:
+        return raw.strip().lower() == 'true'
+    if kind is float:
+        try:
+            return float(raw)
+        except ValueError:
+            return float(DEFAULT_SETTINGS[key])
+    return raw
+
+
+class SettingsStore:
+    """In-memory view of user_settings with write-through and deferred writes."""
+
+    def __init__(self):
+        """Initialize an empty (not yet loaded) store."""
+        self._values: Optional[Dict[str, str]] = None
+        self._etag = ''
+        self._revision = -1
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self._pending: Dict[str, str] = {}
+        self._timer: Optional[threading.Timer] = None
+
+    def _load(self, c: sqlite3.Cursor):
+        """Read every setting and the revision; caller holds the lock."""
+        c.execute('SELECT revision FROM settings_revision WHERE id = 1')
+        row = c.fetchone()
+        self._revision = row[0] if row else 0
+        c.execute('SELECT setting_key, setting_value FROM user_settings')
+        values = {key: value for key, value in c.fetchall()}
+        # Deferred values not yet written stay visible
+        values.update(self._pending)
+        self._set_values(values)
+
+    def _set_values(self, values: Dict[str, str]):
+        """Install a new snapshot and its ETag; caller holds the lock."""
+        self._values = values
+        payload = json.dumps(values, sort_keys=True).encode('utf-8')
+        self._etag = hashlib.sha1(payload).hexdigest()[:20]
+        self._checked_at = time.monotonic()
+
+    def _current(self) -> Dict[str, str]:
+        """Return the cached snapshot, revalidating it when due."""
+        values = self._values
+        if values is not None and time.monotonic() - self._checked_at < REVALIDATE_INTERVAL:
+            return values
+        with self._lock:
+            c = database.get_connection().cursor()
+            if self._values is None:
+                self._load(c)
+            else:
+                c.execute('SELECT revision FROM settings_revision WHERE id = 1')
+                row = c.fetchone()
+                if (row[0] if row else 0) != self._revision:
+                    self._load(c)
+                else:
+                    self._checked_at = time.monotonic()
+            return self._values
+
+    def get_all(self) -> Dict[str, str]:
+        """
+        Return every setting in stored (string) form.
+
+        Returns:
+            Dict mapping setting name to its string value
+        """
+        return dict(self._current())
+
+    def get(self, key: str) -> Any:
+        """
+        Return one setting converted to its type.
+
+        Args:
+            key: Setting name
+
+        Returns:
+            Typed value (bool, float or str)
+        """
+        return decode_value(key, self._current().get(key))
+
+    def etag(self) -> str:
+        """Return the ETag of the current settings snapshot."""
+        self._current()
+        return self._etag
+
+    def update(self, values: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Validate and write several settings in one transaction.
+
+        Args:
+            values: Setting name to new value
+
+        Returns:
+            Dict: The stored string values that were written
+
+        Raises:
+            ValueError: If any value is invalid (nothing is written)
+        """
+        encoded = {str(key): encode_value(str(key), value) for key, value in values.items()}
+        if not encoded:
+            return encoded
+        with self._lock:
+            with database.transaction() as conn:
+                conn.executemany(UPSERT_SQL, list(encoded.items()))
+                # Posted values supersede deferred ones for the same keys
+                for key in encoded:
+                    self._pending.pop(key, None)
+                self._load(conn.cursor())
+        return encoded
+
+    def set_deferred(self, key: str, value: Any):
+        """
+        Update a setting now in memory and write it shortly afterwards.
+
+        Args:
+            key: Setting name
+            value: New value
+
+        Raises:
+            ValueError: If the value is invalid
+        """
+        encoded = encode_value(key, value)
+        with self._lock:
+            values = dict(self._current())
+            if values.get(key) == encoded and key not in self._pending:
+                return
+            values[key] = encoded
+            self._pending[key] = encoded
+            self._set_values(values)
+            self._schedule()
+
+    def _schedule(self):
+        """Start the deferred write timer; caller holds the lock."""
+        if self._timer is None:
+            self._timer = threading.Timer(DEFER_DELAY, self._flush_deferred)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_deferred(self):
+        """Timer entry point; returns the thread's DB connection afterwards."""
+        try:
+            self.flush()
+        finally:
+            database.release_connection()
+
+    def flush(self):
+        """Write all deferred values now."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            try:
+                with database.transaction() as conn:
+                    conn.executemany(UPSERT_SQL, list(pending.items()))
+            except Exception as e:
+                for key, value in pending.items():
+                    self._pending.setdefault(key, value)
+                self._schedule()
+                logger.warning("[SETTINGS] Deferred write failed, will retry: %s", e)
+            # The revision moved on; the next revalidation reloads the snapshot
+
+
+# Global store instance for module-level access
+_store = ProcessSingleton(SettingsStore,
+                          on_create=lambda instance: atexit.register(instance.flush))
+
+
+def get_store() -> SettingsStore:
+    """
+    Get or create the global settings store.
+
+    Returns:
+        SettingsStore: Store instance
+    """
+    return _store.get()
+
@@ -0,0 +1,61 @@
+"""
+Process Singleton Module
+
+Holder for the per-process instances of the background services (probe,
+thumbnail, remux and HLS workers, stores and buffers):
+- Created on first use, under a lock, so concurrent requests share one
+- Dropped in forked children (pre-fork server workers), whose copy would
+  refer to worker threads that only exist in the parent; the child
+  creates its own on first use
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import os
+import threading
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class ProcessSingleton(Generic[T]):
+    """Lazily created instance, one per process."""
+
+    def __init__(self, factory: Callable[[], T],
+                 on_create: Optional[Callable[[T], None]] = None):
+        """
+        Initialize an empty holder.
+
+        Args:
+            factory: Creates the instance
+            on_create: Called once with each new instance (e.g. to
+                       register an atexit flush)
+        """
+        self._factory = factory
+        self._on_create = on_create
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def get(self) -> T:
+        """
+        Get or create the instance.
+
+        Returns:
+            The process's instance
+        """
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    instance = self._factory()
+                    if self._on_create is not None:
+                        self._on_create(instance)
+                    self._instance = instance
+        return self._instance
+
+    def reset(self):
+        """Forget the instance and replace the lock, which another thread may hold at fork time."""
+        self._instance = None
+        self._lock = threading.Lock()
@@ -0,0 +1,16 @@
+"""
+Test Configuration
+
+Makes the application modules in the repository root importable.
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import os
+import sys
+
+# The repository root holds the application modules
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
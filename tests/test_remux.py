@@ -0,0 +1,123 @@
+"""
+Faststart Remux Tests
+
+Builds small MP4 files with the moov box after the media data and checks
+that relocate_moov() moves it to the front without breaking the chunk
+offset tables (stco and co64).
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import struct
+
+import pytest
+
+import metadata
+import remux
+
+
+# Distinct payloads, so a wrong offset reads the wrong bytes
+CHUNKS = [b'first chunk ' * 8, b'second chunk ' * 5, b'third chunk ' * 11]
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    """Build one MP4 box."""
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def full_box(kind: bytes, payload: bytes, version: int = 0) -> bytes:
+    """Build one MP4 full box (version and flags before the payload)."""
+    return box(kind, bytes([version, 0, 0, 0]) + payload)
+
+
+def build_moov(offsets, table: bytes) -> bytes:
+    """Build a moov box with one video track whose chunks are at offsets."""
+    # mvhd v0: times, timescale 1000, duration 5000 ms, then fixed fields
+    mvhd = full_box(b'mvhd', struct.pack('>IIII', 0, 0, 1000, 5000) + b'\0' * 80)
+    hdlr = full_box(b'hdlr', b'\0' * 4 + b'vide' + b'\0' * 12 + b'video\0')
+    if table == b'stco':
+        entries = b''.join(struct.pack('>I', offset) for offset in offsets)
+    else:
+        entries = b''.join(struct.pack('>Q', offset) for offset in offsets)
+    chunk_table = full_box(table, struct.pack('>I', len(offsets)) + entries)
+    stbl = box(b'stbl', chunk_table)
+    trak = box(b'trak', box(b'mdia', hdlr + box(b'minf', stbl)))
+    return box(b'moov', mvhd + trak)
+
+
+def build_slow_start_mp4(table: bytes) -> bytes:
+    """Build ftyp, mdat with CHUNKS, then moov pointing at the chunks."""
+    ftyp = box(b'ftyp', b'isom\0\0\0\0isomavc1')
+    offsets = []
+    position = len(ftyp) + 8
+    for chunk in CHUNKS:
+        offsets.append(position)
+        position += len(chunk)
+    mdat = box(b'mdat', b''.join(CHUNKS))
+    return ftyp + mdat + build_moov(offsets, table)
+
+
+def chunk_offsets(data: bytes):
+    """Read the chunk offsets of every track from a file's moov box."""
+    offsets = []
+
+    def walk(start, end):
+        offset = start
+        while offset < end:
+            kind, header, size = remux._box_header(data, offset)
+            body = offset + header
+            if kind in (b'moov', b'trak', b'mdia', b'minf', b'stbl'):
+                walk(body, offset + size)
+            elif kind in (b'stco', b'co64'):
+                count = struct.unpack_from('>I', data, body + 4)[0]
+                code = '>I' if kind == b'stco' else '>Q'
+                width = struct.calcsize(code)
+                offsets.extend(struct.unpack_from(code, data, body + 8 + index * width)[0]
+                               for index in range(count))
+            offset += size
+
+    walk(0, len(data))
+    return offsets
+
+
+@pytest.mark.parametrize('table', [b'stco', b'co64'])
+def test_relocate_moov_keeps_chunk_offsets(tmp_path, table):
+    source = tmp_path / 'slow.mp4'
+    target = tmp_path / 'fast.mp4'
+    original = build_slow_start_mp4(table)
+    source.write_bytes(original)
+    assert metadata.probe_file(str(source))['faststart'] is False
+
+    remux.relocate_moov(str(source), str(target))
+
+    relocated = target.read_bytes()
+    assert len(relocated) == len(original)
+    kinds = [remux._box_header(relocated, 0)[0]]
+    offset = remux._box_header(relocated, 0)[2]
+    while offset < len(relocated):
+        kind, _, size = remux._box_header(relocated, offset)
+        kinds.append(kind)
+        offset += size
+    assert kinds == [b'ftyp', b'moov', b'mdat']
+
+    before = chunk_offsets(original)
+    after = chunk_offsets(relocated)
+    assert len(after) == len(CHUNKS)
+    for chunk, old, new in zip(CHUNKS, before, after):
+        assert original[old:old + len(chunk)] == chunk
+        assert relocated[new:new + len(chunk)] == chunk
+
+    probed = metadata.probe_file(str(target))
+    assert probed['faststart'] is True
+    assert probed['duration'] == pytest.approx(5.0)
+
+
+def test_relocate_moov_rejects_faststart_file(tmp_path):
+    source = tmp_path / 'fast.mp4'
+    ftyp = box(b'ftyp', b'isom\0\0\0\0isomavc1')
+    moov = build_moov([0], b'stco')
+    source.write_bytes(ftyp + moov + box(b'mdat', CHUNKS[0]))
+
+    with pytest.raises(ValueError):
+        remux.relocate_moov(str(source), str(tmp_path / 'out.mp4'))
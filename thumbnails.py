@@ -0,0 +1,272 @@
+"""
+Thumbnail Module
+
+Poster frames for the player's playlist:
+- Extracted with ffmpeg, when it is installed, by a small pool of
+  background threads that each drive one ffmpeg process; without ffmpeg
+  videos simply keep their placeholder
+- Cached as JPEG files under <config dir>/cache/thumbnails, named by a hash
+  of the video's chapter, name, size and mtime: a changed video gets a new
+  name, so a cached image never has to be revalidated
+- Only the chapter currently open is generated; jobs still queued for a
+  chapter that was left are dropped
+- The cache is capped in size, evicting the least recently served images
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from cache import cache_key, get_cache_dir
+from singleton import ProcessSingleton
+
+
+# Child of the app logger, so the server's log handlers pick it up
+logger = logging.getLogger('app.thumbnails')
+
+# Concurrent ffmpeg processes
+THUMB_WORKERS = 2
+
+# Width of the generated images in pixels (height keeps the aspect ratio)
+THUMB_WIDTH = 320
+
+# Size cap of the thumbnail cache
+MAX_CACHE_BYTES = 100 * 1024 * 1024
+
+# Seconds one ffmpeg run may take before it is killed
+FFMPEG_TIMEOUT = 30
+
+# Poster frame position as a fraction of the duration, and the fallback
+# position in seconds when the duration is unknown
+FRAME_POSITION = 0.1
+DEFAULT_FRAME_SECONDS = 5.0
+
+# Seconds between two LRU timestamp updates of the same image
+TOUCH_INTERVAL = 3600
+
+THUMB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+_ffmpeg = {'checked': False, 'path': None}
+
+
+def find_ffmpeg() -> Optional[str]:
+    """
+    Locate the ffmpeg executable (looked up once per process).
+
+    Returns:
+        Optional[str]: Path to ffmpeg, or None if it is not installed
+    """
+    if not _ffmpeg['checked']:
+        _ffmpeg['path'] = shutil.which('ffmpeg')
+        _ffmpeg['checked'] = True
+    return _ffmpeg['path']
+
+
+def get_thumb_path(thumb: str) -> Optional[str]:
+    """
+    Return the cached image for a thumbnail id.
+
+    Args:
+        thumb: Thumbnail id, the video's cache_key()
+
+    Returns:
+        Optional[str]: Path of the JPEG file, or None if not cached
+    """
+    if not THUMB_ID_PATTERN.match(thumb):
+        return None
+    path = get_cache_dir('thumbnails') / f"{thumb}.jpg"
+    return str(path) if path.is_file() else None
+
+
+def touch(path: str):
+    """Mark a cached image as recently used for LRU eviction."""
+    try:
+        if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def trim_cache(max_bytes: int = MAX_CACHE_BYTES) -> int:
+    """
+    Evict the least recently used images until the cache fits the cap.
+
+    Args:
+        max_bytes: Size cap in bytes
+
+    Returns:
+        int: Number of images removed
+    """
+    entries = []
+    total = 0
+    with os.scandir(get_cache_dir('thumbnails')) as it:
+        for entry in it:
+            if not entry.name.endswith('.jpg'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    if removed:
+        logger.info("[THUMBNAILS] Evicted %d cached image(s)", removed)
+    return removed
+
+
+class ThumbnailGenerator:
+    """Generates the poster frames of the open chapter in the background."""
+
+    def __init__(self, workers: int = THUMB_WORKERS):
+        """
+        Initialize an idle generator.
+
+        Args:
+            workers: Number of concurrent ffmpeg processes
+        """
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._current: Optional[Tuple[str, str]] = None
+        self._pending: Set[str] = set()
+        self._failed: Set[str] = set()
+
+    def request_chapter(self, base_path: str, chapter: str,
+                        videos: Dict[str, Tuple[int, float]],
+                        durations: Optional[Dict[str, float]] = None
+                        ) -> Tuple[Dict[str, Optional[str]], int]:
+        """
+        Look up a chapter's thumbnails and queue the missing ones.
+
+        Makes this the open chapter: queued jobs of any other chapter are
+        skipped when they come up.
+
+        Args:
+            base_path: Content root folder
+            chapter: Chapter folder name
+            videos: File name mapped to (size, mtime), from the catalog
+            durations: File name mapped to duration in seconds, if known
+
+        Returns:
+            (file name -> thumbnail id or None, number of images pending)
+        """
+        ffmpeg = find_ffmpeg()
+        cache_dir = get_cache_dir('thumbnails')
+        durations = durations or {}
+        thumbs: Dict[str, Optional[str]] = {}
+        pending = 0
+        with self._lock:
+            self._current = (base_path, chapter)
+            for file_name, (size, mtime) in sorted(videos.items()):
+                thumb = cache_key(chapter, file_name, size, mtime)
+                if (cache_dir / f"{thumb}.jpg").is_file():
+                    thumbs[file_name] = thumb
+                    continue
+                thumbs[file_name] = None
+                if ffmpeg is None or thumb in self._failed:
+                    continue
+                pending += 1
+                if thumb in self._pending:
+                    continue
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='thumbnail')
+                self._pending.add(thumb)
+                self._executor.submit(self._generate, ffmpeg, base_path, chapter,
+                                      file_name, thumb, durations.get(file_name))
+        return thumbs, pending
+
+    def _generate(self, ffmpeg: str, base_path: str, chapter: str, file_name: str,
+                  thumb: str, duration: Optional[float]):
+        """Worker job: extract one poster frame unless the chapter was left."""
+        try:
+            with self._lock:
+                if self._current != (base_path, chapter):
+                    return
+            video = os.path.join(base_path, chapter, file_name)
+            target = get_cache_dir('thumbnails') / f"{thumb}.jpg"
+            position = duration * FRAME_POSITION if duration else DEFAULT_FRAME_SECONDS
+            # Short clips may end before the chosen position; retry at 0
+            if not (self._extract(ffmpeg, video, position, target) or
+                    (position > 0 and self._extract(ffmpeg, video, 0, target))):
+                with self._lock:
+                    self._failed.add(thumb)
+                logger.warning("[THUMBNAILS] No frame extracted from %s/%s", chapter, file_name)
+        finally:
+            with self._lock:
+                self._pending.discard(thumb)
+                drained = not self._pending
+            if drained:
+                try:
+                    trim_cache()
+                except OSError as e:
+                    logger.error("[THUMBNAILS] Cache trim failed: %s", e)
+
+    def _extract(self, ffmpeg: str, video: str, position: float, target: Path) -> bool:
+        """Run ffmpeg for one frame; the image appears atomically on success."""
+        fd, tmp_path = tempfile.mkstemp(prefix='.thumb.', suffix='.tmp', dir=str(target.parent))
+        os.close(fd)
+        try:
+            command = [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error',
+                       '-ss', f'{position:.3f}', '-i', video, '-frames:v', '1',
+                       '-vf', f'scale={THUMB_WIDTH}:-2', '-q:v', '5', '-f', 'mjpeg', '-y', tmp_path]
+            try:
+                result = subprocess.run(command, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                        timeout=FFMPEG_TIMEOUT,
+                                        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+            except (OSError, subprocess.SubprocessError):
+                return False
+            if result.returncode != 0 or os.path.getsize(tmp_path) == 0:
+                return False
+            os.replace(tmp_path, target)
+            return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def stop(self):
+        """Drop queued jobs; running ffmpeg processes finish on their own."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._current = None
+            self._pending.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global generator instance for module-level access
+_generator = ProcessSingleton(ThumbnailGenerator)
+
+
+def get_generator() -> ThumbnailGenerator:
+    """
+    Get or create the global thumbnail generator.
+
+    Returns:
+        ThumbnailGenerator: Generator instance
+    """
+    return _generator.get()
+
@@ -0,0 +1,331 @@
+"""
+Content Folder Watcher Module
+
+Keeps the content catalog in sync with the filesystem in the background:
+- inotify (Linux) backend via ctypes, no extra dependencies
+- mtime polling fallback on other platforms or when inotify is unavailable
+- Add/remove/rename events coalesced and applied in small batches
+- Notices when the configured content folder changes and hands over to
+  the owner, which starts a watcher for the new folder
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Set
+
+import catalog
+import database
+import metadata
+import remux
+
+
+# inotify event masks (see <sys/inotify.h>)
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Seconds to wait for more events before applying a batch
+BATCH_DELAY = 0.5
+
+# Apply a batch early once this many paths are pending
+BATCH_SIZE = 200
+
+# Seconds between two sweeps in polling mode
+POLL_INTERVAL = 5.0
+
+# Seconds between two checks of the configured content folder
+ROOT_CHECK_INTERVAL = 1.0
+
+
+def _load_inotify():
+    """Return libc with inotify symbols, or None if unsupported."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class CatalogWatcher:
+    """Background thread that applies content folder changes to the catalog."""
+
+    def __init__(self, base_path: str,
+                 log_callback: Optional[Callable[[str], None]] = None,
+                 folder_source: Optional[Callable[[], Optional[str]]] = None,
+                 on_folder_change: Optional[Callable[[Optional[str]], None]] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            base_path: Content root folder to watch
+            log_callback: Optional callback function for log messages
+            folder_source: Returns the configured content folder; checked
+                           every ROOT_CHECK_INTERVAL
+            on_folder_change: Called from the watcher thread with the new
+                              folder when it differs from base_path; the
+                              watcher stops applying changes afterwards
+        """
+        self.base_path = os.path.abspath(base_path)
+        self.log_callback = log_callback
+        self.folder_source = folder_source
+        self.on_folder_change = on_folder_change
+        self._root_checked_at = 0.0
+        self.mode = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._libc = None
+        self._fd = -1
+        self._wd_to_chapter: Dict[int, Optional[str]] = {}
+
+    def _log(self, message: str):
+        """Send log message to callback."""
+        if self.log_callback:
+            self.log_callback(message)
+        print(message)
+
+    def start(self) -> bool:
+        """
+        Index the folder once and start watching it.
+
+        Returns:
+            bool: True if the watcher thread was started
+        """
+        if self._thread and self._thread.is_alive():
+            return False
+
+        # Make sure the index is complete before switching to event mode
+        catalog.refresh_catalog(self.base_path)
+        metadata.get_prober().schedule(self.base_path, force=True)
+        remux.get_queue().request_prune()
+
+        self._libc = _load_inotify()
+        if self._libc is not None and self._open_inotify():
+            self.mode = 'inotify'
+            target = self._run_inotify
+        else:
+            self.mode = 'polling'
+            target = self._run_polling
+
+        self._stop_event.clear()
+        catalog.set_watched_root(self.base_path)
+        self._thread = threading.Thread(target=self._run, args=(target,),
+                                        name='catalog-watcher', daemon=True)
+        self._thread.start()
+        self._log(f"[WATCHER] Watching {self.base_path} ({self.mode})")
+        return True
+
+    def stop(self):
+        """Stop watching and hand freshness checks back to refresh_catalog()."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        catalog.set_watched_root(None)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        self._wd_to_chapter.clear()
+
+    def _run(self, loop: Callable[[], None]):
+        """Thread entry point; returns the thread's DB connection on exit."""
+        try:
+            loop()
+        finally:
+            database.release_connection()
+
+    def _folder_moved(self) -> bool:
+        """
+        Check (at most every ROOT_CHECK_INTERVAL) whether the configured
+        content folder is still the watched one, and hand over if not.
+
+        Returns:
+            bool: True if the loop should exit
+        """
+        if self.folder_source is None:
+            return False
+        now = time.monotonic()
+        if now - self._root_checked_at < ROOT_CHECK_INTERVAL:
+            return False
+        self._root_checked_at = now
+        folder = self.folder_source()
+        if folder and os.path.abspath(folder) == self.base_path:
+            return False
+        self._log(f"[WATCHER] Content folder changed, no longer watching {self.base_path}")
+        self._stop_event.set()
+        if self.on_folder_change:
+            self.on_folder_change(folder)
+        return True
+
+    # ------------------------------------------------------------------
+    # inotify backend
+    # ------------------------------------------------------------------
+
+    def _open_inotify(self) -> bool:
+        """Create the inotify instance and watch the root and every chapter."""
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return False
+        self._fd = fd
+        if not self._add_watch(None):
+            os.close(fd)
+            self._fd = -1
+            return False
+        try:
+            with os.scandir(self.base_path) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._add_watch(entry.name)
+        except OSError:
+            pass
+        return True
+
+    def _add_watch(self, chapter: Optional[str]) -> bool:
+        """Watch the root (chapter=None) or a chapter folder."""
+        path = self.base_path if chapter is None else os.path.join(self.base_path, chapter)
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if chapter is not None:
+                self._log(f"[WATCHER] Cannot watch {chapter}: {os.strerror(errno)}")
+            return False
+        # Re-adding an already watched inode (e.g. after a rename) returns the same wd
+        self._wd_to_chapter[wd] = chapter
+        return True
+
+    def _read_events(self, pending: Dict[str, Optional[Set[str]]]) -> bool:
+        """
+        Drain the inotify fd into the pending change set.
+
+        Returns:
+            bool: False if the kernel queue overflowed and a sweep is needed
+        """
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return True
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return False
+            if mask & IN_IGNORED:
+                self._wd_to_chapter.pop(wd, None)
+                continue
+            if wd not in self._wd_to_chapter:
+                continue
+
+            chapter = self._wd_to_chapter[wd]
+            if chapter is None:
+                # Event on the root: a chapter folder appeared, vanished or was renamed
+                if name and mask & IN_ISDIR:
+                    pending[name] = None
+            elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                pending[chapter] = None
+            elif name and not mask & IN_ISDIR:
+                files = pending.setdefault(chapter, set())
+                if files is not None:
+                    files.add(name)
+        return True
+
+    def _flush(self, pending: Dict[str, Optional[Set[str]]]):
+        """Apply a batch of changes and keep chapter watches in sync."""
+        touched = catalog.apply_changes(self.base_path, pending)
+        if touched:
+            metadata.get_prober().schedule(self.base_path, changes=pending)
+            remux.get_queue().request_prune()
+        for chapter, file_names in pending.items():
+            if file_names is None and os.path.isdir(os.path.join(self.base_path, chapter)):
+                self._add_watch(chapter)
+        self._log(f"[WATCHER] Applied {len(pending)} chapter change(s), {touched} index row(s)")
+        pending.clear()
+
+    def _run_inotify(self):
+        """Event loop for the inotify backend."""
+        pending: Dict[str, Optional[Set[str]]] = {}
+        first_event = None
+        while not self._stop_event.is_set():
+            if self._folder_moved():
+                break
+            try:
+                readable, _, _ = select.select([self._fd], [], [], BATCH_DELAY)
+            except (OSError, ValueError):
+                break
+
+            if readable:
+                if not self._read_events(pending):
+                    self._log("[WATCHER] Event queue overflowed, sweeping content folder")
+                    pending.clear()
+                    chapters = catalog.sweep_catalog(self.base_path)
+                    if chapters:
+                        metadata.get_prober().schedule(self.base_path,
+                                                       changes=dict.fromkeys(chapters))
+                        remux.get_queue().request_prune()
+                    continue
+                if first_event is None and pending:
+                    first_event = time.monotonic()
+
+            pending_count = sum(1 if files is None else len(files) for files in pending.values())
+            if pending and (pending_count >= BATCH_SIZE or not readable or
+                            time.monotonic() - first_event >= BATCH_DELAY):
+                try:
+                    self._flush(pending)
+                except Exception as e:
+                    self._log(f"[WATCHER] Error applying changes: {e}")
+                    pending.clear()
+                first_event = None
+
+    # ------------------------------------------------------------------
+    # Polling backend
+    # ------------------------------------------------------------------
+
+    def _run_polling(self):
+        """Fallback loop: mtime sweep every POLL_INTERVAL seconds."""
+        next_sweep = time.monotonic() + POLL_INTERVAL
+        while not self._stop_event.wait(min(ROOT_CHECK_INTERVAL, POLL_INTERVAL)):
+            if self._folder_moved():
+                break
+            if time.monotonic() < next_sweep:
+                continue
+            next_sweep = time.monotonic() + POLL_INTERVAL
+            try:
+                chapters = catalog.sweep_catalog(self.base_path)
+                if chapters:
+                    metadata.get_prober().schedule(self.base_path,
+                                                   changes=dict.fromkeys(chapters))
+                    remux.get_queue().request_prune()
+            except Exception as e:
+                self._log(f"[WATCHER] Error during sweep: {e}")
@@ -0,0 +1,320 @@
+"""
+WSGI Server Backends Module
+
+Creates the HTTP server used by FlaskServerWrapper. Every backend exposes
+serve_forever() / shutdown() / server_close(), so the wrapper can start and
+stop them the same way:
+- "pool": werkzeug server with a bounded worker thread pool and HTTP/1.1
+  keep-alive (default)
+- "threaded": werkzeug development server, one thread per connection
+- "waitress": embedded waitress server, if the package is installed
+
+With "workers" above 1 the chosen backend runs in several pre-forked
+processes instead (see prefork.py).
+
+Author: Course Platform Team
+Version: 1.0
+"""
+
+import io
+import logging
+import queue
+import select
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, make_server
+from werkzeug.wsgi import LimitedStream
+
+
+# Seconds between checks of an idle keep-alive connection
+IDLE_POLL_INTERVAL = 0.25
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """
+    Request handler that keeps HTTP/1.1 connections open between requests.
+
+    werkzeug's handler always sends "Connection: close" because it cannot
+    tell where a request body ends. Here the app reads the body through a
+    stream limited to Content-Length, and any unread rest is discarded
+    afterwards, so the next request line stays intact.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self._requests_served = 0
+        self._keep_alive = False
+        self._body: Optional[LimitedStream] = None
+
+    def handle_one_request(self):
+        # Wait for the next request on an idle connection, but give the
+        # worker up after the timeout or as soon as another connection waits
+        if self._requests_served:
+            deadline = time.monotonic() + self.server.keepalive_timeout
+            readable = []
+            while True:
+                try:
+                    readable, _, _ = select.select([self.connection], [], [], IDLE_POLL_INTERVAL)
+                except (OSError, ValueError):
+                    break
+                if (readable or time.monotonic() >= deadline or
+                        not self.server.keep_alive_allowed()):
+                    break
+            if not readable:
+                self.close_connection = True
+                return
+        self._requests_served += 1
+        super().handle_one_request()
+
+    def make_environ(self) -> Dict[str, Any]:
+        environ = super().make_environ()
+        self._body = None
+        self._keep_alive = not self.close_connection and self.server.keep_alive_allowed()
+        if environ.get('wsgi.input_terminated'):
+            # Chunked request bodies: let werkzeug drain and close as usual
+            self._keep_alive = False
+            return environ
+
+        try:
+            length = max(int(environ.get('CONTENT_LENGTH') or 0), 0)
+        except ValueError:
+            length = 0
+            self._keep_alive = False
+        if self._keep_alive:
+            self._body = LimitedStream(self.rfile, length)
+            environ['wsgi.input'] = self._body
+            # werkzeug drains self.rfile after the response; hand it an empty
+            # stream so it cannot swallow the next request line
+            self._rfile, self.rfile = self.rfile, io.BytesIO()
+        return environ
+
+    def run_wsgi(self):
+        self.server.clear_error()
+        try:
+            super().run_wsgi()
+        finally:
+            if self._body is not None:
+                self.rfile = self._rfile
+                del self._rfile
+        if not self._keep_alive or self.server.had_error():
+            self.close_connection = True
+        elif self._body is not None and not self.close_connection:
+            try:
+                self._body.exhaust()
+            except Exception:
+                self.close_connection = True
+
+    def send_header(self, keyword: str, value: str):
+        if keyword.lower() == 'connection' and value == 'close' and self._keep_alive:
+            super().send_header('Connection', 'keep-alive')
+            super().send_header('Keep-Alive', f'timeout={self.server.keepalive_timeout}')
+            return
+        super().send_header(keyword, value)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug server that handles connections on a fixed set of threads."""
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, threads: int = 16,
+                 keepalive_timeout: int = 5, backlog: int = 128,
+                 sock: Optional[socket.socket] = None):
+        """
+        Initialize the server and bind the listening socket.
+
+        Args:
+            host: Host address to bind to
+            port: Port number
+            app: WSGI application
+            threads: Number of worker threads
+            keepalive_timeout: Seconds an idle keep-alive connection is kept
+            backlog: Listen queue length
+            sock: Already bound listening socket to serve on instead
+        """
+        self.threads = threads
+        self.keepalive_timeout = keepalive_timeout
+        self.request_queue_size = backlog
+        self._connections: queue.Queue = queue.Queue()
+        self._workers = []
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+        self._local = threading.local()
+        self._closing = False
+        super().__init__(host, port, app, handler=KeepAliveRequestHandler,
+                         fd=sock.fileno() if sock is not None else None)
+
+    def keep_alive_allowed(self) -> bool:
+        """Keep connections open only while no other connection is waiting."""
+        return not self._closing and self._queued <= self.threads
+
+    def log(self, type: str, message: str, *args):
+        if type == 'error':
+            self._local.error = True
+        super().log(type, message, *args)
+
+    def clear_error(self):
+        """Reset the per-thread error flag before a request."""
+        self._local.error = False
+
+    def had_error(self) -> bool:
+        """True if the current thread's request logged an error."""
+        return getattr(self._local, 'error', False)
+
+    def process_request(self, request, client_address):
+        """Queue an accepted connection for the worker pool."""
+        if not self._workers:
+            self._start_workers()
+        with self._queued_lock:
+            self._queued += 1
+        self._connections.put((request, client_address))
+
+    def _start_workers(self):
+        for index in range(self.threads):
+            worker = threading.Thread(target=self._work, name=f'http-worker-{index}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def _work(self):
+        """Worker loop: serve queued connections until a stop sentinel."""
+        while True:
+            item = self._connections.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                with self._queued_lock:
+                    self._queued -= 1
+
+    def server_close(self):
+        self._closing = True
+        super().server_close()
+        for _ in self._workers:
+            self._connections.put(None)
+        self._workers = []
+
+
+class WaitressServer:
+    """Adapter giving an embedded waitress server the wrapper's interface."""
+
+    def __init__(self, host: str, port: int, app, threads: int = 16,
+                 keepalive_timeout: int = 5, backlog: int = 128,
+                 sock: Optional[socket.socket] = None):
+        """
+        Create the waitress server and bind the listening socket.
+
+        Raises:
+            ImportError: If waitress is not installed
+        """
+        from waitress.server import create_server
+        # Queue depth warnings are expected with many viewers per thread
+        logging.getLogger('waitress.queue').setLevel(logging.ERROR)
+        if sock is not None:
+            address = {'sockets': [sock]}
+        else:
+            address = {'host': host, 'port': port}
+        self._server = create_server(app, threads=threads,
+                                     channel_timeout=max(keepalive_timeout, 30),
+                                     backlog=backlog, ident='OfflineCoursePlayer', **address)
+
+    def serve_forever(self):
+        self._server.run()
+
+    def shutdown(self):
+        # waitress has no public way to end run() from another thread. When
+        # its internals look as expected, close the listener and every open
+        # channel on the loop thread (an empty socket map ends run());
+        # otherwise use the public close()
+        server = self._server
+        channels = getattr(server, '_map', None)
+        trigger = getattr(getattr(server, 'trigger', None), 'pull_trigger', None)
+        dispatcher = getattr(server, 'task_dispatcher', None)
+        if not isinstance(channels, dict) or trigger is None or dispatcher is None:
+            server.close()
+            return
+
+        def close_all():
+            for channel in list(channels.values()):
+                channel.close()
+        trigger(close_all)
+        dispatcher.shutdown(timeout=5)
+
+    def server_close(self):
+        pass
+
+
+def create_server(app, host: str, port: int, settings: Optional[Dict[str, Any]] = None,
+                  log_callback=None, sock: Optional[socket.socket] = None):
+    """
+    Create the HTTP server for the configured backend.
+
+    Falls back to the "pool" backend if waitress is selected but missing,
+    and to a single process if pre-fork mode is unsupported.
+
+    Args:
+        app: WSGI application
+        host: Host address to bind to
+        port: Port number
+        settings: Server settings (see config.get_server_settings())
+        log_callback: Optional callback for log messages
+        sock: Already bound listening socket (used by pre-fork workers)
+
+    Returns:
+        Server object with serve_forever(), shutdown() and server_close()
+    """
+    if settings is None:
+        try:
+            from config import get_server_settings
+            settings = get_server_settings()
+        except ImportError:
+            settings = {}
+    backend = settings.get('backend', 'pool')
+    options = {
+        'threads': settings.get('threads', 16),
+        'keepalive_timeout': settings.get('keepalive_timeout', 5),
+        'backlog': settings.get('backlog', 128),
+        'sock': sock,
+    }
+
+    def log(message: str):
+        if log_callback:
+            log_callback(message)
+        print(message)
+
+    if settings.get('workers', 1) > 1:
+        import prefork
+        if prefork.is_supported():
+            return prefork.PreforkServer(host, port, app, settings, log_callback)
+        log("[SERVER] Multiple workers need fork(), running a single process")
+
+    if backend == 'waitress':
+        try:
+            server = WaitressServer(host, port, app, **options)
+            log(f"[SERVER] Backend: waitress ({options['threads']} threads)")
+            return server
+        except ImportError:
+            log("[SERVER] waitress is not installed, using the pooled server")
+            backend = 'pool'
+
+    if backend == 'threaded':
+        server = make_server(host, port, app, threaded=True,
+                             fd=sock.fileno() if sock is not None else None)
+        server.timeout = 1  # Allow periodic checks
+        log("[SERVER] Backend: threaded (one thread per connection)")
+        return server
+
+    server = PooledWSGIServer(host, port, app, **options)
+    server.timeout = 1
+    log(f"[SERVER] Backend: pool ({options['threads']} threads, "
+        f"keep-alive {options['keepalive_timeout']}s)")
+    return server